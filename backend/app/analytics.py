@@ -0,0 +1,110 @@
+"""
+Per-category analytics for the prescriptive (BUY / TRIAL / AVOID) cards.
+
+Everything is grouped server-side, so the API process receives one row per
+category instead of every product, sale and rating:
+
+  * products:  active stock and deadstock (> 180 days in stock) per category
+  * sales:     sales of the last 90 days, joined to their product's category
+  * ratings:   grouped per SKU first, then joined to active products and
+               summed per category
+
+Pipelines group on the raw `category` field; blank and missing names are
+folded into "Unknown" when the (few) groups are merged here.
+"""
+
+from __future__ import annotations
+
+from datetime import date, datetime, time, timedelta
+from typing import Any, Dict, List, Optional
+
+from app.models import Product, Rating, SaleArchive
+from app.schemas import PrescriptiveCard
+
+# Days in stock after which an item counts as deadstock
+DEAD_DAYS = 180
+# Sales window for the BUY signal
+SOLD_WINDOW_DAYS = 90
+CARD_LIMIT = 15
+
+
+def _category(raw: Optional[str]) -> str:
+    return (raw or "Unknown").strip() or "Unknown"
+
+
+def _merge(rows: List[Dict[str, Any]], fields: List[str]) -> Dict[str, Dict[str, float]]:
+    out: Dict[str, Dict[str, float]] = {}
+    for r in rows:
+        acc = out.setdefault(_category(r["_id"]), dict.fromkeys(fields, 0))
+        for f in fields:
+            acc[f] += r.get(f) or 0
+    return out
+
+
+async def category_stats(today: Optional[date] = None) -> Dict[str, Dict[str, float]]:
+    """{category: {stock, dead, sold90, stars, votes}} for every category with active stock."""
+    today = today or date.today()
+    # days in stock > DEAD_DAYS  <=>  base date < today - DEAD_DAYS
+    dead_cutoff = datetime.combine(today - timedelta(days=DEAD_DAYS), time())
+    sold_cutoff = datetime.utcnow() - timedelta(days=SOLD_WINDOW_DAYS)
+    products = Product.get_motor_collection().name
+
+    stock_rows = await Product.aggregate([
+        {"$match": {"is_archived": False}},
+        {"$group": {
+            "_id": "$category",
+            "stock": {"$sum": 1},
+            "dead": {"$sum": {"$cond": [
+                {"$lt": [{"$ifNull": ["$purchase_date", "$created_at"]}, dead_cutoff]}, 1, 0,
+            ]}},
+        }},
+    ]).to_list()
+
+    sold_rows = await SaleArchive.aggregate([
+        {"$match": {"sold_at": {"$gte": sold_cutoff}}},
+        # Archived products still count; deleted ones fall into "Unknown"
+        {"$lookup": {"from": products, "localField": "sku", "foreignField": "sku", "as": "p"}},
+        {"$group": {"_id": {"$arrayElemAt": ["$p.category", 0]}, "sold90": {"$sum": 1}}},
+    ]).to_list()
+
+    rating_rows = await Rating.aggregate([
+        {"$group": {"_id": "$sku", "stars": {"$sum": "$stars"}, "votes": {"$sum": 1}}},
+        {"$lookup": {"from": products, "localField": "_id", "foreignField": "sku", "as": "p"}},
+        {"$unwind": "$p"},
+        {"$match": {"p.is_archived": False}},
+        {"$group": {"_id": "$p.category", "stars": {"$sum": "$stars"}, "votes": {"$sum": "$votes"}}},
+    ]).to_list()
+
+    stats = _merge(stock_rows, ["stock", "dead"])
+    sold = _merge(sold_rows, ["sold90"])
+    rated = _merge(rating_rows, ["stars", "votes"])
+    for cat, acc in stats.items():
+        acc.update(sold.get(cat, {"sold90": 0}))
+        acc.update(rated.get(cat, {"stars": 0, "votes": 0}))
+    return stats
+
+
+def prescriptive_cards(stats: Dict[str, Dict[str, float]]) -> List[Dict[str, Any]]:
+    """Cards from `category_stats`, strongest signal first (the lists are truncated)."""
+    buy, trial, avoid = [], [], []
+    for cat, s in stats.items():
+        stock_cnt, sold_cnt, votes = int(s["stock"]), int(s["sold90"]), int(s["votes"])
+        avg_rating = s["stars"] / votes if votes else 0.0
+
+        if sold_cnt > stock_cnt:
+            buy.append((sold_cnt - stock_cnt, f"{cat} (sold90={sold_cnt}, stock={stock_cnt})"))
+        if avg_rating >= 4.0 and votes >= 3 and sold_cnt <= max(1, stock_cnt // 3):
+            trial.append((avg_rating, f"{cat} (rating={avg_rating:.2f}, votes={votes})"))
+        if s["dead"] >= 3:
+            avoid.append((s["dead"], f"{cat} (deadstock={int(s['dead'])})"))
+
+    top = lambda rows: [text for _, text in sorted(rows, key=lambda r: -r[0])[:CARD_LIMIT]]
+    return [
+        PrescriptiveCard(title="Strategic BUY", color="green", items=top(buy)).model_dump(),
+        PrescriptiveCard(title="Market TRIAL", color="yellow", items=top(trial)).model_dump(),
+        PrescriptiveCard(title="Strategic AVOID", color="red", items=top(avoid)).model_dump(),
+    ]
+
+
+async def compute_prescriptive() -> List[Dict[str, Any]]:
+    return prescriptive_cards(await category_stats())
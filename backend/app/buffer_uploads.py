@@ -0,0 +1,194 @@
+"""
+Streaming uploads into the per-admin media buffer (Batch Sourcing step 1).
+
+Files are copied in fixed-size chunks with the disk writes pushed to a worker
+thread, hashed incrementally with SHA-256, and checked against a small digest
+manifest kept in the buffer directory so re-uploading the same photo does not
+store it twice. Memory per upload is bounded by CHUNK_SIZE.
+
+Client filenames must be plain names (no paths, no dotfiles, which also
+keeps the manifest and temp files out of reach). The manifest update and the
+final rename run under an fcntl lock on the buffer directory, so uploads
+handled by different gunicorn workers do not race.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import os
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List
+
+from fastapi import HTTPException, UploadFile
+
+try:  # POSIX only; elsewhere the lock is a no-op
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+CHUNK_SIZE = 1024 * 1024  # 1 MiB
+UPLOAD_CONCURRENCY = 4
+MANIFEST_NAME = ".sha256.json"
+LOCK_NAME = ".lock"
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+class _DirLock:
+    """Cross-process lock on a buffer dir; guards the manifest + final rename."""
+
+    def __init__(self, buf_dir: Path):
+        self.path = buf_dir / LOCK_NAME
+        self._f = None
+
+    def __enter__(self):
+        self._f = open(self.path, "w")
+        if fcntl:
+            fcntl.flock(self._f, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if fcntl:
+            fcntl.flock(self._f, fcntl.LOCK_UN)
+        self._f.close()
+        self._f = None
+
+
+def _valid_name(filename: str) -> bool:
+    """A plain file name: no directory parts, not empty, not a dotfile ("..", the manifest, temp files)."""
+    return bool(filename) and "/" not in filename and "\\" not in filename and not filename.startswith(".")
+
+
+def _load_manifest(buf_dir: Path) -> Dict[str, List[str]]:
+    """digest -> filenames, pruned of files that were moved out (e.g. by a CSV import)."""
+    path = buf_dir / MANIFEST_NAME
+    try:
+        data = json.loads(path.read_text())
+    except (FileNotFoundError, ValueError):
+        data = {}
+    out: Dict[str, List[str]] = {}
+    for h, names in data.items():
+        alive = [n for n in names if (buf_dir / n).exists()]
+        if alive:
+            out[h] = alive
+    return out
+
+
+def _save_manifest(buf_dir: Path, manifest: Dict[str, List[str]]) -> None:
+    tmp = buf_dir / f"{MANIFEST_NAME}.tmp"
+    tmp.write_text(json.dumps(manifest))
+    os.replace(tmp, buf_dir / MANIFEST_NAME)
+
+
+async def _stream_to_temp(f: UploadFile, tmp: Path, max_bytes: int) -> str:
+    hasher = hashlib.sha256()
+    size = 0
+    out = await asyncio.to_thread(tmp.open, "wb")
+    try:
+        while True:
+            chunk = await f.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_bytes:
+                raise UploadTooLarge()
+            hasher.update(chunk)
+            await asyncio.to_thread(out.write, chunk)
+    finally:
+        await asyncio.to_thread(out.close)
+    return hasher.hexdigest()
+
+
+def _commit(buf_dir: Path, tmp: Path, name: str, digest: str) -> Dict[str, Any]:
+    """
+    Dedup against the manifest, then put the file in place (blocking).
+    Identical content under a new name becomes a hard link to the stored copy,
+    so CSV filename matching keeps working without storing the bytes twice.
+    The manifest is only written once the file is in place; on failure the
+    temp file is removed and the manifest is left untouched.
+    """
+    with _DirLock(buf_dir):
+        try:
+            return _place(buf_dir, tmp, name, digest)
+        finally:
+            tmp.unlink(missing_ok=True)
+
+
+def _place(buf_dir: Path, tmp: Path, name: str, digest: str) -> Dict[str, Any]:
+    manifest = _load_manifest(buf_dir)
+    # Same name, new content: forget the old digest
+    for h in list(manifest):
+        manifest[h] = [n for n in manifest[h] if n != name or h == digest]
+        if not manifest[h]:
+            del manifest[h]
+
+    known = manifest.get(digest, [])
+    dest = buf_dir / name
+    if name in known:
+        return {"file": name, "sha256": digest, "duplicate": True}
+
+    duplicate = False
+    if known:
+        try:
+            dest.unlink(missing_ok=True)
+            os.link(buf_dir / known[0], dest)
+            duplicate = True
+        except OSError:
+            pass
+    if not duplicate:
+        os.replace(tmp, dest)
+
+    manifest.setdefault(digest, []).append(name)
+    _save_manifest(buf_dir, manifest)
+    return {"file": name, "sha256": digest, "duplicate": duplicate}
+
+
+async def save_buffer_upload(f: UploadFile, buf_dir: Path, max_bytes: int) -> Dict[str, Any]:
+    name = f.filename
+    tmp = buf_dir / f".{uuid.uuid4().hex}.part"
+    try:
+        digest = await _stream_to_temp(f, tmp, max_bytes)
+    except UploadTooLarge:
+        await asyncio.to_thread(tmp.unlink, True)
+        return {"file": name, "error": f"exceeds {max_bytes // (1024 * 1024)} MB limit"}
+    except Exception as e:
+        await asyncio.to_thread(tmp.unlink, True)
+        return {"file": name, "error": str(e)}
+    finally:
+        await f.close()
+
+    try:
+        return await asyncio.to_thread(_commit, buf_dir, tmp, name, digest)
+    except OSError as e:
+        return {"file": name, "error": str(e)}
+
+
+async def save_buffer_uploads(files: List[UploadFile], buf_dir: Path, max_bytes: int) -> Dict[str, Any]:
+    # Validate every name before anything is written
+    bad = [f.filename for f in files if f.filename and not _valid_name(f.filename)]
+    if bad:
+        raise HTTPException(status_code=400, detail=f"Invalid file name(s): {', '.join(bad)}")
+
+    sem = asyncio.Semaphore(UPLOAD_CONCURRENCY)
+
+    async def _one(f: UploadFile):
+        async with sem:
+            return await save_buffer_upload(f, buf_dir, max_bytes)
+
+    results = await asyncio.gather(*[_one(f) for f in files if f.filename])
+
+    saved = [r["file"] for r in results if "error" not in r]
+    duplicates = [r["file"] for r in results if "error" not in r and r["duplicate"]]
+    rejected = [r for r in results if "error" in r]
+    return {
+        "ok": True,
+        "buffer_count": len(saved),
+        "files": saved,
+        "duplicates": duplicates,
+        "rejected": rejected,
+    }
@@ -0,0 +1,132 @@
+"""
+Versioned result cache for read-heavy analytics endpoints.
+
+Each cached result records the version of every topic ("products", "sales",
+"ratings", ...) it was computed from. Write paths call `invalidate(topic)`,
+which bumps that topic's version; a result whose recorded versions no longer
+match is recomputed on its next read. Nothing is scanned or deleted on write.
+
+Versions are per process, so writes handled by another worker are only seen
+once `max_age` expires; that bounds staleness across workers. Concurrent
+misses for the same key share one computation.
+
+`get_snapshot` is the stale-while-revalidate variant for full-catalog
+computations: once a key has been computed, readers always get the last
+snapshot at once (with its age), and a stale one (expired, a topic bumped,
+or a new `epoch` such as the day) triggers a single background recompute
+that replaces it when done. Only the very first read of a key waits.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, NamedTuple, Tuple
+
+from app.config import get_settings
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+
+class Snapshot(NamedTuple):
+    value: Any
+    age_seconds: float
+    # A recompute is running (or just started) because this value is stale
+    refreshing: bool
+
+
+class VersionedCache:
+    def __init__(self, max_age_seconds: float = 120.0):
+        self.max_age = max_age_seconds
+        self._versions: Dict[str, int] = {}
+        # key -> (topic versions + epoch, computed at (monotonic), value)
+        self._entries: Dict[Hashable, Tuple[Tuple[Any, ...], float, Any]] = {}
+        self._locks: Dict[Hashable, asyncio.Lock] = {}
+        # key -> background recompute started by `get_snapshot`
+        self._refreshing: Dict[Hashable, asyncio.Task] = {}
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+
+    def invalidate(self, *topics: str):
+        for t in topics:
+            self._versions[t] = self._versions.get(t, 0) + 1
+
+    def _stamp(self, topics: Iterable[str]) -> Tuple[Any, ...]:
+        return tuple(self._versions.get(t, 0) for t in topics)
+
+    def _fresh(self, key: Hashable, stamp: Tuple[int, ...]):
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == stamp and time.monotonic() - entry[1] < self.max_age:
+            return entry
+        return None
+
+    async def get_or_compute(
+        self, key: Hashable, topics: Tuple[str, ...], compute: Callable[[], Awaitable[Any]], epoch: Hashable = None,
+    ) -> Any:
+        """The cached value of `key`, recomputed when any of `topics` (or `epoch`) changed or it expired."""
+        entry = self._fresh(key, self._stamp(topics) + (epoch,))
+        if entry is not None:
+            self.hits += 1
+            return entry[2]
+
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            # Another request may have filled it while we waited
+            entry = self._fresh(key, self._stamp(topics) + (epoch,))
+            if entry is not None:
+                self.hits += 1
+                return entry[2]
+            self.misses += 1
+            # Stamp before computing: a write that lands mid-computation leaves it stale
+            stamp = self._stamp(topics) + (epoch,)
+            value = await compute()
+            self._entries[key] = (stamp, time.monotonic(), value)
+            return value
+
+    async def get_snapshot(
+        self, key: Hashable, topics: Tuple[str, ...], compute: Callable[[], Awaitable[Any]], epoch: Hashable = None,
+    ) -> Snapshot:
+        """The last value of `key` right away; recomputed in the background once stale."""
+        stamp = self._stamp(topics) + (epoch,)
+        entry = self._entries.get(key)
+        if entry is None:
+            value = await self.get_or_compute(key, topics, compute, epoch)
+            return Snapshot(value, time.monotonic() - self._entries[key][1], False)
+
+        age = time.monotonic() - entry[1]
+        if entry[0] == stamp and age < self.max_age:
+            self.hits += 1
+            return Snapshot(entry[2], age, False)
+
+        self.stale_hits += 1
+        if key not in self._refreshing:
+            self._refreshing[key] = asyncio.create_task(self._refresh(key, topics, compute, epoch))
+        return Snapshot(entry[2], age, True)
+
+    async def _refresh(self, key: Hashable, topics: Tuple[str, ...], compute: Callable[[], Awaitable[Any]], epoch: Hashable):
+        try:
+            await self.get_or_compute(key, topics, compute, epoch)
+        except Exception as e:
+            # Keep serving the previous snapshot; the next stale read retries
+            logger.error(f"Background recompute of {key!r} failed: {e}")
+        finally:
+            self._refreshing.pop(key, None)
+
+    def status(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            "entries": len(self._entries),
+            "versions": dict(self._versions),
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale_hits": self.stale_hits,
+            "refreshing": [str(k) for k in self._refreshing],
+            "ages": {str(k): round(now - e[1], 1) for k, e in self._entries.items()},
+        }
+
+
+# Singleton
+analytics_cache = VersionedCache(max_age_seconds=settings.ANALYTICS_CACHE_SECONDS)
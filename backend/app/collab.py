@@ -0,0 +1,220 @@
+"""
+Item-item collaborative filtering from real purchase and rating data.
+
+Interactions (every ordered SKU, every 4+ star rating) form a binary sparse
+user x item matrix X. Item co-occurrence is X^T X; similarity is the cosine
+of the item columns with a shrinkage term so pairs seen together once do not
+outrank pairs seen together fifty times:
+
+    sim(a, b) = co(a, b) / sqrt(n_a * n_b) * co(a, b) / (co(a, b) + SHRINK)
+
+Only the top-K partners per item are kept (int32 / float32 arrays, -1 = empty
+slot). X^T X is computed in item blocks sized so the dense block stays within
+the memory budget, so peak memory is budget + O(nnz), not items^2.
+
+New orders are folded in with `add_interactions`, which rescores only the
+items in that customer's history and the rows that list the changed items.
+"""
+
+from __future__ import annotations
+
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from pydantic import BaseModel
+from scipy import sparse
+
+from app.models import Order, Rating
+from app.neighbor_index import top_k_rows
+
+logger = logging.getLogger(__name__)
+
+# Shrinkage toward 0 for pairs with little co-occurrence evidence
+SHRINK = 5.0
+# Ratings at or above this count as a positive interaction
+MIN_STARS = 4
+
+
+class _ItemSku(BaseModel):
+    sku: str
+
+
+class _OrderSkus(BaseModel):
+    customer_id: Any  # str, or an ObjectId on older public orders
+    items: List[_ItemSku] = []
+
+
+class _RatingRow(BaseModel):
+    sku: str
+    customer_ref: Optional[str] = None
+
+
+async def load_interactions() -> List[Tuple[str, str]]:
+    """(user, sku) pairs from all orders and 4+ star ratings, via projected scans."""
+    pairs: List[Tuple[str, str]] = []
+    orders = await Order.find().project(_OrderSkus).to_list()
+    for o in orders:
+        pairs.extend((str(o.customer_id), it.sku) for it in o.items)
+    ratings = await Rating.find(Rating.stars >= MIN_STARS).project(_RatingRow).to_list()
+    pairs.extend((r.customer_ref, r.sku) for r in ratings if r.customer_ref)
+    return pairs
+
+
+class ItemCF:
+    def __init__(self, top_k: int = 50, memory_mb: int = 128):
+        self.top_k = top_k
+        self.memory_mb = memory_mb
+
+        self.user_index: Dict[str, int] = {}
+        self.item_index: Dict[str, int] = {}
+        self.item_skus: List[str] = []
+        self.X = sparse.csr_matrix((0, 0), dtype=np.float32)   # users x items, binary
+        self.item_counts = np.zeros(0, dtype=np.float32)
+
+        self.idx = np.full((0, top_k), -1, dtype=np.int32)
+        self.score = np.zeros((0, top_k), dtype=np.float32)
+        self._S = None   # cached sparse top-K similarity matrix
+
+    def __len__(self) -> int:
+        return len(self.item_skus)
+
+    @property
+    def n_interactions(self) -> int:
+        return int(self.X.nnz)
+
+    # --- building ---------------------------------------------------------
+
+    def _ids(self, index: Dict[str, int], key: str, names: Optional[List[str]] = None) -> int:
+        i = index.get(key)
+        if i is None:
+            i = index[key] = len(index)
+            if names is not None:
+                names.append(key)
+        return i
+
+    def fit(self, pairs: Iterable[Tuple[str, str]]) -> "ItemCF":
+        self.user_index, self.item_index, self.item_skus = {}, {}, []
+        rows, cols = [], []
+        for user, sku in pairs:
+            rows.append(self._ids(self.user_index, user))
+            cols.append(self._ids(self.item_index, sku, self.item_skus))
+
+        shape = (len(self.user_index), len(self.item_index))
+        X = sparse.csr_matrix((np.ones(len(rows), dtype=np.float32), (rows, cols)), shape=shape)
+        X.data[:] = 1.0  # duplicates collapse to a single interaction
+        self.X = X
+        self.item_counts = np.asarray(X.sum(axis=0), dtype=np.float32).ravel()
+
+        n = shape[1]
+        self.idx = np.full((n, self.top_k), -1, dtype=np.int32)
+        self.score = np.zeros((n, self.top_k), dtype=np.float32)
+        self._rescore(np.arange(n))
+        logger.info(f"ItemCF fitted: {shape[0]} users, {n} items, {X.nnz} interactions")
+        return self
+
+    def _block_rows(self) -> int:
+        # A block holds ~3 dense rows x items float32 temporaries (co, sim, mask)
+        budget = self.memory_mb * 1024 * 1024
+        return max(1, budget // max(1, 12 * len(self)))
+
+    def _rescore(self, items: np.ndarray):
+        """Recompute the top-K lists of `items` from X (exact)."""
+        if not len(items) or not len(self):
+            return
+        self._S = None
+        Xc = self.X.tocsc()
+        XT = self.X.T.tocsr()
+        norms = np.sqrt(np.maximum(self.item_counts, 1.0))
+        step = self._block_rows()
+        for start in range(0, len(items), step):
+            block = items[start:start + step]
+            co = (XT[block] @ Xc).toarray()                 # items_block x items
+            sim = co / (norms[block, None] * norms[None, :])
+            sim *= co / (co + SHRINK)
+            sim[np.arange(len(block)), block] = -np.inf      # never pair an item with itself
+            sim[co <= 0] = -np.inf
+            top, top_scores = top_k_rows(sim.astype(np.float32), self.top_k)
+            valid = np.isfinite(top_scores)
+            width = top.shape[1]
+            self.idx[block] = -1
+            self.score[block] = 0.0
+            self.idx[block, :width] = np.where(valid, top, -1)
+            self.score[block, :width] = np.where(valid, top_scores, 0.0)
+
+    def add_interactions(self, user: str, skus: Sequence[str]):
+        """Fold one customer's new order / rating in and rescore their items."""
+        skus = [s for s in skus if s]
+        if not skus:
+            return
+        u = self._ids(self.user_index, user)
+        new_items = [self._ids(self.item_index, s, self.item_skus) for s in skus]
+
+        n_users, n_items = len(self.user_index), len(self.item_index)
+        if self.X.shape != (n_users, n_items):
+            self.X.resize((n_users, n_items))
+        grow = n_items - self.idx.shape[0]
+        if grow > 0:
+            self.idx = np.vstack([self.idx, np.full((grow, self.top_k), -1, dtype=np.int32)])
+            self.score = np.vstack([self.score, np.zeros((grow, self.top_k), dtype=np.float32)])
+            self.item_counts = np.append(self.item_counts, np.zeros(grow, dtype=np.float32))
+
+        had = set(self.X.indices[self.X.indptr[u]:self.X.indptr[u + 1]].tolist())
+        added = sorted(set(new_items) - had)
+        if not added:
+            return
+        delta = sparse.csr_matrix(
+            (np.ones(len(added), dtype=np.float32), ([u] * len(added), added)), shape=self.X.shape,
+        )
+        self.X = (self.X + delta).tocsr()
+        self.item_counts[added] += 1.0
+
+        # Co-occurrence only changed within this user's history; the added items'
+        # larger counts lower their cosine, which matters only to rows listing them
+        listing = np.flatnonzero(np.isin(self.idx, added).any(axis=1))
+        self._rescore(np.union1d(np.array(sorted(had | set(added)), dtype=np.int64), listing))
+
+    # --- querying ---------------------------------------------------------
+
+    def similar(self, sku: str, top_n: int = 10) -> List[Tuple[str, float]]:
+        i = self.item_index.get(sku)
+        if i is None:
+            return []
+        row, sc = self.idx[i, :top_n], self.score[i, :top_n]
+        return [(self.item_skus[j], float(s)) for j, s in zip(row.tolist(), sc.tolist()) if j >= 0]
+
+    def similarity_matrix(self) -> sparse.csr_matrix:
+        """The top-K lists as a sparse items x items matrix."""
+        if self._S is None or self._S.shape[0] != len(self):
+            n = len(self)
+            valid = self.idx >= 0
+            rows = np.repeat(np.arange(n), self.idx.shape[1])[valid.ravel()]
+            self._S = sparse.csr_matrix(
+                (self.score[valid], (rows, self.idx[valid])), shape=(n, n), dtype=np.float32,
+            )
+        return self._S
+
+    def score_block(self, liked_sets: Sequence[Iterable[str]]) -> sparse.csr_matrix:
+        """
+        Summed neighbor similarity for many users at once: L @ S, where L is
+        the users x items indicator of `liked_sets`. Row r equals `scores_for`.
+        """
+        rows, cols = [], []
+        for r, liked in enumerate(liked_sets):
+            for sku in liked:
+                i = self.item_index.get(sku)
+                if i is not None:
+                    rows.append(r)
+                    cols.append(i)
+        L = sparse.csr_matrix(
+            (np.ones(len(rows), dtype=np.float32), (rows, cols)), shape=(len(liked_sets), len(self)),
+        )
+        return (L @ self.similarity_matrix()).tocsr()
+
+    def scores_for(self, liked: Iterable[str]) -> Dict[str, float]:
+        """Summed neighbor similarity of every item co-bought with `liked`."""
+        out: Dict[str, float] = {}
+        for sku in liked:
+            for other, s in self.similar(sku, self.top_k):
+                out[other] = out.get(other, 0.0) + s
+        return out
@@ -21,6 +21,43 @@ class Settings(BaseSettings):
     ADMIN_DOMAINS: str = ""
 
     MEDIA_DIR: str = "./media"
+    MAX_UPLOAD_MB: int = 25
+
+    # Background jobs (outputs live outside MEDIA_DIR, which is served publicly)
+    JOB_OUTPUT_DIR: str = "./job_output"
+    JOB_MAX_CONCURRENCY: int = 2
+
+    # Fitted recommender arrays, memory-mapped by every worker
+    RECOMMENDER_ARTIFACT_DIR: str = "./recommender_artifacts"
+    # Content similarity: "tfidf" or "embedding" (Word2Vec trained on the catalog)
+    RECOMMENDER_MODE: str = "tfidf"
+    # Catalog check / retrain interval, and how long product writes are coalesced
+    RECOMMENDER_REFRESH_SECONDS: int = 900
+    RECOMMENDER_DEBOUNCE_SECONDS: int = 30
+    # Item-item collaborative filtering (orders + 4+ star ratings)
+    COLLAB_TOP_K: int = 50
+    COLLAB_MEMORY_MB: int = 128
+    COLLAB_WEIGHT: float = 0.3
+    # Customer preference profiles kept in memory (LRU)
+    PROFILE_CACHE_SIZE: int = 100_000
+    # Nightly precomputed personalized lists: SKUs stored per customer, UTC hour (-1 = off)
+    PERSONALIZED_TOP_N: int = 50
+    PERSONALIZED_BATCH_HOUR: int = 2
+    # Trending: half-life of the decayed event counters, and how often they are snapshotted
+    TRENDING_HALF_LIFE_HOURS: float = 72.0
+    TRENDING_SNAPSHOT_SECONDS: int = 3600
+    # Storefront interaction events: in-memory buffer size, flush interval / batch size
+    EVENTS_BUFFER_SIZE: int = 50_000
+    EVENTS_FLUSH_MS: int = 1000
+    EVENTS_FLUSH_BATCH: int = 500
+    # Dashboard zone counts: aging sweep interval, and how often they are recounted from Mongo
+    ZONE_SWEEP_SECONDS: int = 300
+    ZONE_RESYNC_SECONDS: int = 900
+    # Analytics snapshots (prescriptive cards, procurement scores): age after which a read triggers
+    # a background recompute; also bounds how long other workers' writes go unseen
+    ANALYTICS_CACHE_SECONDS: int = 120
+    # Sales rollups (7/30/60/90 day units per SKU): how often to check for a day change
+    SALES_ROLLUP_CHECK_SECONDS: int = 3600
 
     GOLD_RATE_PER_GRAM: float = 6500.0
 
@@ -0,0 +1,226 @@
+"""
+Bulk CSV ingestion for Batch Sourcing (/uploads/batch_csv).
+
+The sheet is parsed and coerced column-wise in a worker thread, existing SKUs
+are resolved with a single `$in` query, and products/images are written with
+chunked unordered `insert_many` calls. New products are stamped with their
+status zone before the insert and filed in this worker's zone counters after
+it. Every row that is not imported (or had a value coerced) is reported back
+with its CSV line number.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import io
+import shutil
+from datetime import date, datetime
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from beanie.operators import In
+from pydantic import BaseModel
+from pymongo.errors import BulkWriteError
+
+from app.models import Product, ProductImage
+from app.zones import stamp_zone, zone_counter
+
+INSERT_CHUNK_SIZE = 1000
+MAX_REPORTED_ERRORS = 500
+# Largest quantity accepted from a sheet (anything above is treated as a typo)
+MAX_QTY = 2**31 - 1
+
+# First non-empty column wins
+NAME_COLUMNS = ("name", "title")
+IMAGE_COLUMNS = ("image_filename", "image", "filename")
+
+
+ProgressFn = Callable[[int, int], Awaitable[None]]
+
+
+class _SkuOnly(BaseModel):
+    sku: str
+
+
+def _text_column(df: pd.DataFrame, *names: str) -> pd.Series:
+    out = pd.Series("", index=df.index, dtype=object)
+    for n in names:
+        if n in df.columns:
+            col = df[n].astype(str).str.strip()
+            out = out.where(out != "", col)
+    return out
+
+
+def parse_batch_csv(
+    content: bytes,
+    gdate: Optional[date],
+    stock_type: str,
+) -> Tuple[pd.DataFrame, List[Dict[str, Any]]]:
+    """
+    Parse and coerce the uploaded sheet (blocking - run in a thread).
+
+    Returns a normalized frame (one row per importable line) and the list of
+    row-level errors/warnings found while coercing.
+    """
+    df = pd.read_csv(io.BytesIO(content), dtype=str, keep_default_na=False)
+    df.columns = [str(c).strip().lower() for c in df.columns]
+
+    errors: List[Dict[str, Any]] = []
+    line = pd.Series(df.index + 2, index=df.index)  # header is line 1
+
+    out = pd.DataFrame({
+        "line": line,
+        "sku": _text_column(df, "sku"),
+        "name": _text_column(df, *NAME_COLUMNS),
+        "description": _text_column(df, "description"),
+        "category": _text_column(df, "category"),
+        "subcategory": _text_column(df, "subcategory"),
+        "image": _text_column(df, *IMAGE_COLUMNS).map(lambda s: Path(s).name if s else ""),
+    })
+
+    default_type = (stock_type or "").strip().lower() or "physical"
+    st = _text_column(df, "stock_type").str.lower()
+    out["stock_type"] = st.where(st != "", default_type)
+
+    # Weights: blanks -> None, garbage -> None (+ warning)
+    raw_w = _text_column(df, "weight_g")
+    weight = pd.to_numeric(raw_w, errors="coerce")
+    bad_w = (raw_w != "") & weight.isna()
+    out["weight_g"] = weight.astype(object).where(weight.notna(), None)
+
+    # Quantity: blanks -> 1; garbage, inf, negative, fractional or huge -> 1 (+ warning)
+    raw_q = _text_column(df, "qty")
+    qty = pd.to_numeric(raw_q, errors="coerce").astype(float)
+    ok_q = np.isfinite(qty) & (qty >= 0) & (qty <= MAX_QTY) & (qty == np.floor(qty))
+    bad_q = (raw_q != "") & ~ok_q
+    out["qty"] = qty.where(ok_q, 1).astype(np.int64)
+
+    # Purchase date: global date overrides the column
+    if gdate:
+        out["purchase_date"] = gdate
+        bad_d = pd.Series(False, index=df.index)
+    else:
+        raw_d = _text_column(df, "purchase_date")
+        parsed = pd.to_datetime(raw_d, format="%Y-%m-%d", errors="coerce")
+        bad_d = (raw_d != "") & parsed.isna()
+        out["purchase_date"] = [d.date() if not pd.isna(d) else None for d in parsed]
+
+    for mask, field, msg in (
+        (bad_w, "weight_g", "invalid weight, left empty"),
+        (bad_q, "qty", "invalid qty (expected a whole number >= 0), defaulted to 1"),
+        (bad_d, "purchase_date", "invalid date (expected YYYY-MM-DD), left empty"),
+    ):
+        for ln, sku in zip(out.loc[mask, "line"], out.loc[mask, "sku"]):
+            errors.append({"line": int(ln), "sku": sku, "field": field, "error": msg, "imported": True})
+
+    # Rows we cannot import at all
+    missing = (out["sku"] == "") | (out["name"] == "")
+    for ln, sku in zip(out.loc[missing, "line"], out.loc[missing, "sku"]):
+        errors.append({"line": int(ln), "sku": sku, "error": "missing sku or name", "imported": False})
+
+    dupes = ~missing & out["sku"].duplicated(keep="first")
+    for ln, sku in zip(out.loc[dupes, "line"], out.loc[dupes, "sku"]):
+        errors.append({"line": int(ln), "sku": sku, "error": "duplicate sku in file", "imported": False})
+
+    return out[~missing & ~dupes].reset_index(drop=True), errors
+
+
+def _move_images(pairs: List[Tuple[str, str]], buf_dir: Path, media_dir: Path) -> Dict[str, str]:
+    """Move buffered images into products/<sku>/ (blocking). Returns sku -> relative path."""
+    moved: Dict[str, str] = {}
+    for sku, img_name in pairs:
+        candidate = buf_dir / img_name
+        if not candidate.exists():
+            continue
+        prod_dir = media_dir / "products" / sku
+        prod_dir.mkdir(parents=True, exist_ok=True)
+        dest = prod_dir / candidate.name
+        shutil.move(str(candidate), str(dest))
+        moved[sku] = f"products/{sku}/{dest.name}"
+    return moved
+
+
+async def _insert_chunked(docs: List[Any], model, on_progress: Optional[ProgressFn] = None) -> List[int]:
+    """Unordered chunked insert. Returns positions (into `docs`) that failed."""
+    failed: List[int] = []
+    for start in range(0, len(docs), INSERT_CHUNK_SIZE):
+        chunk = docs[start:start + INSERT_CHUNK_SIZE]
+        try:
+            await model.insert_many(chunk, ordered=False)
+        except BulkWriteError as e:
+            for we in e.details.get("writeErrors", []):
+                failed.append(start + int(we["index"]))
+        if on_progress:
+            await on_progress(start + len(chunk), len(docs))
+    return failed
+
+
+async def ingest_batch_csv(
+    content: bytes,
+    buf_dir: Path,
+    media_dir: Path,
+    gdate: Optional[date] = None,
+    stock_type: str = "physical",
+    on_progress: Optional[ProgressFn] = None,
+) -> Dict[str, Any]:
+    df, errors = await asyncio.to_thread(parse_batch_csv, content, gdate, stock_type)
+
+    skus = df["sku"].tolist()
+    existing = set()
+    if skus:
+        rows = await Product.find(In(Product.sku, skus)).project(_SkuOnly).to_list()
+        existing = {r.sku for r in rows}
+
+    now = datetime.utcnow()
+    products: List[Product] = []
+    lines: List[int] = []
+    images: List[Tuple[str, str]] = []
+    for r in df.itertuples(index=False):
+        if r.sku in existing:
+            errors.append({"line": int(r.line), "sku": r.sku, "error": "sku already exists", "imported": False})
+            continue
+        p = Product(
+            sku=r.sku,
+            name=r.name,
+            description=r.description or None,
+            category=r.category or None,
+            subcategory=r.subcategory or None,
+            weight_g=r.weight_g,
+            stock_type=r.stock_type,
+            qty=int(r.qty),
+            purchase_date=r.purchase_date,
+            created_at=now,
+            updated_at=now,
+            is_archived=False,
+        )
+        # New SKUs have no reservations or sale records yet
+        stamp_zone(p, reserved=False, sold=False)
+        products.append(p)
+        lines.append(int(r.line))
+        if r.image:
+            images.append((r.sku, r.image))
+
+    failed = set(await _insert_chunked(products, Product, on_progress))
+    for i in sorted(failed):
+        errors.append({"line": lines[i], "sku": products[i].sku, "error": "insert failed (duplicate sku?)", "imported": False})
+    created_skus = {p.sku for i, p in enumerate(products) if i not in failed}
+    for i, p in enumerate(products):
+        if i not in failed:
+            zone_counter.upsert(p, reserved=False, sold=False)
+
+    images = [(sku, name) for sku, name in images if sku in created_skus]
+    moved = await asyncio.to_thread(_move_images, images, buf_dir, media_dir)
+    img_docs = [ProductImage(sku=sku, path=rel, is_primary=True) for sku, rel in moved.items()]
+    img_failed = await _insert_chunked(img_docs, ProductImage)
+
+    errors.sort(key=lambda e: e["line"])
+    return {
+        "ok": True,
+        "created": len(created_skus),
+        "matched_images": len(img_docs) - len(img_failed),
+        "skipped": sum(1 for e in errors if not e["imported"]),
+        "error_count": len(errors),
+        "errors": errors[:MAX_REPORTED_ERRORS],
+    }
@@ -7,7 +7,8 @@ from app.config import get_settings
 from app.models import (
     Setting, Product, ProductImage, Rating, Reservation,
     S3DeletionQueue, Feedback, WishlistRequest, SaleArchive, 
-    Customer, Order, AdminAccount
+    Customer, Order, AdminAccount, Job, PersonalizedRecs, TrendingSnapshot,
+    SalesFact, SalesRollup
 )
 
 settings = get_settings()
@@ -32,6 +33,11 @@ async def init_db():
             SaleArchive,
             Customer,
             Order,
-            AdminAccount
+            AdminAccount,
+            Job,
+            PersonalizedRecs,
+            TrendingSnapshot,
+            SalesFact,
+            SalesRollup
         ]
     )
@@ -0,0 +1,85 @@
+"""
+Dense product embeddings trained on the catalog's own text.
+
+A small Word2Vec model is trained on the metadata soups, so words that appear
+in the same contexts ("jhumka" / "drop earring", "kundan" / "polki") land
+close together even when TF-IDF sees no overlap. A product vector is the
+SIF-weighted mean of its word vectors (frequent words count less), L2
+normalised, so cosine similarity is a plain dot product on a float32 matrix.
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Iterable, List, Optional
+
+import numpy as np
+
+
+def tokenize(text: str) -> List[str]:
+    from gensim.utils import simple_preprocess
+
+    return simple_preprocess(text or "", min_len=2, max_len=30)
+
+
+class ProductEmbedder:
+    def __init__(self, vector_size: int = 64, window: int = 8, epochs: int = 40, sif_a: float = 1e-3, seed: int = 42):
+        self.vector_size = vector_size
+        self.window = window
+        self.epochs = epochs
+        self.sif_a = sif_a
+        self.seed = seed
+        self.wv = None                              # gensim KeyedVectors
+        self.word_weights: Optional[np.ndarray] = None
+
+    def fit(self, soups: Iterable[str]) -> "ProductEmbedder":
+        from gensim.models import Word2Vec
+
+        sentences = [tokenize(s) for s in soups]
+        model = Word2Vec(
+            sentences=sentences,
+            vector_size=self.vector_size,
+            window=self.window,
+            min_count=1,
+            sg=1,
+            epochs=self.epochs,
+            seed=self.seed,
+            workers=1,
+        )
+        self.wv = model.wv
+        self._set_weights()
+        return self
+
+    def _set_weights(self):
+        counts = np.array([self.wv.get_vecattr(w, "count") for w in self.wv.index_to_key], dtype=np.float64)
+        freq = counts / max(counts.sum(), 1.0)
+        self.word_weights = (self.sif_a / (self.sif_a + freq)).astype(np.float32)
+
+    def transform(self, soups: Iterable[str]) -> np.ndarray:
+        """L2-normalised float32 matrix, one row per soup (zeros for unknown text)."""
+        soups = list(soups)
+        out = np.zeros((len(soups), self.vector_size), dtype=np.float32)
+        key_to_index = self.wv.key_to_index
+        vectors = self.wv.vectors
+        for i, s in enumerate(soups):
+            ids = [key_to_index[t] for t in tokenize(s) if t in key_to_index]
+            if ids:
+                w = self.word_weights[ids]
+                out[i] = (vectors[ids] * w[:, None]).sum(axis=0) / w.sum()
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        np.divide(out, norms, out=out, where=norms > 0)
+        return out
+
+    def save(self, path: Path):
+        self.wv.save(str(path))
+
+    @classmethod
+    def load(cls, path: Path, mmap: Optional[str] = "r") -> "ProductEmbedder":
+        from gensim.models import KeyedVectors
+
+        emb = cls()
+        emb.wv = KeyedVectors.load(str(path), mmap=mmap)
+        emb.vector_size = emb.wv.vector_size
+        emb._set_weights()
+        return emb
+
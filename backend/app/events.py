@@ -0,0 +1,173 @@
+"""
+Write-behind buffer for storefront interaction events (views, try-ons,
+cart adds, searches).
+
+`/public/events` only appends to an in-memory ring buffer and returns; it
+never waits on Mongo. A background flusher drains the buffer with one
+unordered `insert_many` per monthly collection (`product_events_YYYYMM`)
+every `flush_ms` or as soon as `flush_batch` events are waiting.
+
+Overload policy: the buffer holds at most `capacity` events. When it is full
+the oldest events are overwritten (and counted as dropped), so a slow or
+unavailable database costs data, not latency or memory. A failed flush puts
+its batch back only if there is room; otherwise it is dropped too.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from collections import deque
+from datetime import datetime
+from typing import Any, Deque, Dict, Iterable, List, Optional, Set
+
+from pymongo.errors import BulkWriteError
+
+from app.config import get_settings
+from app.models import Product
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+COLLECTION_PREFIX = "product_events_"
+
+
+def partition_name(at: datetime) -> str:
+    return f"{COLLECTION_PREFIX}{at:%Y%m}"
+
+
+class EventBuffer:
+    def __init__(self, capacity: int = 50_000, flush_ms: int = 1000, flush_batch: int = 500):
+        self.capacity = capacity
+        self.flush_ms = flush_ms
+        self.flush_batch = flush_batch
+        self._buf: Deque[Dict[str, Any]] = deque(maxlen=capacity)
+        self._indexed: Set[str] = set()
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+        self.accepted = 0
+        self.dropped = 0
+        self.written = 0
+        self.failed_flushes = 0
+        self.last_flush_at: Optional[datetime] = None
+
+    @property
+    def wake(self) -> asyncio.Event:
+        # Created lazily so it binds to the running loop
+        if self._wake is None:
+            self._wake = asyncio.Event()
+        return self._wake
+
+    def __len__(self) -> int:
+        return len(self._buf)
+
+    def push(self, events: Iterable[Dict[str, Any]]) -> int:
+        """Queue events without blocking; returns how many older events were overwritten."""
+        dropped = 0
+        for e in events:
+            if len(self._buf) == self.capacity:
+                dropped += 1
+            self._buf.append(e)
+            self.accepted += 1
+        self.dropped += dropped
+        if len(self._buf) >= self.flush_batch and self._task is not None:
+            self.wake.set()
+        return dropped
+
+    async def _ensure_indexes(self, db, name: str):
+        if name in self._indexed:
+            return
+        coll = db[name]
+        await coll.create_index([("sku", 1), ("ts", -1)])
+        await coll.create_index([("type", 1), ("ts", -1)])
+        self._indexed.add(name)
+
+    async def flush(self) -> int:
+        """Write everything buffered so far; returns the number of events persisted."""
+        if not self._buf:
+            return 0
+        batch: List[Dict[str, Any]] = []
+        while self._buf:
+            batch.append(self._buf.popleft())
+
+        partitions: Dict[str, List[Dict[str, Any]]] = {}
+        for e in batch:
+            partitions.setdefault(partition_name(e["ts"]), []).append(e)
+
+        db = Product.get_motor_collection().database
+        written = 0
+        for name, docs in partitions.items():
+            try:
+                await self._ensure_indexes(db, name)
+                await db[name].insert_many(docs, ordered=False)
+                written += len(docs)
+            except Exception as e:
+                # insert_many set `_id` on every doc, so a retry cannot store one twice
+                self.failed_flushes += 1
+                retry = _requeue_after(docs, e)
+                written += len(docs) - len(retry)
+                room = self.capacity - len(self._buf)
+                keep = retry[:max(0, room)]
+                self._buf.extendleft(reversed(keep))
+                self.dropped += len(retry) - len(keep)
+                logger.error(f"Event flush to {name} failed ({len(retry)} events unsaved, {len(keep)} requeued): {e}")
+        self.written += written
+        self.last_flush_at = datetime.utcnow()
+        return written
+
+    async def _loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self.wake.wait(), timeout=self.flush_ms / 1000.0)
+            except asyncio.TimeoutError:
+                pass
+            self.wake.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Event flusher error: {e}")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error(f"Final event flush failed: {e}")
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "buffered": len(self._buf),
+            "capacity": self.capacity,
+            "accepted": self.accepted,
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed_flushes": self.failed_flushes,
+            "last_flush_at": self.last_flush_at.isoformat() if self.last_flush_at else None,
+        }
+
+
+def _requeue_after(docs: List[Dict[str, Any]], error: Exception) -> List[Dict[str, Any]]:
+    """Events of a failed unordered insert_many that were not stored."""
+    if isinstance(error, BulkWriteError):
+        failed = {
+            err["index"] for err in error.details.get("writeErrors", [])
+            if err.get("code") != 11000   # duplicate _id: stored by an earlier attempt
+        }
+        return [d for i, d in enumerate(docs) if i in failed]
+    return docs
+
+
+# Singleton
+event_buffer = EventBuffer(
+    capacity=settings.EVENTS_BUFFER_SIZE,
+    flush_ms=settings.EVENTS_FLUSH_MS,
+    flush_batch=settings.EVENTS_FLUSH_BATCH,
+)
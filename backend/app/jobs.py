@@ -0,0 +1,222 @@
+"""
+Background job runner for long admin operations.
+
+Jobs are persisted in the `jobs` collection so any worker can answer
+`GET /jobs/{id}`, but they execute in-process on the worker that accepted the
+request, bounded by a semaphore. Cancellation is a flag on the document: the
+owning worker cancels its task directly, other workers' requests are picked up
+on the next progress update or heartbeat.
+
+While a worker holds queued or running jobs (waiting on the semaphore, or
+inside a long `to_thread` call) a heartbeat loop keeps their `heartbeat_at`
+fresh, so `recover_stale` only fails jobs whose worker really went away.
+Every write is a `$set` of the fields it changes, never a full-document save,
+so a `cancel_requested` flag set by another worker is not overwritten.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import socket
+import time
+import traceback
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from app.config import get_settings
+from app.models import Job
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+JOB_OUTPUT_DIR = Path(settings.JOB_OUTPUT_DIR).resolve()
+
+# Persist progress at most this often (seconds)
+PROGRESS_SAVE_INTERVAL = 0.5
+# How often a worker refreshes `heartbeat_at` of the jobs it holds (seconds)
+HEARTBEAT_INTERVAL = 60
+# Jobs whose owner has not heartbeated for this long are considered dead
+STALE_AFTER = timedelta(minutes=5)
+ACTIVE_STATES = ("queued", "running")
+
+FINISHED_STATES = ("succeeded", "failed", "cancelled")
+
+JobFn = Callable[..., Awaitable[Optional[Dict[str, Any]]]]
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class JobContext:
+    """Handle passed to job functions for progress reporting and cancellation checks."""
+
+    def __init__(self, job: Job):
+        self.job = job
+        self._last_save = 0.0
+
+    @property
+    def job_id(self) -> str:
+        return self.job.id
+
+    def output_path(self, suffix: str) -> Path:
+        JOB_OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+        return JOB_OUTPUT_DIR / f"{self.job.id}{suffix}"
+
+    async def progress(self, done: int, total: Optional[int] = None, message: Optional[str] = None, force: bool = False):
+        self.job.progress_done = int(done)
+        if total is not None:
+            self.job.progress_total = int(total)
+        if message is not None:
+            self.job.message = message
+
+        now = time.monotonic()
+        if not force and now - self._last_save < PROGRESS_SAVE_INTERVAL:
+            return
+        self._last_save = now
+        await self.check_cancelled()
+        await self.job.set({
+            "progress_done": self.job.progress_done,
+            "progress_total": self.job.progress_total,
+            "message": self.job.message,
+            "heartbeat_at": datetime.utcnow(),
+        })
+
+    async def check_cancelled(self):
+        fresh = await Job.find_one(Job.id == self.job.id)
+        if fresh and fresh.cancel_requested:
+            self.job.cancel_requested = True
+            raise JobCancelled()
+
+
+class JobRunner:
+    def __init__(self, max_concurrency: int = 2):
+        self.max_concurrency = max_concurrency
+        self._sem: Optional[asyncio.Semaphore] = None
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._heartbeat: Optional[asyncio.Task] = None
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+
+    @property
+    def sem(self) -> asyncio.Semaphore:
+        # Created lazily so it binds to the running loop
+        if self._sem is None:
+            self._sem = asyncio.Semaphore(self.max_concurrency)
+        return self._sem
+
+    async def submit(self, kind: str, fn: JobFn, *args, created_by: Optional[str] = None, **kwargs) -> Job:
+        """
+        Persist a job and schedule `fn(ctx, *args, **kwargs)` on this worker.
+        The return value of `fn` (a dict) becomes `job.result`.
+        """
+        job = Job(kind=kind, created_by=created_by, worker=self.worker_id)
+        await job.insert()
+        task = asyncio.create_task(self._run(job, fn, args, kwargs))
+        self._tasks[job.id] = task
+        task.add_done_callback(lambda _t, jid=job.id: self._tasks.pop(jid, None))
+        if self._heartbeat is None or self._heartbeat.done():
+            self._heartbeat = asyncio.create_task(self._heartbeat_loop())
+        return job
+
+    async def _heartbeat_loop(self):
+        """Keep this worker's queued / running jobs alive; apply other workers' cancel requests."""
+        while self._tasks:
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+            ids = list(self._tasks)
+            if not ids:
+                break
+            try:
+                coll = Job.get_motor_collection()
+                await coll.update_many(
+                    {"_id": {"$in": ids}, "status": {"$in": list(ACTIVE_STATES)}},
+                    {"$set": {"heartbeat_at": datetime.utcnow()}},
+                )
+                async for doc in coll.find({"_id": {"$in": ids}, "cancel_requested": True}, {"_id": 1}):
+                    task = self._tasks.get(doc["_id"])
+                    if task:
+                        task.cancel()
+            except Exception as e:
+                logger.error(f"Job heartbeat failed: {e}")
+
+    async def _run(self, job: Job, fn: JobFn, args, kwargs):
+        ctx = JobContext(job)
+        try:
+            async with self.sem:
+                await ctx.check_cancelled()
+                now = datetime.utcnow()
+                await job.set({"status": "running", "started_at": now, "heartbeat_at": now})
+
+                result = await fn(ctx, *args, **kwargs)
+
+            job.status = "succeeded"
+            job.result = result
+        except (JobCancelled, asyncio.CancelledError):
+            job.status = "cancelled"
+        except Exception as e:
+            logger.error(f"Job {job.id} ({job.kind}) failed: {e}")
+            traceback.print_exc()
+            job.status = "failed"
+            job.error = str(e)
+        finally:
+            now = datetime.utcnow()
+            await job.set({
+                "status": job.status, "result": job.result, "error": job.error,
+                "finished_at": now, "heartbeat_at": now,
+            })
+
+    async def cancel(self, job_id: str) -> Optional[Job]:
+        job = await Job.find_one(Job.id == job_id)
+        if not job or job.status in FINISHED_STATES:
+            return job
+        await job.set({"cancel_requested": True})
+
+        task = self._tasks.get(job_id)
+        if task:
+            task.cancel()
+        return job
+
+    async def recover_stale(self) -> int:
+        """Fail jobs whose owning worker stopped heartbeating (e.g. a restart)."""
+        now = datetime.utcnow()
+        # One conditional update: a job heartbeated in the meantime no longer matches
+        res = await Job.get_motor_collection().update_many(
+            {"status": {"$in": list(ACTIVE_STATES)}, "heartbeat_at": {"$lt": now - STALE_AFTER}},
+            {"$set": {"status": "failed", "error": "Interrupted (worker restarted)", "finished_at": now}},
+        )
+        return res.modified_count
+
+    async def shutdown(self):
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+        for task in list(self._tasks.values()):
+            task.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+
+
+def job_out(job: Job) -> Dict[str, Any]:
+    pct = None
+    if job.progress_total:
+        pct = round(100.0 * job.progress_done / job.progress_total, 1)
+    return {
+        "id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "progress_done": job.progress_done,
+        "progress_total": job.progress_total,
+        "progress_pct": pct,
+        "message": job.message,
+        "result": job.result,
+        "error": job.error,
+        "cancel_requested": job.cancel_requested,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+    }
+
+
+# Singleton
+job_runner = JobRunner(max_concurrency=settings.JOB_MAX_CONCURRENCY)
@@ -1,14 +1,12 @@
 from __future__ import annotations
 
 import csv
-import io
 import os
-import shutil
 import base64
 import asyncio
 from datetime import date, datetime, timedelta
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, List, Optional
 
 import pandas as pd
 from fastapi import Depends, FastAPI, File, HTTPException, Request, UploadFile, Response, BackgroundTasks
@@ -53,11 +51,11 @@ from app.s3_service import (
     generate_presigned_get_url
 )
 from app.schemas import (
+    BatchCustomerRecsIn, BatchSimilarIn, EventsIn,
     GoldRateIn, GoldRateOut,
     GoogleCredentialIn,
     MarkSoldIn,
     MetricOut,
-    PrescriptiveCard,
     ProductIn, ProductOut, ProductImageOut,
     ReserveIn,
     WishlistIn, WishlistOut,
@@ -69,8 +67,19 @@ from app.schemas import (
     ReservationOut,
     CustomerSignupIn, CustomerLoginIn, CustomerGoogleAuthIn, CustomerGoogleAuthOut
 )
-from app.recommender import recommender
+from app.analytics import compute_prescriptive
+from app.cache import analytics_cache
+from app.events import event_buffer
+from app.neighbor_index import category_key
+from app.recommender import products_by_skus
+from app.recommender_service import recommender_service
+from app.sales_facts import sales_facts
+from app.personalized_batch import JOB_KIND as PERSONALIZED_JOB_KIND, personalized_batch, precompute_job
+from app.csv_ingest import ingest_batch_csv
+from app.buffer_uploads import save_buffer_uploads
+from app.jobs import JobContext, job_runner
 from app.tryon import try_on_service
+from app.zones import ZONES, save_with_zone, stamp_zone, zone_counter, zone_for
 
 
 from contextlib import asynccontextmanager
@@ -103,20 +112,26 @@ async def lifespan(app: FastAPI):
         await admin.insert()
         print(f"Default admin {default_email} created.")
 
-    # Train recommender
-    try:
-        print("Starting recommender training...")
-        products = await Product.find(Product.is_archived == False).to_list()
-        print(f"Fetched {len(products)} products for training.")
-        recommender.fit(products)
-        print("Recommender training done.")
-    except Exception as e:
-        print(f"Error training recommender: {e}")
-        import traceback
-        traceback.print_exc()
+    # Map persisted recommender artifacts (only one worker fits if they are stale)
+    # and start the background retrain loop
+    await recommender_service.start()
+    personalized_batch.start()
+    event_buffer.start()
+    await zone_counter.start()
+    await sales_facts.start()
+
+    stale = await job_runner.recover_stale()
+    if stale:
+        print(f"Marked {stale} interrupted jobs as failed.")
 
     yield
-    # Shutdown logic if needed
+    # Shutdown: stop in-flight jobs so they are recorded as cancelled
+    await job_runner.shutdown()
+    await personalized_batch.stop()
+    await event_buffer.stop()
+    await zone_counter.stop()
+    await sales_facts.stop()
+    await recommender_service.stop()
 
 app = FastAPI(title="RoyalIQ Retailer Admin", version="1.0", lifespan=lifespan)
 
@@ -145,9 +160,10 @@ app.mount("/media", StaticFiles(directory=str(MEDIA_DIR)), name="media")
 # -----------------------
 # Helpers (Async)
 # -----------------------
-from app.routers import procurement, shop
+from app.routers import procurement, shop, jobs
 app.include_router(procurement.router, prefix="/procurement", tags=["Procurement"])
 app.include_router(shop.router, prefix="/shop", tags=["Shop"])
+app.include_router(jobs.router, prefix="/jobs", tags=["Jobs"])
 
 import time
 
@@ -195,26 +211,6 @@ def _bayesian_mean(avg: float, v: int, global_avg: float, m: int = 5) -> float:
     return (v / (v + m)) * avg + (m / (v + m)) * global_avg
 
 
-async def _status_zone(p: Product, days_in_stock: int) -> str:
-    # Check if Sold (qty 0 and exists in archive)
-    if p.qty == 0:
-        is_sold = await SaleArchive.find_one(SaleArchive.sku == p.sku)
-        if is_sold:
-            return "Sold"
-
-    # Check Reserved
-    # Fetch reservations
-    res_count = await Reservation.find(Reservation.sku == p.sku).count()
-    if (p.reserved_name and p.reserved_phone) or res_count > 0:
-        return "Reserved"
-        
-    if days_in_stock <= 90:
-        return "Fresh"
-    if days_in_stock <= 180:
-        return "Watch"
-    return "Dead"
-
-
 def _retail_valuation_inr(weight_g: Optional[float], gold_rate: float) -> Optional[float]:
     if weight_g is None:
         return None
@@ -244,13 +240,8 @@ GLOBAL_RATING_AVG = 4.5
 
 
 def _determine_status_zone(p: Product, days_in_stock: int, is_sold: bool, res_count: int) -> str:
-    if p.qty == 0 and is_sold:
-        return "Sold"
-    if (p.reserved_name and p.reserved_phone) or res_count > 0:
-        return "Reserved" 
-    if days_in_stock <= 90: return "Fresh"
-    if days_in_stock <= 180: return "Watch"
-    return "Dead"
+    held = bool(p.reserved_name and p.reserved_phone) or res_count > 0
+    return zone_for(p.qty, is_sold, held, days_in_stock)
 
 async def _product_out(p: Product) -> ProductOut:
     gold_rate = await _get_gold_rate()
@@ -264,8 +255,8 @@ async def _product_out(p: Product) -> ProductOut:
         Reservation.find(Reservation.sku == p.sku).to_list()
     ]
     
-    # Add sale archive check only if qty is 0
-    check_sold = (p.qty == 0)
+    # Add sale archive check only if qty is 0 and the zone was never stored
+    check_sold = (p.qty == 0 and p.status_zone is None)
     if check_sold:
         tasks.append(SaleArchive.find_one(SaleArchive.sku == p.sku))
     
@@ -288,7 +279,11 @@ async def _product_out(p: Product) -> ProductOut:
     days_in_stock = (date.today() - base_date).days
     
     res_count = len(reservations)
-    zone = _determine_status_zone(p, days_in_stock, bool(is_sold_record), res_count)
+    if p.status_zone in ("Reserved", "Sold"):
+        zone = p.status_zone
+    else:
+        # Aging zones are re-derived so a read never waits for the sweep
+        zone = _determine_status_zone(p, days_in_stock, bool(is_sold_record), res_count)
     
     val = _retail_valuation_inr(p.weight_g, gold_rate)
 
@@ -680,6 +675,20 @@ async def finalize_image_upload(payload: ImageFinalizeIn, request: Request):
     }
 
 
+async def _unshared_keys(keys: List[str], released_ids: List[str]) -> List[str]:
+    """
+    The S3 keys no ProductImage outside `released_ids` still points at, i.e. safe to delete.
+    Bulk imports reuse one upload for identical photos (gallery rows, other SKUs).
+    """
+    keys = list(dict.fromkeys(k for k in keys if k))
+    if not keys:
+        return []
+    shared = set(await ProductImage.get_motor_collection().distinct(
+        "s3_key", {"s3_key": {"$in": keys}, "_id": {"$nin": list(released_ids)}},
+    ))
+    return [k for k in keys if k not in shared]
+
+
 @app.delete("/images/{image_id}")
 async def queue_image_deletion(image_id: str, request: Request):
     get_current_admin(request)
@@ -688,8 +697,8 @@ async def queue_image_deletion(image_id: str, request: Request):
     if not img:
         raise HTTPException(status_code=404, detail="Image not found")
     
-    # Only queue if it has an S3 key
-    if img.s3_key:
+    # Only queue if it has an S3 key no other image still uses
+    if img.s3_key and await _unshared_keys([img.s3_key], [img.id]):
         existing = await S3DeletionQueue.find_one(S3DeletionQueue.key == img.s3_key)
         
         if not existing:
@@ -751,39 +760,19 @@ async def dashboard_metrics(request: Request):
     # Engagement
     engagement = await Rating.count()
 
-    # Asset zones - expensive loop, optimize?
-    # For now, fetch all active products
-    products = await Product.find(Product.is_archived == False).to_list()
-    
-    zone_fresh = zone_watch = zone_dead = zone_reserved = 0
-    
-    # Pre-fetch reservations for all products to avoid N+1? 
-    # Or just do N+1 for now as dataset is small? 
-    # Let's trust _status_zone calls are reasonably fast or Mongo handles it.
-    
-    for p in products:
-        base_date = p.purchase_date or p.created_at.date()
-        days_in_stock = (date.today() - base_date).days
-        z = await _status_zone(p, days_in_stock)
-        
-        if z == "Reserved":
-            zone_reserved += 1
-        elif z == "Fresh":
-            zone_fresh += 1
-        elif z == "Watch":
-            zone_watch += 1
-        else:
-            zone_dead += 1
+    # Asset zones: in-memory counters (see app/zones.py), no product scan here
+    zones = await zone_counter.get_counts()
 
     return MetricOut(
         active_sourcing=active_sourcing,
         concept_items=concept_items,
         revenue_recovery=revenue_recovery,
         engagement=engagement,
-        zone_fresh=zone_fresh,
-        zone_watch=zone_watch,
-        zone_dead=zone_dead,
-        zone_reserved=zone_reserved,
+        zone_fresh=zones["Fresh"],
+        zone_watch=zones["Watch"],
+        zone_dead=zones["Dead"],
+        zone_reserved=zones["Reserved"],
+        zone_sold=zones["Sold"],
     )
 
 
@@ -841,9 +830,9 @@ async def public_get_product(sku: str):
         out = await _product_out(p)
         
         # Add related products
-        if recommender.is_fitted:
-             sim_products = recommender.get_similar_products(sku, top_n=5)
-             out.related_products = [rec.sku for rec in sim_products]
+        rec = recommender_service.current
+        if rec.is_fitted:
+             out.related_products = rec.similar_skus(sku, top_n=5)
              
         return out
     except Exception as e:
@@ -855,6 +844,7 @@ async def public_get_product(sku: str):
 # Recommendation API
 # -----------------------
 
+
 @app.get("/recommendations/product/{sku}")
 async def recommend_similar_products(sku: str, limit: int = 5):
     """
@@ -862,14 +852,15 @@ async def recommend_similar_products(sku: str, limit: int = 5):
     """
     try:
         # Check if product exists
-        if sku not in recommender.products_map:
+        rec = recommender_service.current
+        if sku not in rec.sku_to_idx:
              # Try refreshing if not found (maybe added recently)
              # But fetching all is expensive.
              # Just return empty or error.
              # raise HTTPException(status_code=404, detail="Product not found in model")
              return []
              
-        sim_products = recommender.get_similar_products(sku, top_n=limit)
+        sim_products = await products_by_skus(rec.similar_skus(sku, top_n=limit))
         
         out = []
         for p in sim_products:
@@ -880,6 +871,57 @@ async def recommend_similar_products(sku: str, limit: int = 5):
         return []
 
 
+@app.get("/recommendations/trending")
+async def recommend_trending(limit: int = 10, category: Optional[str] = None):
+    """Hottest products by time-decayed orders, sales, reservations and ratings."""
+    lim = max(1, min(int(limit), 50))
+    rec = recommender_service.current
+    skus = rec.trending_skus(lim, category=category_key(category) if category else None)
+    return [await _product_out(p) for p in await products_by_skus(skus)]
+
+
+@app.post("/recommendations/batch/products")
+async def recommend_similar_batch(payload: BatchSimilarIn):
+    """Similar SKUs for many products at once: {sku: [similar skus]} (unknown SKUs omitted)."""
+    rec = recommender_service.current
+    return {"ok": True, "items": rec.similar_skus_batch(payload.skus, top_n=payload.limit)}
+
+
+@app.post("/recommendations/batch/customers")
+async def recommend_customers_batch(payload: BatchCustomerRecsIn, request: Request):
+    """Personalized SKUs for many customers (Customer ids) at once."""
+    get_current_admin(request)
+    items = await recommender_service.recommend_for_customers(payload.customer_ids, top_n=payload.limit)
+    return {"ok": True, "items": items}
+
+
+async def _refit_recommender_job(ctx: JobContext):
+    await ctx.progress(0, 1, "Training in background process", force=True)
+    how = await recommender_service.refresh(force=True)
+    await ctx.progress(1, 1, "Done", force=True)
+    return {"outcome": how, **recommender_service.status()}
+
+
+@app.post("/recommendations/refit")
+async def refit_recommender(request: Request):
+    admin = get_current_admin(request)
+    job = await job_runner.submit("recommender_refit", _refit_recommender_job, created_by=admin.email)
+    return JSONResponse({"ok": True, "job_id": job.id, "status": job.status}, status_code=202)
+
+
+@app.get("/recommendations/model")
+async def recommender_model(request: Request):
+    get_current_admin(request)
+    return {"ok": True, **recommender_service.status()}
+
+
+@app.post("/recommendations/personalized/precompute")
+async def precompute_personalized(request: Request):
+    admin = get_current_admin(request)
+    job = await job_runner.submit(PERSONALIZED_JOB_KIND, precompute_job, created_by=admin.email)
+    return JSONResponse({"ok": True, "job_id": job.id, "status": job.status}, status_code=202)
+
+
 @app.get("/recommendations/personalized")
 async def recommend_personalized(limit: int = 5, request: Request = None):
     """
@@ -912,14 +954,7 @@ async def recommend_personalized(limit: int = 5, request: Request = None):
         # But my implementation looks up DB.
         # Let's just pass None? My method expects string.
         # I'll handle it here.
-        sim_products = recommender.get_similar_products("random", top_n=limit) # This will fail or return empty
-        # Let's manually call cold start logic or just pick random.
-        if recommender.products_map:
-             import random
-             all_skus = list(recommender.products_map.keys())
-             sim_products = [recommender.products_map[k] for k in random.sample(all_skus, min(len(all_skus), limit))]
-        else:
-             sim_products = []
+        sim_skus = recommender_service.current.random_skus(limit)
     else:
         # Get personalized
         # user_id is phone number (from token sub).
@@ -932,13 +967,28 @@ async def recommend_personalized(limit: int = 5, request: Request = None):
         # When creating rating (not shown in `main.py` snippet), what do we save?
         # I should check how Ratings are saved.
         # If I can't check, I'll assume we need to pass the ID or Phone.
-        # Let's fetch the customer to get the ID.
-        cust = await Customer.find_one(Customer.phone == user_id)
-        if cust:
-            sim_products = await recommender.recommend_for_user(str(cust.id), top_n=limit)
+        # The nightly batch stores lists keyed by phone; serve those when present.
+        stored = await personalized_batch.lookup(user_id)
+        if stored:
+            # Freshness: drop items removed from the model (archived/deleted) and
+            # sold physical pieces; over-fetch so the filter still leaves `limit`
+            live = recommender_service.current.sku_to_idx
+            fresh = [s for s in stored.skus if s in live][:limit * 2]
+            sim_products = [
+                p for p in await products_by_skus(fresh)
+                if p.qty > 0 or p.stock_type != "physical"
+            ][:limit]
+            if sim_products:
+                return [await _product_out(p) for p in sim_products]
+
+        # Phone -> Customer.id is cached by the profile store.
+        cust_id = await recommender_service.profiles.customer_id_for_phone(user_id)
+        if cust_id:
+            sim_skus = await recommender_service.recommend_for_customer(cust_id, top_n=limit)
         else:
-            sim_products = []
-            
+            sim_skus = []
+
+    sim_products = await products_by_skus(sim_skus)
     out = []
     for p in sim_products:
         out.append(await _product_out(p))
@@ -946,6 +996,23 @@ async def recommend_personalized(limit: int = 5, request: Request = None):
 
 
 
+@app.post("/public/events", status_code=202)
+async def public_events(payload: EventsIn):
+    """
+    Batched storefront events (view / try_on / cart_add / search). Buffered in
+    memory and written behind; the response never waits on the database.
+    """
+    now = datetime.utcnow()
+    dropped = event_buffer.push({**e.model_dump(exclude_none=True), "ts": now} for e in payload.events)
+    return {"ok": True, "accepted": len(payload.events), "dropped": dropped}
+
+
+@app.get("/events/stats")
+async def event_stats(request: Request):
+    get_current_admin(request)
+    return {"ok": True, **event_buffer.status()}
+
+
 @app.post("/public/orders")
 async def public_create_order(payload: PublicOrderIn):
     cust = await Customer.find_one(Customer.phone == payload.customer_phone)
@@ -975,6 +1042,9 @@ async def public_create_order(payload: PublicOrderIn):
         items=items_list
     )
     await order.insert()
+    recommender_service.record_order(str(cust.id), [(i.sku, i.price) for i in items_list])
+    await sales_facts.record("order", str(order.id), [(i.sku, i.qty) for i in items_list], order.created_at)
+    analytics_cache.invalidate("orders")
     return order
 
 
@@ -990,6 +1060,7 @@ async def list_products(
     weight_min: float = 0.0,
     weight_max: float = 0.0,
     include_archived: int = 0,
+    zone: str = "",
     limit: int = 200,
 ):
     get_current_admin(request)
@@ -1021,6 +1092,13 @@ async def list_products(
     if weight_max > 0:
         query = query.find(LTE(Product.weight_g, weight_max))
 
+    if zone.strip():
+        # Materialized zone (status_zone + updated_at index)
+        z = zone.strip().capitalize()
+        if z not in ZONES:
+            raise HTTPException(status_code=400, detail=f"Unknown zone. Expected one of: {', '.join(ZONES)}")
+        query = query.find(Product.status_zone == z)
+
     lim = max(1, min(int(limit), 500))
     items = await query.sort(-Product.updated_at).limit(lim).to_list()
     
@@ -1066,7 +1144,7 @@ async def create_product(payload: ProductIn, request: Request):
         options=payload.options,
         tags=payload.tags or [],
     )
-    await p.insert()
+    await save_with_zone(p, insert=True)
 
     # Handle Image Upload (Base64) - Upload to S3
     if payload.image_base64:
@@ -1125,6 +1203,8 @@ async def create_product(payload: ProductIn, request: Request):
             except Exception as e:
                 print(f"Error uploading additional image: {e}")
     
+    recommender_service.upsert(p)
+    analytics_cache.invalidate("products")
     return await _product_out(p)
 
 
@@ -1165,12 +1245,10 @@ async def update_product(sku: str, payload: ProductIn, request: Request, bg_task
     if payload.image_base64:
         try:
             old_primary = await ProductImage.find(ProductImage.sku == sku, ProductImage.is_primary == True).to_list()
-            keys_to_delete = []
             for op in old_primary:
                 op.is_primary = False
                 await op.save()
-                if op.s3_key:
-                    keys_to_delete.append(op.s3_key)
+            keys_to_delete = await _unshared_keys([op.s3_key for op in old_primary], [op.id for op in old_primary])
             
             if keys_to_delete:
                 bg_tasks.add_task(_bg_task_delete_keys, keys_to_delete)
@@ -1198,7 +1276,7 @@ async def update_product(sku: str, payload: ProductIn, request: Request, bg_task
         except Exception as e:
              raise HTTPException(status_code=500, detail=f"Image upload failed: {str(e)}")
 
-    await p.save()
+    await save_with_zone(p)
 
     if payload.additional_images:
         for idx, b64 in enumerate(payload.additional_images):
@@ -1227,6 +1305,8 @@ async def update_product(sku: str, payload: ProductIn, request: Request, bg_task
             except Exception as e:
                 print(f"Error adding additional image: {e}")
                 
+    recommender_service.upsert(p)
+    analytics_cache.invalidate("products")
     return await _product_out(p)
 
 
@@ -1238,12 +1318,15 @@ async def delete_product(sku: str, request: Request, bg_tasks: BackgroundTasks):
         return {"ok": True}
     
     images = await ProductImage.find(ProductImage.sku == sku).to_list()
-    keys_to_delete = [img.s3_key for img in images if img.s3_key]
+    keys_to_delete = await _unshared_keys([img.s3_key for img in images], [img.id for img in images])
     
     if keys_to_delete:
         bg_tasks.add_task(_bg_task_delete_keys, keys_to_delete)
 
     await p.delete()
+    recommender_service.remove(sku)
+    analytics_cache.invalidate("products")
+    zone_counter.remove(sku)
     return {"ok": True}
 
 
@@ -1270,13 +1353,14 @@ async def reserve_product(sku: str, payload: ReserveIn, request: Request):
         created_at=datetime.utcnow()
     )
     await res.insert()
+    recommender_service.record_reservation(sku, req_qty)
     
     # Update legacy info for convenience
     p.reserved_name = payload.name.strip()
     p.reserved_phone = payload.phone.strip()
     p.updated_at = datetime.utcnow()
     
-    await p.save()
+    await save_with_zone(p)
     return await _product_out(p)
 
 
@@ -1300,7 +1384,7 @@ async def release_all_reservations(sku: str, request: Request):
         await res.delete()
         
     p.updated_at = datetime.utcnow()
-    await p.save()
+    await save_with_zone(p)
     return await _product_out(p)
 
 
@@ -1312,17 +1396,15 @@ async def release_single_reservation(reservation_id: str, request: Request):
         raise HTTPException(status_code=404, detail="Reservation not found")
         
     p = await Product.find_one(Product.sku == res.sku)
+    await res.delete()
+
     if p:
         p.qty += res.qty
         if p.reserved_name == res.name:
             p.reserved_name = None
             p.reserved_phone = None
         p.updated_at = datetime.utcnow()
-        await p.save()
-        
-    await res.delete()
-    
-    if p:
+        await save_with_zone(p)
         return await _product_out(p)
     return {"ok": True}
 
@@ -1339,6 +1421,7 @@ async def mark_sold(sku: str, payload: MarkSoldIn, request: Request):
 
     p.qty = 0
     p.updated_at = datetime.utcnow()
+    stamp_zone(p, reserved=False, sold=True)   # qty 0 + archived is Sold whatever else holds it
     await p.save()
 
     existing = await SaleArchive.find_one(SaleArchive.sku == sku)
@@ -1350,6 +1433,10 @@ async def mark_sold(sku: str, payload: MarkSoldIn, request: Request):
             days_to_sell=int(days_to_sell),
         )
         await s.insert()
+        recommender_service.record_sale(sku)
+        await sales_facts.record("sale", str(s.id), [(sku, 1)], s.sold_at)
+        analytics_cache.invalidate("sales")
+    zone_counter.upsert(p, sold=True)
 
     return {"ok": True, "sku": sku, "days_to_sell": int(days_to_sell)}
 
@@ -1390,18 +1477,7 @@ async def buffer_images(
 ):
     admin = get_current_admin(request)
     buf_dir = _admin_buffer_dir(admin.email)
-
-    saved = []
-    for f in files:
-        if not f.filename:
-            continue
-        dest = buf_dir / Path(f.filename).name
-        with dest.open("wb") as out:
-            content = await f.read()
-            out.write(content)
-        saved.append(dest.name)
-
-    return {"ok": True, "buffer_count": len(saved), "files": saved}
+    return await save_buffer_uploads(files, buf_dir, settings.MAX_UPLOAD_MB * 1024 * 1024)
 
 
 @app.post("/uploads/batch_csv")
@@ -1417,12 +1493,6 @@ async def batch_csv(
     if not csv_file.filename:
         raise HTTPException(status_code=400, detail="Missing CSV file")
 
-    content = await csv_file.read()
-    try:
-        df = pd.read_csv(io.BytesIO(content))
-    except Exception:
-        raise HTTPException(status_code=400, detail="Invalid CSV")
-
     gdate = None
     if global_date.strip():
         try:
@@ -1430,79 +1500,23 @@ async def batch_csv(
         except Exception:
             raise HTTPException(status_code=400, detail="global_date must be YYYY-MM-DD")
 
-    created = 0
-    matched_images = 0
-
-    for _, row in df.iterrows():
-        sku = str(row.get("sku") or "").strip()
-        name = str(row.get("name") or row.get("title") or "").strip()
-        if not sku or not name:
-            continue
-
-        if await Product.find_one(Product.sku == sku):
-            continue
-
-        desc = str(row.get("description") or "").strip() or None
-        category = str(row.get("category") or "").strip() or None
-        subcategory = str(row.get("subcategory") or "").strip() or None
+    content = await csv_file.read()
 
-        weight_g = None
+    async def _run(ctx: JobContext):
         try:
-            w = row.get("weight_g")
-            if w is not None and str(w).strip() != "":
-                weight_g = float(w)
-        except Exception:
-            weight_g = None
-
-        pdate = gdate
-        if not pdate:
-            raw = str(row.get("purchase_date") or "").strip()
-            if raw:
-                try:
-                    pdate = datetime.strptime(raw, "%Y-%m-%d").date()
-                except Exception:
-                    pdate = None
-
-        qty = 1
-        try:
-            qv = row.get("qty")
-            if qv is not None and str(qv).strip() != "":
-                qty = int(qv)
-        except Exception:
-            qty = 1
-
-        p = Product(
-            sku=sku,
-            name=name,
-            description=desc,
-            category=category,
-            subcategory=subcategory,
-            weight_g=weight_g,
-            stock_type=(str(row.get("stock_type") or stock_type).strip().lower() or "physical"),
-            qty=qty,
-            purchase_date=pdate,
-            created_at=datetime.utcnow(),
-            updated_at=datetime.utcnow(),
-            is_archived=False,
-        )
-        await p.insert()
-        created += 1
-
-        img_name = str(row.get("image_filename") or row.get("image") or row.get("filename") or "").strip()
-        if img_name:
-            candidate = buf_dir / Path(img_name).name
-            if candidate.exists():
-                prod_dir = MEDIA_DIR / "products" / sku
-                prod_dir.mkdir(parents=True, exist_ok=True)
-                dest = prod_dir / candidate.name
-                shutil.move(str(candidate), str(dest))
-                rel_path = f"products/{sku}/{dest.name}"
-
-                img = ProductImage(sku=sku, path=rel_path, is_primary=True)
-                await img.insert()
-                matched_images += 1
+            result = await ingest_batch_csv(
+                content, buf_dir, MEDIA_DIR, gdate=gdate, stock_type=stock_type,
+                on_progress=ctx.progress,
+            )
+            if result.get("created"):
+                recommender_service.mark_dirty()
+                analytics_cache.invalidate("products")
+            return result
+        except (pd.errors.ParserError, pd.errors.EmptyDataError, UnicodeDecodeError):
+            raise ValueError("Invalid CSV")
 
-    return {"ok": True, "created": created, "matched_images": matched_images}
+    job = await job_runner.submit("csv_import", _run, created_by=admin.email)
+    return JSONResponse({"ok": True, "job_id": job.id, "status": job.status}, status_code=202)
 
 
 
@@ -1512,110 +1526,14 @@ async def batch_csv(
 @app.get("/intelligence/prescriptive")
 async def prescriptive(request: Request):
     get_current_admin(request)
-
-    cutoff = datetime.utcnow() - timedelta(days=90)
-
-    # Sales velocity: sold in last 90 days.
-    # Beanie aggregation or simple fetch.
-    sold_recent = await SaleArchive.find(SaleArchive.sold_at >= cutoff).to_list()
-    sold_skus = [s.sku for s in sold_recent]
-
-    # Current stock
-    stock = await Product.find(Product.is_archived == False).to_list()
-    stock_by_cat: Dict[str, int] = {}
-    for p in stock:
-        cat = (p.category or "Unknown").strip() or "Unknown"
-        stock_by_cat[cat] = stock_by_cat.get(cat, 0) + 1
-
-    # Sold by cat (best effort)
-    # We need to look up product category for sold SKUs.
-    # Since products might be deleted or archived, we try to find them.
-    # If deleted, we can't know category easily unless we archived it in SaleArchive (not currently there).
-    # We will query Product even if archived.
-    sold_by_cat: Dict[str, int] = {}
-    
-    # Optimization: Fetch all products (including archived) into a map?
-    # If database is huge, this is bad. But for now, let's do individual lookups or `in` query.
-    # sold_skus might be large?
-    # Let's do `in` query
-    products_sold = await Product.find(Product.sku.in_(sold_skus)).to_list() # type: ignore
-    product_map = {p.sku: p for p in products_sold}
-
-    for sku in sold_skus:
-        p = product_map.get(sku)
-        cat = (p.category if p else "Unknown") or "Unknown"
-        cat = cat.strip() or "Unknown"
-        sold_by_cat[cat] = sold_by_cat.get(cat, 0) + 1
-
-    # Ratings by cat
-    # Rating document has SKU.
-    # Join Rating -> Product to get category.
-    # Beanie aggregation with lookup? Beanie supports native Mongo syntax.
-    # { $lookup: { from: "products", ... } } 
-    # But product SKU is indexed string, not ObjId.
-    
-    # Alternative: Iterate all ratings and fetch product? Slow.
-    # Alternative 2: Iterate all products and fetch average rating? Slow.
-    # Alternative 3: Since we already fetched `stock` (all active products), we can iterate them and find their ratings?
-    # We need a robust way.
-    # Let's try to aggregate on Rating side, but we need category.
-    # For now, let's use the `stock` list we already have (active products) and aggregate in memory if dataset < 10k.
-    # Iterate stock, fetch ratings for each? N+1.
-    
-    # Let's skip complex aggregation for now or do a simplified version.
-    # Fetch ALL ratings.
-    all_ratings = await Rating.find().to_list()
-    ratings_map = {} # sku -> list of stars
-    for r in all_ratings:
-        if r.sku not in ratings_map:
-            ratings_map[r.sku] = []
-        ratings_map[r.sku].append(r.stars)
-        
-    ratings_by_cat: Dict[str, Tuple[float, int]] = {} # cat -> (sum, count)
-    
-    for p in stock:
-        cat = (p.category or "Unknown").strip() or "Unknown"
-        stars = ratings_map.get(p.sku, [])
-        if stars:
-            s, c = ratings_by_cat.get(cat, (0.0, 0))
-            ratings_by_cat[cat] = (s + sum(stars), c + len(stars))
-            
-    # Compute avg
-    final_ratings_by_cat = {}
-    for cat, (s, c) in ratings_by_cat.items():
-        if c > 0:
-            final_ratings_by_cat[cat] = (s / c, c)
-
-    buy = []
-    trial = []
-    avoid = []
-
-    for cat, stock_cnt in stock_by_cat.items():
-        sold_cnt = sold_by_cat.get(cat, 0)
-        avg_rating, votes = final_ratings_by_cat.get(cat, (0.0, 0))
-
-        if sold_cnt > stock_cnt:
-            buy.append(f"{cat} (sold90={sold_cnt}, stock={stock_cnt})")
-
-        if avg_rating >= 4.0 and votes >= 3 and sold_cnt <= max(1, stock_cnt // 3):
-            trial.append(f"{cat} (rating={avg_rating:.2f}, votes={votes})")
-
-        dead_cnt = 0
-        for p in stock:
-            if (p.category or "Unknown").strip() == cat:
-                base_date = p.purchase_date or p.created_at.date()
-                days = (date.today() - base_date).days
-                if days > 180:
-                    dead_cnt += 1
-        if dead_cnt >= 3:
-            avoid.append(f"{cat} (deadstock={dead_cnt})")
-
-    cards = [
-        PrescriptiveCard(title="Strategic BUY", color="green", items=buy[:15]).model_dump(),
-        PrescriptiveCard(title="Market TRIAL", color="yellow", items=trial[:15]).model_dump(),
-        PrescriptiveCard(title="Strategic AVOID", color="red", items=avoid[:15]).model_dump(),
-    ]
-    return {"ok": True, "cards": cards}
+    # Server-side per-category pipelines (app/analytics.py). The last snapshot is served at
+    # once and recomputed in the background after a product / sale / rating write, the TTL,
+    # or a new day (deadstock ages daily)
+    snap = await analytics_cache.get_snapshot(
+        "prescriptive", ("products", "sales", "ratings"), compute_prescriptive, epoch=date.today(),
+    )
+    return {"ok": True, "cards": snap.value, "snapshot_age_seconds": round(snap.age_seconds, 1),
+            "refreshing": snap.refreshing}
 
 
 @app.post("/wishlist")
@@ -1820,7 +1738,10 @@ async def create_order_endpoint(payload: OrderIn, request: Request):
         items=items_list
     )
     await o.insert()
-    
+    recommender_service.record_order(o.customer_id, [(i.sku, i.price) for i in items_list])
+    await sales_facts.record("order", str(o.id), [(i.sku, i.qty) for i in items_list], o.created_at)
+    analytics_cache.invalidate("orders")
+
     return await _order_out(o)
 
 
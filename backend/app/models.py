@@ -6,6 +6,7 @@ import uuid
 
 from beanie import Document, Indexed
 from pydantic import Field, BaseModel
+from pymongo import ASCENDING, DESCENDING, IndexModel
 
 def _uuid() -> str:
     return uuid.uuid4().hex
@@ -93,8 +94,17 @@ class Product(Document):
     options: Optional[Dict] = None
     tags: Optional[List[str]] = None
 
+    # Materialized status zone (Fresh/Watch/Dead/Reserved/Sold), see app/zones.py
+    status_zone: Optional[str] = None
+    zone_changed_at: Optional[datetime] = None
+
     class Settings:
         name = "products"
+        indexes = [
+            # Zone listing (newest first) and the aging sweep's base-date ranges
+            IndexModel([("status_zone", ASCENDING), ("updated_at", DESCENDING)]),
+            IndexModel([("status_zone", ASCENDING), ("purchase_date", ASCENDING), ("created_at", ASCENDING)]),
+        ]
 
 class S3DeletionQueue(Document):
     bucket: str
@@ -169,6 +179,57 @@ class Order(Document):
     class Settings:
         name = "orders"
 
+class PersonalizedRecs(Document):
+    # Nightly precomputed personalized SKUs for one customer (best first)
+    customer_id: Indexed(str)
+    phone: Optional[Indexed(str)] = None
+    skus: List[str] = []
+    model_version: Optional[str] = None
+    batch_id: Indexed(str)
+    computed_at: datetime = Field(default_factory=datetime.utcnow)
+
+    class Settings:
+        name = "personalized_recs"
+
+class TrendingSnapshot(Document):
+    # Forward-decayed trending counters (see app.trending); a single document
+    id: str = Field(default_factory=_uuid)
+    landmark: datetime
+    as_of: datetime
+    half_life_hours: float
+    skus: List[str] = []
+    scores: List[float] = []
+
+    class Settings:
+        name = "trending_snapshots"
+
+class SalesFact(Document):
+    # Append-only: units of one SKU sold by one order or archive sale, on a UTC day
+    sku: str
+    day: date
+    units: int = 1
+    source: str            # "order" / "sale"
+    ref: str               # Order id / SaleArchive id
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+    class Settings:
+        name = "sales_facts"
+        indexes = [
+            IndexModel([("source", ASCENDING), ("ref", ASCENDING), ("sku", ASCENDING)], unique=True),
+            IndexModel([("day", ASCENDING), ("sku", ASCENDING)]),
+        ]
+
+class SalesRollup(Document):
+    # Units per SKU over the trailing 7/30/60/90 days (see app.sales_facts)
+    sku: Indexed(str, unique=True)
+    units_7: int = 0
+    units_30: int = 0
+    units_60: int = 0
+    units_90: int = 0
+
+    class Settings:
+        name = "sales_rollups"
+
 class AdminAccount(Document):
     email: Indexed(str, unique=True)
     hashed_password: str
@@ -178,3 +239,26 @@ class AdminAccount(Document):
 
     class Settings:
         name = "admin_accounts"
+
+class Job(Document):
+    # Long-running admin operation (CSV import, refit, export...)
+    id: str = Field(default_factory=_uuid)
+    kind: Indexed(str)
+    status: str = "queued"  # queued/running/succeeded/failed/cancelled
+    progress_done: int = 0
+    progress_total: int = 0
+    message: Optional[str] = None
+    result: Optional[Dict] = None
+    error: Optional[str] = None
+
+    created_by: Optional[str] = None
+    worker: Optional[str] = None  # host:pid that owns the task
+    cancel_requested: bool = False
+
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    heartbeat_at: datetime = Field(default_factory=datetime.utcnow)
+
+    class Settings:
+        name = "jobs"
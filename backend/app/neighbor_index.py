@@ -0,0 +1,248 @@
+"""
+Precomputed top-K neighbor index for "similar products".
+
+Built once at fit time: for every item we keep the K best neighbors by
+blended score (content cosine + price closeness) in two compact arrays,
+
+    idx[N, K]    int32    neighbor row (-1 = empty slot)
+    score[N, K]  float32  blended score, descending per row
+
+so a lookup is an O(K) array read. Scores are computed per category with
+chunked sparse products (X_chunk @ X_group.T), which keeps both time and
+peak memory proportional to the category sizes instead of N^2. Items in
+categories smaller than K are scored against the whole catalog so they still
+get a full neighbor list.
+
+Single-item changes (`upsert_item`, `drop_item`, `move_item`) patch the
+arrays in place: the item's own row is rescored against the same column set
+`build` would use, it is spliced into other rows where it beats their
+current K-th neighbor, and rows that lost it are rescored so they stay exact.
+"""
+
+from __future__ import annotations
+
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from scipy import sparse
+
+# Dense score block budget (cells) per chunk: 16M float32 ~ 64 MB
+BLOCK_CELLS = 16_000_000
+
+
+def category_key(c: Optional[str]) -> str:
+    return (c or "").strip().lower()
+
+
+def top_k_rows(scores: np.ndarray, k: int):
+    """Row-wise top-k (descending) of a dense block via argpartition."""
+    n_cols = scores.shape[1]
+    k = min(k, n_cols)
+    if k <= 0:
+        return np.empty((scores.shape[0], 0), dtype=np.int64), np.empty((scores.shape[0], 0), dtype=np.float32)
+    part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    part_scores = np.take_along_axis(scores, part, axis=1)
+    order = np.argsort(-part_scores, axis=1)
+    return np.take_along_axis(part, order, axis=1), np.take_along_axis(part_scores, order, axis=1)
+
+
+class NeighborIndex:
+    def __init__(self, k: int = 50, content_weight: float = 0.85, price_weight: float = 0.15):
+        self.k = k
+        self.content_weight = content_weight
+        self.price_weight = price_weight
+        self.idx: Optional[np.ndarray] = None
+        self.score: Optional[np.ndarray] = None
+
+    def _blend(self, content: np.ndarray, p_rows: np.ndarray, p_cols: np.ndarray) -> np.ndarray:
+        price_sim = 1.0 - np.abs(p_rows[:, None] - p_cols[None, :])
+        return (content * self.content_weight + price_sim * self.price_weight).astype(np.float32, copy=False)
+
+    def score_block(self, matrix, rows: np.ndarray, cols: np.ndarray, prices: np.ndarray) -> np.ndarray:
+        content = matrix[rows] @ matrix[cols].T
+        if sparse.issparse(content):
+            content = content.toarray()
+        scores = self._blend(content, prices[rows], prices[cols])
+        # Never recommend an item to itself
+        self_mask = rows[:, None] == cols[None, :]
+        scores[self_mask] = -np.inf
+        return scores
+
+    def build(self, matrix, prices: np.ndarray, categories: Sequence[Optional[str]]) -> "NeighborIndex":
+        """
+        matrix: L2-normalised rows, one per item - CSR (TF-IDF) or dense (embeddings)
+        prices: min-max normalised prices in [0, 1], shape (N,)
+        """
+        n = matrix.shape[0]
+        k = self.k
+        self.idx = np.full((n, k), -1, dtype=np.int32)
+        self.score = np.zeros((n, k), dtype=np.float32)
+        if n == 0:
+            return self
+
+        if sparse.issparse(matrix):
+            matrix = matrix.tocsr()
+        prices = np.asarray(prices, dtype=np.float32).ravel()
+
+        groups: Dict[str, List[int]] = {}
+        for i, c in enumerate(categories):
+            groups.setdefault(category_key(c), []).append(i)
+
+        everything = np.arange(n)
+        for members in groups.values():
+            rows_all = np.asarray(members)
+            cols = rows_all if len(rows_all) > k else everything
+            chunk = max(1, BLOCK_CELLS // max(1, len(cols)))
+            for start in range(0, len(rows_all), chunk):
+                rows = rows_all[start:start + chunk]
+                scores = self.score_block(matrix, rows, cols, prices)
+                top, top_scores = top_k_rows(scores, k)
+                valid = np.isfinite(top_scores)
+                width = top.shape[1]
+                self.idx[rows, :width] = np.where(valid, cols[top], -1)
+                self.score[rows, :width] = np.where(valid, top_scores, 0.0)
+        return self
+
+    def neighbors(self, i: int, top_n: int) -> np.ndarray:
+        """Neighbor rows of item i, best first (at most min(top_n, K))."""
+        if self.idx is None:
+            return np.empty(0, dtype=np.int32)
+        row = self.idx[i, :top_n]
+        return row[row >= 0]
+
+    # --- incremental maintenance -------------------------------------------
+
+    def _writable(self):
+        # Arrays may be read-only memory maps; copy on first write
+        if not self.idx.flags.writeable:
+            self.idx = np.array(self.idx)
+        if not self.score.flags.writeable:
+            self.score = np.array(self.score)
+
+    def _splice(self, row: int, item: int, s: float):
+        """Insert (item, s) into row's descending list, dropping the last slot."""
+        ids, sc = self.idx[row], self.score[row]
+        filled = int(np.count_nonzero(ids >= 0))
+        pos = int(np.count_nonzero(sc[:filled] >= s))
+        if pos >= self.k:
+            return
+        ids[pos + 1:] = ids[pos:-1].copy()
+        sc[pos + 1:] = sc[pos:-1].copy()
+        ids[pos], sc[pos] = item, s
+
+    def drop_item(self, item: int) -> np.ndarray:
+        """
+        Remove `item` from every neighbor list and clear its own row.
+        Returns the rows that lost it; pass them to `rescore_rows` once the
+        matrix is final to refill their last slot.
+        """
+        self._writable()
+        rows, slots = np.nonzero(self.idx == item)
+        for r, c in zip(rows.tolist(), slots.tolist()):
+            self.idx[r, c:-1] = self.idx[r, c + 1:].copy()
+            self.score[r, c:-1] = self.score[r, c + 1:].copy()
+            self.idx[r, -1] = -1
+            self.score[r, -1] = 0.0
+        self.idx[item] = -1
+        self.score[item] = 0.0
+        return rows
+
+    def _columns_for(self, codes: np.ndarray, code: int, sizes: np.ndarray) -> np.ndarray:
+        # Same rule as `build`: own category, or everything for small categories
+        if sizes[code] > self.k:
+            return np.flatnonzero(codes == code)
+        return np.arange(len(codes))
+
+    def crossing_rows(self, codes: np.ndarray, deltas: Dict[int, int]) -> np.ndarray:
+        """
+        Rows of every category that an edit moved across K. `deltas` maps a
+        category code to members added (negative: removed) and `codes` is
+        already updated. Those rows switch between own-category and
+        whole-catalog columns (`_columns_for`), so all of them need
+        `rescore_rows`, not just the ones that held the edited item.
+        """
+        sizes = np.bincount(codes, minlength=max(deltas) + 1)
+        crossed = [c for c, d in deltas.items() if d and (sizes[c] - d > self.k) != (sizes[c] > self.k)]
+        if not crossed:
+            return np.empty(0, dtype=np.int64)
+        return np.flatnonzero(np.isin(codes, crossed))
+
+    def rescore_rows(self, matrix, prices: np.ndarray, codes: np.ndarray, rows: np.ndarray):
+        """Recompute the full top-K for `rows` (grouped by category)."""
+        rows = np.unique(np.asarray(rows, dtype=np.int64))
+        if not len(rows):
+            return
+        self._writable()
+        sizes = np.bincount(codes, minlength=int(codes.max()) + 1)
+        for code in np.unique(codes[rows]).tolist():
+            members = rows[codes[rows] == code]
+            cols = self._columns_for(codes, code, sizes)
+            scores = self.score_block(matrix, members, cols, prices)
+            top, top_scores = top_k_rows(scores, self.k)
+            valid = np.isfinite(top_scores)
+            width = top.shape[1]
+            self.idx[members] = -1
+            self.score[members] = 0.0
+            self.idx[members, :width] = np.where(valid, cols[top], -1)
+            self.score[members, :width] = np.where(valid, top_scores, 0.0)
+
+    def move_item(self, src: int, dst: int):
+        """Row `src` now lives at `dst` (swap-remove); the last row is dropped."""
+        self._writable()
+        self.idx[dst] = self.idx[src]
+        self.score[dst] = self.score[src]
+        self.idx[self.idx == src] = dst
+        self.idx = self.idx[:-1]
+        self.score = self.score[:-1]
+
+    def upsert_item(self, matrix, prices: np.ndarray, codes: np.ndarray, item: int, prev_code: Optional[int] = None):
+        """
+        (Re)score one item. `matrix`/`prices`/`codes` are the full, already
+        updated per-item arrays; `codes` are integer category codes and
+        `prev_code` is the item's code before the edit (None for a new item).
+        """
+        self._writable()
+        n = matrix.shape[0]
+        lost = np.empty(0, dtype=np.int64)
+        code = int(codes[item])
+        if prev_code is None:
+            deltas = {code: 1}
+        else:
+            deltas = {prev_code: -1, code: 1} if prev_code != code else {}
+        if self.idx.shape[0] < n:
+            grow = n - self.idx.shape[0]
+            self.idx = np.vstack([self.idx, np.full((grow, self.k), -1, dtype=np.int32)])
+            self.score = np.vstack([self.score, np.zeros((grow, self.k), dtype=np.float32)])
+        else:
+            lost = self.drop_item(item)
+
+        sizes = np.bincount(codes, minlength=int(codes.max()) + 1)
+        group = np.flatnonzero(codes == codes[item])
+        small = np.flatnonzero(sizes[codes] <= self.k)
+        own_cols = self._columns_for(codes, int(codes[item]), sizes)
+        # Rows whose column set contains `item`: its category, plus every small category
+        touched = np.union1d(group, small)
+        cols = np.union1d(own_cols, touched)
+
+        scores = self.score_block(matrix, np.array([item]), cols, prices)[0]
+
+        own = np.isin(cols, own_cols)
+        top, top_scores = top_k_rows(scores[own][None, :], self.k)
+        valid = np.isfinite(top_scores[0])
+        width = top.shape[1]
+        self.idx[item] = -1
+        self.score[item] = 0.0
+        self.idx[item, :width] = np.where(valid, own_cols[top[0]], -1)
+        self.score[item, :width] = np.where(valid, top_scores[0], 0.0)
+
+        in_touched = np.isin(cols, touched) & (cols != item)
+        rows, s = cols[in_touched], scores[in_touched]
+        last_filled = self.idx[rows, -1] >= 0
+        beats = ~last_filled | (s > self.score[rows, -1])
+        for r, sr in zip(rows[beats].tolist(), s[beats].tolist()):
+            self._splice(r, item, sr)
+
+        rows = lost[lost != item]
+        if deltas:
+            rows = np.union1d(rows, self.crossing_rows(codes, deltas))
+        self.rescore_rows(matrix, prices, codes, rows[rows != item])
@@ -0,0 +1,183 @@
+"""
+Nightly batch precomputation of personalized recommendations.
+
+Every customer with an order or a 4+ star rating is scored against the live
+catalog in blocks: the block's preference vectors are stacked into one
+(customers x dim) matrix and multiplied by the item matrix, so a block costs
+one matrix product instead of one catalog scan per customer. The block size
+keeps the dense customers x items score matrix under BLOCK_CELLS.
+
+The top `top_n` SKUs per customer land in `personalized_recs`, tagged with the
+batch id; the previous batch is deleted once the new one is fully written, so
+readers always find a complete list. `/recommendations/personalized` serves
+these lists with a freshness filter (items sold or archived since the batch
+are dropped) and falls back to on-demand scoring for customers without one.
+
+The nightly run is scheduled on every worker; the first one to wake claims it
+with a compare-and-set on a `settings` timestamp and the others skip.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from pydantic import BaseModel, Field
+from pymongo.errors import DuplicateKeyError
+
+from app.config import get_settings
+from app.jobs import JobContext, job_runner
+from app.models import Customer, PersonalizedRecs, Setting
+from app.neighbor_index import BLOCK_CELLS
+from app.profiles import ProfileStore
+from app.recommender_service import recommender_service
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+JOB_KIND = "personalized_precompute"
+# A nightly run counts as claimed if any worker claimed one this recently
+CLAIM_WINDOW = timedelta(hours=12)
+# `settings` key holding when the last run was claimed (ISO timestamp, "" = never)
+CLAIM_KEY = "personalized_batch_claimed_at"
+
+
+class _CustomerPhone(BaseModel):
+    id: Any = Field(alias="_id")
+    phone: str
+
+
+class PersonalizedBatch:
+    def __init__(self, top_n: int = 50, hour_utc: int = 2):
+        self.top_n = top_n
+        self.hour_utc = hour_utc
+        self.last_run: Optional[Dict[str, Any]] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def run(self, ctx: Optional[JobContext] = None) -> Dict[str, Any]:
+        """Score every known customer and replace the stored lists. Returns throughput stats."""
+        rec = recommender_service.current
+        if not rec.is_fitted:
+            return {"skipped": "recommender not fitted"}
+
+        t0 = time.perf_counter()
+        profiles = await ProfileStore.scan()
+        phones = {
+            str(c.id): c.phone
+            for c in await Customer.find().project(_CustomerPhone).to_list()
+        }
+        users = list(profiles)
+        total = len(users)
+        block = max(1, BLOCK_CELLS // max(1, len(rec)))
+        batch_id = uuid.uuid4().hex
+        version = recommender_service.version
+        load_s = time.perf_counter() - t0
+
+        score_s = write_s = 0.0
+        written = 0
+        for start in range(0, total, block):
+            chunk = users[start:start + block]
+            t = time.perf_counter()
+            # CF and trending change on the loop: read them here, score in a thread
+            prepared = rec.prepare_profiles([profiles[u] for u in chunk], self.top_n)
+            lists = await asyncio.to_thread(rec.score_profiles, prepared, self.top_n)
+            score_s += time.perf_counter() - t
+
+            t = time.perf_counter()
+            now = datetime.utcnow()
+            docs = [
+                PersonalizedRecs(
+                    customer_id=u, phone=phones.get(u), skus=skus,
+                    model_version=version, batch_id=batch_id, computed_at=now,
+                )
+                for u, skus in zip(chunk, lists) if skus
+            ]
+            if docs:
+                await PersonalizedRecs.insert_many(docs)
+            written += len(docs)
+            write_s += time.perf_counter() - t
+            if ctx is not None:
+                await ctx.progress(start + len(chunk), total, f"Scored {start + len(chunk)}/{total} customers")
+
+        await PersonalizedRecs.find(PersonalizedRecs.batch_id != batch_id).delete()
+
+        seconds = time.perf_counter() - t0
+        self.last_run = {
+            "batch_id": batch_id,
+            "model_version": version,
+            "customers": total,
+            "written": written,
+            "catalog_size": len(rec),
+            "block_size": block,
+            "blocks": -(-total // block),
+            "load_s": round(load_s, 3),
+            "score_s": round(score_s, 3),
+            "write_s": round(write_s, 3),
+            "seconds": round(seconds, 3),
+            "customers_per_s": round(total / score_s, 1) if score_s else None,
+            "finished_at": datetime.utcnow().isoformat(),
+        }
+        logger.info(f"Personalized batch: {self.last_run}")
+        return self.last_run
+
+    async def lookup(self, phone: str) -> Optional[PersonalizedRecs]:
+        """The stored list for a customer's phone (one indexed read), if any."""
+        return await PersonalizedRecs.find(PersonalizedRecs.phone == phone).sort(
+            -PersonalizedRecs.computed_at
+        ).first_or_none()
+
+    async def _claim(self) -> bool:
+        """Atomically claim tonight's run; False if another worker claimed one within CLAIM_WINDOW."""
+        try:
+            await Setting(key=CLAIM_KEY, value="").insert()
+        except DuplicateKeyError:
+            pass
+        now = datetime.utcnow()
+        claim = await Setting.get_motor_collection().update_one(
+            {"key": CLAIM_KEY, "value": {"$lt": (now - CLAIM_WINDOW).isoformat()}},
+            {"$set": {"value": now.isoformat()}},
+        )
+        return claim.modified_count == 1
+
+    def _seconds_until_run(self) -> float:
+        now = datetime.utcnow()
+        nxt = now.replace(hour=self.hour_utc, minute=0, second=0, microsecond=0)
+        if nxt <= now:
+            nxt += timedelta(days=1)
+        return (nxt - now).total_seconds()
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self._seconds_until_run())
+            try:
+                if await self._claim():
+                    await job_runner.submit(JOB_KIND, precompute_job)
+            except Exception as e:
+                logger.error(f"Scheduling the personalized batch failed: {e}")
+            # Step past the scheduled hour before computing the next wake-up
+            await asyncio.sleep(60)
+
+    def start(self):
+        if self.hour_utc >= 0 and self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+async def precompute_job(ctx: JobContext) -> Dict[str, Any]:
+    return await personalized_batch.run(ctx)
+
+
+# Singleton
+personalized_batch = PersonalizedBatch(
+    top_n=settings.PERSONALIZED_TOP_N,
+    hour_utc=settings.PERSONALIZED_BATCH_HOUR,
+)
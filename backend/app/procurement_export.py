@@ -0,0 +1,182 @@
+"""
+Streaming procurement exports: CSV and columnar (Parquet / Arrow IPC).
+
+All formats walk a scored snapshot (app/procurement_scoring.py) in ranking
+order, `CHUNK` rows at a time, and yield each chunk's bytes as soon as it is
+encoded, so neither the full row list nor the full file is ever held in
+memory:
+
+  * csv      rows are materialized one chunk at a time and written as text
+  * parquet  one row group per chunk, built straight from the score arrays
+  * arrow    the Arrow IPC stream format, one record batch per chunk
+
+Parquet and Arrow need pyarrow, which is imported lazily; `columnar_available`
+lets the API answer 501 instead of failing at import time.
+"""
+
+from __future__ import annotations
+
+import csv
+import importlib.util
+import io
+from typing import Any, Dict, Iterator, List
+
+import numpy as np
+
+from app import procurement_scoring as scoring
+
+# Rows per CSV chunk / Parquet row group / Arrow record batch
+CHUNK = 5000
+
+FORMATS = {
+    # format: (file suffix, media type)
+    "csv": (".csv", "text/csv"),
+    "parquet": (".parquet", "application/vnd.apache.parquet"),
+    "arrow": (".arrows", "application/vnd.apache.arrow.stream"),
+}
+
+EXPORT_HEADER = [
+    "SKU", "Name", "Category", "Stock", "Forecast (30d)",
+    "Velocity (30d)", "Days In Stock", "Rating", "Score",
+    "Recommendation", "Reason", "Value (INR)"
+]
+
+
+def export_row(r: Dict[str, Any]) -> list:
+    return [
+        r["sku"],
+        r["name"],
+        r["category"],
+        r["current_stock"],
+        r["forecasted_demand"],
+        r["sales_velocity_30d"],
+        r["days_in_stock"],
+        f"{r['avg_rating']} ({r['rating_count']})",
+        r["procurement_score"],
+        r["recommendation"],
+        r["reason"],
+        r["retail_value"]
+    ]
+
+
+def _chunks(scores: scoring.Scores) -> Iterator[np.ndarray]:
+    order = scores.order
+    for start in range(0, len(order), CHUNK):
+        yield order[start:start + CHUNK]
+
+
+def csv_chunks(scores: scoring.Scores) -> Iterator[str]:
+    """The CSV text: header first, then one string per `CHUNK` rows."""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(EXPORT_HEADER)
+    for positions in _chunks(scores):
+        for row in scoring.rows(scores, positions, {}):
+            writer.writerow(export_row(row))
+        yield buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue()
+
+
+# --- columnar --------------------------------------------------------------------
+
+def columnar_available() -> bool:
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+class _Drain:
+    """Write-only sink that hands back what pyarrow wrote since the last `drain`."""
+
+    def __init__(self):
+        self._parts: List[bytes] = []
+        self._pos = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._parts.append(data)
+        self._pos += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._pos
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def writable(self) -> bool:
+        return True
+
+    def drain(self) -> bytes:
+        out, self._parts = b"".join(self._parts), []
+        return out
+
+
+def _schema(pa):
+    return pa.schema([
+        ("sku", pa.string()),
+        ("name", pa.string()),
+        ("category", pa.string()),
+        ("current_stock", pa.int64()),
+        ("forecasted_demand", pa.int64()),
+        ("sales_velocity_30d", pa.int64()),
+        ("days_in_stock", pa.int64()),
+        ("avg_rating", pa.float64()),
+        ("rating_count", pa.int64()),
+        ("procurement_score", pa.int64()),
+        ("recommendation", pa.dictionary(pa.int8(), pa.string())),
+        ("reason", pa.string()),
+        ("retail_value", pa.float64()),
+    ])
+
+
+def _batch(pa, schema, scores: scoring.Scores, positions: np.ndarray):
+    c = scores.cols
+    return pa.record_batch([
+        pa.array(c.sku[positions].tolist(), pa.string()),
+        pa.array(c.name[positions].tolist(), pa.string()),
+        pa.array(c.category[positions].tolist(), pa.string()),
+        pa.array(c.stock[positions]),
+        pa.array(scores.forecast[positions]),
+        pa.array(c.vol_a[positions]),
+        pa.array(c.days_in_stock[positions]),
+        pa.array(np.round(c.avg_rating[positions], 1)),
+        pa.array(c.rating_count[positions]),
+        pa.array(scores.score[positions]),
+        pa.DictionaryArray.from_arrays(
+            pa.array(scores.rec[positions].astype(np.int8)), pa.array(list(scoring.RECS), pa.string()),
+        ),
+        pa.array(scoring.reasons(scores, positions), pa.string()),
+        pa.array(scores.value[positions]),
+    ], schema=schema)
+
+
+def columnar_chunks(scores: scoring.Scores, fmt: str) -> Iterator[bytes]:
+    """The Parquet file or Arrow IPC stream, yielded as each row group / batch is encoded."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = _schema(pa)
+    sink = _Drain()
+    writer = pq.ParquetWriter(sink, schema) if fmt == "parquet" else pa.ipc.new_stream(sink, schema)
+    try:
+        for positions in _chunks(scores):
+            writer.write_batch(_batch(pa, schema, scores, positions))
+            data = sink.drain()
+            if data:
+                yield data
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def export_chunks(scores: scoring.Scores, fmt: str) -> Iterator[bytes]:
+    """Encoded chunks of the export in `fmt` (see FORMATS)."""
+    if fmt == "csv":
+        return (text.encode("utf-8") for text in csv_chunks(scores))
+    return columnar_chunks(scores, fmt)
@@ -0,0 +1,279 @@
+"""
+Vectorized procurement scoring.
+
+The logic tree of `/procurement/recommendations` (trend factor, stockout and
+interest multipliers, forecast, then Urgent Restock / Buy / Overstocked /
+Promote / Dead Stock / Discount / Monitor) evaluated over whole columns with
+NumPy masks and `np.select` instead of per-product branching.
+
+`load_columns` reads the inputs in three round trips (a projected scan of the
+active products, the sales rollups, ratings grouped per SKU in Mongo).
+`score` classifies every SKU at once. `filter_mask` and `page` select, sort
+and keyset-paginate on the arrays, `summary` counts them, and `rows` turns
+only the requested positions into dicts, so reason strings, image lookups
+and response objects are built for one page, not the whole catalog.
+"""
+
+from __future__ import annotations
+
+import base64
+import json
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from pydantic import BaseModel
+
+from app.models import Product, Rating
+from app.sales_facts import sales_facts
+
+# Recommendation codes, in logic-tree order (first matching branch wins)
+RECS = ("Urgent Restock", "Buy", "Overstocked", "Promote", "Dead Stock", "Discount", "Monitor")
+URGENT, BUY, OVERSTOCKED, PROMOTE, DEAD, DISCOUNT, MONITOR = range(len(RECS))
+COLORS = ("red", "green", "orange", "blue", "black", "yellow", "gray")
+BASE_SCORES = np.array([100, 80, 40, 70, 10, 60, 50], dtype=np.int64)
+
+
+class _ScoreRow(BaseModel):
+    sku: str
+    name: str
+    category: Optional[str] = None
+    qty: int = 1
+    price: Optional[float] = None
+    purchase_date: Optional[date] = None
+    created_at: datetime
+
+
+class Columns:
+    """Scoring inputs, one array entry per active product."""
+
+    def __init__(self, rows: List[_ScoreRow], vol_a: Dict[str, int], vol_b: Dict[str, int],
+                 ratings: Dict[str, tuple], today: date):
+        n = len(rows)
+        self.sku = np.array([r.sku for r in rows], dtype=object)
+        self.name = np.array([r.name for r in rows], dtype=object)
+        self.category = np.array([r.category or "Uncategorized" for r in rows], dtype=object)
+        self.stock = np.fromiter((r.qty for r in rows), dtype=np.int64, count=n)
+        self.price = np.fromiter((r.price or 0.0 for r in rows), dtype=np.float64, count=n)
+        base = np.fromiter(
+            ((r.purchase_date or r.created_at.date()).toordinal() for r in rows), dtype=np.int64, count=n,
+        )
+        self.days_in_stock = today.toordinal() - base
+        self.vol_a = np.fromiter((vol_a.get(s, 0) for s in self.sku), dtype=np.int64, count=n)
+        self.vol_b = np.fromiter((vol_b.get(s, 0) for s in self.sku), dtype=np.int64, count=n)
+        stars = np.fromiter((ratings.get(s, (0, 0))[0] for s in self.sku), dtype=np.float64, count=n)
+        self.rating_count = np.fromiter((ratings.get(s, (0, 0))[1] for s in self.sku), dtype=np.int64, count=n)
+        self.avg_rating = np.divide(stars, self.rating_count, out=np.zeros(n), where=self.rating_count > 0)
+
+    def __len__(self) -> int:
+        return len(self.sku)
+
+
+async def load_columns(today: Optional[date] = None) -> Columns:
+    today = today or datetime.utcnow().date()
+    rows = await Product.find(Product.is_archived == False).project(_ScoreRow).to_list()
+
+    # Period A: last 30 days, period B: the 30 before (see app/sales_facts.py)
+    rollups = await sales_facts.rollups()
+    vol_a = {sku: r.units_30 for sku, r in rollups.items()}
+    vol_b = {sku: r.units_60 - r.units_30 for sku, r in rollups.items()}
+
+    rated = await Rating.aggregate([
+        {"$group": {"_id": "$sku", "stars": {"$sum": "$stars"}, "count": {"$sum": 1}}},
+    ]).to_list()
+    ratings = {r["_id"]: (r["stars"], r["count"]) for r in rated}
+    return Columns(rows, vol_a, vol_b, ratings, today)
+
+
+class Scores:
+    def __init__(self, cols: Columns, trend: np.ndarray, interest: np.ndarray, forecast: np.ndarray,
+                 rec: np.ndarray, score: np.ndarray):
+        self.cols = cols
+        self.trend = trend
+        self.interest = interest
+        self.forecast = forecast
+        self.rec = rec
+        self.score = score
+        self.value = cols.price * cols.stock
+        # Highest score first; stable, so ties keep catalog order like list.sort did
+        self.order = np.argsort(-score, kind="stable")
+
+
+def score(cols: Columns) -> Scores:
+    stock, vol_a, vol_b = cols.stock, cols.vol_a, cols.vol_b
+    avg, count, days = cols.avg_rating, cols.rating_count, cols.days_in_stock
+
+    # Interest: +/-20% for well / badly rated SKUs with at least 3 ratings
+    interest = np.select([(count >= 3) & (avg >= 4.5), (count >= 3) & (avg < 3.0)], [1.2, 0.8], default=1.0)
+
+    # Trend: half the period-over-period growth, 1.5 for new sellers, clamped to [0.5, 2]
+    growth = np.divide(vol_a - vol_b, vol_b, out=np.zeros(len(cols)), where=vol_b > 0)
+    trend = np.select([vol_b > 0, vol_a > 0], [1.0 + growth * 0.5, 1.5], default=1.0)
+    trend = np.clip(trend, 0.5, 2.0)
+
+    stockout = np.where((stock == 0) & (vol_a > 5), 1.2, 1.0)
+
+    raw = vol_a * trend * stockout * interest
+    raw = np.where((raw < 1) & (vol_a > 0), 1.0, raw)
+    forecast = np.round(raw).astype(np.int64)
+
+    no_sales_aged = (vol_a == 0) & (days > 90)
+    rec = np.select(
+        [
+            (stock == 0) & (forecast > 0),
+            stock < forecast,
+            (stock > forecast * 3) & (stock > 5),
+            no_sales_aged & (avg >= 4.0),
+            no_sales_aged,
+            (days > 180) & (vol_a < 2),
+        ],
+        [URGENT, BUY, OVERSTOCKED, PROMOTE, DEAD, DISCOUNT],
+        default=MONITOR,
+    )
+    points = BASE_SCORES[rec] + np.where(rec == BUY, np.minimum(20, (forecast - stock) * 2), 0)
+    return Scores(cols, trend, interest, forecast, rec, np.clip(points, 0, 100))
+
+
+def _reason(code: int, forecast: int, stock: int, days: int, avg: float, trend: float, interest: float) -> str:
+    text = ""
+    if trend > 1.1: text += " (Trending Up)"
+    elif trend < 0.9: text += " (Cooling Down)"
+    if interest > 1.0: text += f" [High Rated {avg:.1f}★]"
+    elif interest < 1.0: text += f" [Low Rated {avg:.1f}★]"
+
+    if code == URGENT:
+        return f"Stockout! Forecast {forecast} units.{text}"
+    if code == BUY:
+        return f"Demand ({forecast}) > Stock ({stock}).{text}"
+    if code == OVERSTOCKED:
+        return f"Inventory too high ({stock} vs {forecast}).{text}"
+    if code == PROMOTE:
+        return f"High interest ({avg:.1f}★) but no sales. Pricing issue?{text}"
+    if code == DEAD:
+        return f"No sales. Aged {days} days.{text}"
+    if code == DISCOUNT:
+        return f"Aging stock. Consider clearance.{text}"
+    return f"Healthy stock. {text}" if interest != 1.0 else "Healthy stock level."
+
+
+def reasons(scores: Scores, positions: Sequence[int]) -> List[str]:
+    """Reason strings for the given indexes into `cols`."""
+    c = scores.cols
+    return [
+        _reason(int(scores.rec[i]), int(scores.forecast[i]), int(c.stock[i]), int(c.days_in_stock[i]),
+                float(c.avg_rating[i]), float(scores.trend[i]), float(scores.interest[i]))
+        for i in positions
+    ]
+
+
+def rows(scores: Scores, positions: Sequence[int], image_map: Dict[str, Optional[str]]) -> List[Dict[str, Any]]:
+    """Response dicts for the given indexes into `cols` (only these are materialized)."""
+    c = scores.cols
+    out = []
+    for i in positions:
+        i = int(i)
+        stock, forecast, days = int(c.stock[i]), int(scores.forecast[i]), int(c.days_in_stock[i])
+        avg, code = float(c.avg_rating[i]), int(scores.rec[i])
+        out.append({
+            "sku": c.sku[i],
+            "name": c.name[i],
+            "category": c.category[i],
+            "current_stock": stock,
+            "forecasted_demand": forecast,
+            "recommendation": RECS[code],
+            "recommendation_color": COLORS[code],
+            "reason": _reason(code, forecast, stock, days, avg, float(scores.trend[i]), float(scores.interest[i])),
+            "days_in_stock": days,
+            "sales_velocity_30d": float(c.vol_a[i]),
+            "image_url": image_map.get(c.sku[i]),
+            "procurement_score": int(scores.score[i]),
+            "retail_value": float(scores.value[i]),
+            "avg_rating": round(avg, 1),
+            "rating_count": int(c.rating_count[i]),
+        })
+    return out
+
+
+# --- selection -----------------------------------------------------------------
+
+# Sort keys accepted by `page`; ties are broken by SKU so the order is total
+SORT_KEYS = {
+    "score": lambda s: s.score,
+    "forecast": lambda s: s.forecast,
+    "stock": lambda s: s.cols.stock,
+    "days": lambda s: s.cols.days_in_stock,
+    "velocity": lambda s: s.cols.vol_a,
+    "value": lambda s: s.value,
+    "rating": lambda s: s.cols.avg_rating,
+}
+
+
+def filter_mask(scores: Scores, recommendations: Optional[Sequence[str]] = None, category: Optional[str] = None,
+                min_score: Optional[int] = None, q: Optional[str] = None) -> np.ndarray:
+    """Rows matching every given filter (recommendation names, category, score floor, name/SKU search)."""
+    c = scores.cols
+    mask = np.ones(len(c), dtype=bool)
+    if recommendations:
+        unknown = set(recommendations) - set(RECS)
+        if unknown:
+            raise ValueError(f"Unknown recommendation: {', '.join(sorted(unknown))}")
+        mask &= np.isin(scores.rec, [RECS.index(r) for r in recommendations])
+    if category:
+        mask &= c.category == category
+    if min_score is not None:
+        mask &= scores.score >= min_score
+    if q:
+        q = q.lower()
+        mask &= np.fromiter(
+            (q in n.lower() or q in s.lower() for n, s in zip(c.name, c.sku)), dtype=bool, count=len(c),
+        )
+    return mask
+
+
+def page(scores: Scores, mask: np.ndarray, sort: str = "score", descending: bool = True,
+         after: Optional[Tuple[Any, str]] = None, limit: int = 50) -> Tuple[np.ndarray, Optional[Tuple[Any, str]]]:
+    """Positions of the next `limit` matching rows after the keyset `after`, and the keyset to continue from."""
+    key = SORT_KEYS[sort](scores)
+    sku = scores.cols.sku
+    if after is not None:
+        value, last = after
+        beyond = key < value if descending else key > value
+        mask = mask & (beyond | ((key == value) & (sku > last)))
+    idx = np.flatnonzero(mask)
+    ranked = idx[np.lexsort((sku[idx], -key[idx] if descending else key[idx]))]
+    positions = ranked[:limit]
+    if len(ranked) <= limit:
+        return positions, None
+    end = positions[-1]
+    return positions, (key[end].item(), sku[end])
+
+
+def encode_cursor(sort: str, descending: bool, keyset: Tuple[Any, str]) -> str:
+    raw = json.dumps([sort, descending, keyset[0], keyset[1]], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str, descending: bool) -> Tuple[Any, str]:
+    """The keyset in `cursor`; ValueError if it is malformed or from another sort."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        c_sort, c_desc, value, last = json.loads(raw)
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if c_sort != sort or c_desc != descending or not isinstance(last, str):
+        raise ValueError("Cursor belongs to a different sort order")
+    return value, last
+
+
+def summary(scores: Scores) -> Dict[str, Any]:
+    """Catalog-wide counts for the summary cards, tabs and category list."""
+    c = scores.cols
+    per_rec = np.bincount(scores.rec, minlength=len(RECS)) if len(c) else np.zeros(len(RECS), dtype=np.int64)
+    cats, per_cat = np.unique(c.category.astype(str), return_counts=True) if len(c) else ([], [])
+    return {
+        "total": len(c),
+        "urgent": int((scores.score >= 80).sum()),
+        "retail_value": float(scores.value.sum()),
+        "by_recommendation": {name: int(n) for name, n in zip(RECS, per_rec)},
+        "categories": {str(cat): int(n) for cat, n in zip(cats, per_cat)},
+    }
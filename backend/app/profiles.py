@@ -0,0 +1,216 @@
+"""
+In-memory customer preference profiles for personalized recommendations.
+
+A profile holds what `recommend_for_user` used to rebuild from Mongo on every
+request: the liked-SKU set (every ordered SKU, every 4+ star rating) and the
+prices paid. The content-space preference vector and the median price are
+derived against the live model and cached on the profile until the model
+(a refit or any incremental edit) or the liked set changes.
+
+Profiles are warmed from one projected pass over orders and ratings at
+startup and updated in place when an order or rating is recorded, so the
+request path is a dict lookup. Orders and ratings recorded while a warm-up
+scan runs are replayed on top of it. The store is an LRU capped at `max_profiles`;
+an evicted customer is reloaded from Mongo on their next request.
+"""
+
+from __future__ import annotations
+
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+from pydantic import BaseModel
+
+from app.collab import MIN_STARS
+from app.models import Customer, Order, Rating
+
+logger = logging.getLogger(__name__)
+
+# Prices kept per profile for the median
+MAX_PRICES = 200
+
+
+class _PricedItem(BaseModel):
+    sku: str
+    price: float = 0.0
+
+
+class _OrderRow(BaseModel):
+    customer_id: Any
+    items: List[_PricedItem] = []
+
+
+class _RatingRow(BaseModel):
+    sku: str
+    stars: int
+    customer_ref: Optional[str] = None
+
+
+class CustomerProfile:
+    __slots__ = ("liked", "prices", "rated_skus", "_key", "_pref")
+
+    def __init__(self):
+        self.liked: Set[str] = set()
+        self.prices: List[float] = []       # prices paid (orders)
+        self.rated_skus: List[str] = []     # liked via rating; priced from the catalog
+        self._key = None
+        self._pref = (None, None)
+
+    def _touch(self):
+        self._key = None
+
+    def add_order(self, items: Iterable[Tuple[str, float]]):
+        for sku, price in items:
+            self.liked.add(sku)
+            if price is not None:
+                self.prices.append(float(price))
+        del self.prices[:-MAX_PRICES]
+        self._touch()
+
+    def add_rating(self, sku: str, stars: int):
+        if stars >= MIN_STARS and sku not in self.liked:
+            self.liked.add(sku)
+            self.rated_skus.append(sku)
+            self._touch()
+
+    def preference(self, rec) -> Tuple[Optional[np.ndarray], Optional[float]]:
+        """
+        (mean content vector of the liked items in `rec`, median price),
+        cached until the model or the profile changes.
+        """
+        key = (id(rec), rec.last_trained, rec.edits)
+        if self._key != key:
+            rows = rec.sku_to_idx.rows(self.liked)
+            rows = rows[rows >= 0]
+            vec = np.asarray(rec.content_matrix[rows].mean(axis=0)).ravel().astype(np.float32) if len(rows) else None
+            rated = rec.sku_to_idx.rows(self.rated_skus)
+            prices = self.prices + rec.price_raw[rated[rated >= 0]].astype(float).tolist()
+            self._pref = (vec, float(np.median(prices)) if prices else None)
+            self._key = key
+        return self._pref
+
+
+class ProfileStore:
+    def __init__(self, max_profiles: int = 100_000):
+        self.max_profiles = max_profiles
+        self._profiles: "OrderedDict[str, CustomerProfile]" = OrderedDict()
+        # Auth tokens carry the phone number; profiles are keyed by Customer.id
+        self._id_by_phone: Dict[str, str] = {}
+        # Orders / ratings that arrive while `warm` scans, replayed on top of it
+        self._pending: Optional[List[Tuple[str, str, Any]]] = None
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._profiles)
+
+    def _put(self, user: str, profile: CustomerProfile) -> CustomerProfile:
+        self._profiles[user] = profile
+        self._profiles.move_to_end(user)
+        while len(self._profiles) > self.max_profiles:
+            self._profiles.popitem(last=False)
+        return profile
+
+    @staticmethod
+    async def scan() -> Dict[str, CustomerProfile]:
+        """Every customer's profile from one projected pass over orders and ratings."""
+        fresh: Dict[str, CustomerProfile] = {}
+        for o in await Order.find().project(_OrderRow).to_list():
+            fresh.setdefault(str(o.customer_id), CustomerProfile()).add_order((it.sku, it.price) for it in o.items)
+        for r in await Rating.find(Rating.stars >= MIN_STARS).project(_RatingRow).to_list():
+            if r.customer_ref:
+                fresh.setdefault(r.customer_ref, CustomerProfile()).add_rating(r.sku, r.stars)
+        return fresh
+
+    async def warm(self) -> int:
+        """Rebuild the cache from a full scan."""
+        self._pending = []
+        try:
+            fresh = await self.scan()
+            for user, kind, args in self._pending:
+                p = fresh.setdefault(user, CustomerProfile())
+                if kind == "order":
+                    p.add_order(args)
+                else:
+                    p.add_rating(*args)
+        finally:
+            self._pending = None
+        self._profiles = OrderedDict()
+        for user, p in fresh.items():
+            self._put(user, p)
+        return len(fresh)
+
+    async def customer_id_for_phone(self, phone: str) -> Optional[str]:
+        cid = self._id_by_phone.get(phone)
+        if cid is None:
+            cust = await Customer.find_one(Customer.phone == phone)
+            if not cust:
+                return None
+            cid = self._id_by_phone[phone] = str(cust.id)
+        return cid
+
+    async def load(self, user: str) -> CustomerProfile:
+        """Profile for `user` straight from Mongo (cache miss / scripts)."""
+        p = CustomerProfile()
+        orders = await Order.find(Order.customer_id == user).project(_OrderRow).to_list()
+        for o in orders:
+            p.add_order((it.sku, it.price) for it in o.items)
+        ratings = await Rating.find(Rating.customer_ref == user, Rating.stars >= MIN_STARS).project(_RatingRow).to_list()
+        for r in ratings:
+            p.add_rating(r.sku, r.stars)
+        return p
+
+    async def get(self, user: str) -> CustomerProfile:
+        p = self._profiles.get(user)
+        if p is not None:
+            self.hits += 1
+            self._profiles.move_to_end(user)
+            return p
+        self.misses += 1
+        return self._put(user, await self.load(user))
+
+    async def get_many(self, users: List[str]) -> Dict[str, CustomerProfile]:
+        """Profiles for many customers; cache misses are loaded with one $in query per collection."""
+        from beanie.operators import In
+
+        out: Dict[str, CustomerProfile] = {}
+        missing: List[str] = []
+        for user in dict.fromkeys(users):
+            p = self._profiles.get(user)
+            if p is None:
+                missing.append(user)
+            else:
+                self.hits += 1
+                self._profiles.move_to_end(user)
+                out[user] = p
+        if missing:
+            self.misses += len(missing)
+            loaded = {user: CustomerProfile() for user in missing}
+            for o in await Order.find(In(Order.customer_id, missing)).project(_OrderRow).to_list():
+                loaded[str(o.customer_id)].add_order((it.sku, it.price) for it in o.items)
+            ratings = Rating.find(In(Rating.customer_ref, missing), Rating.stars >= MIN_STARS)
+            for r in await ratings.project(_RatingRow).to_list():
+                loaded[r.customer_ref].add_rating(r.sku, r.stars)
+            for user, p in loaded.items():
+                out[user] = self._put(user, p)
+        return out
+
+    # Only cached profiles are patched: an uncached customer is loaded from
+    # Mongo (which already has the new order/rating) on their next request.
+
+    def record_order(self, user: str, items: Iterable[Tuple[str, float]]):
+        items = list(items)
+        if self._pending is not None:
+            self._pending.append((user, "order", items))
+        p = self._profiles.get(user)
+        if p is not None:
+            p.add_order(items)
+
+    def record_rating(self, user: str, sku: str, stars: int):
+        if self._pending is not None:
+            self._pending.append((user, "rating", (sku, stars)))
+        p = self._profiles.get(user)
+        if p is not None:
+            p.add_rating(sku, stars)
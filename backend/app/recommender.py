@@ -1,42 +1,124 @@
-from typing import List, Dict, Optional, Tuple, Set
+from typing import FrozenSet, List, Dict, NamedTuple, Optional, Tuple, Set
+import copy
+import hashlib
 import numpy as np
-import pandas as pd
-from app.models import Product, Rating, Order, SaleArchive
+from app.models import Product, SaleArchive
+from app.neighbor_index import BLOCK_CELLS, NeighborIndex, top_k_rows, category_key
+from app.embeddings import ProductEmbedder
+from app.sku_index import SkuIndex
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity, linear_kernel
-from sklearn.preprocessing import MinMaxScaler
+from scipy import sparse
 import logging
-import random
 from datetime import datetime, timedelta
-from functools import lru_cache
 
 logger = logging.getLogger(__name__)
 
+
+# Product fields read by `fit` (what a child process needs to train)
+FIT_FIELDS = (
+    "sku", "name", "category", "subcategory", "tags", "options", "description",
+    "price", "weight_g", "manual_rating", "qty",
+)
+
+
+# Content scoring modes: sparse TF-IDF, or dense Word2Vec product embeddings
+MODES = ("tfidf", "embedding")
+
+# Per-item numeric arrays, row-aligned with `skus`
+ITEM_ARRAYS = ("prices", "price_raw", "popularity_scores", "base_keys", "category_codes")
+# Everything persisted per row (`sku_order` is the SkuIndex argsort)
+ROW_ARRAYS = ITEM_ARRAYS + ("skus", "sku_order")
+
+
+class ProfileBlock(NamedTuple):
+    """Inputs of `score_profiles`, read on the event loop by `prepare_profiles`."""
+    ranked: List[Optional[List[str]]]   # final lists already known (trending fallback), else None
+    rows: List[int]                     # block positions that get scored
+    vecs: List[np.ndarray]              # their preference vectors
+    medians: np.ndarray                 # their median prices (NaN = unknown)
+    liked: List[FrozenSet[str]]         # their liked SKUs (excluded from results)
+    cf: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]]  # CF scores as (row, item row, score)
+
+
+def base_name_key(name: str) -> int:
+    """Stable 64-bit key of the first two name words (used to diversify results)."""
+    base = " ".join((name or "").split()[:2]).lower()
+    return int.from_bytes(hashlib.blake2b(base.encode("utf-8"), digest_size=8).digest(), "little", signed=True)
+
+
 class AdvancedRecommender:
-    def __init__(self):
+    def __init__(self, mode: str = "tfidf"):
+        if mode not in MODES:
+            raise ValueError(f"Unknown recommender mode {mode!r}, expected one of {MODES}")
+        self.mode = mode
+
         # Configuration
         self.weights = {
             'content': 0.7,
             'price': 0.2,
-            'popularity': 0.1
+            'popularity': 0.1,
+            'collab': 0.3,      # share of the final score taken by item-item CF
         }
         
         # Models
-        self.tfidf = TfidfVectorizer(stop_words='english', max_features=2000)
-        self.scaler = MinMaxScaler()
+        self.tfidf = TfidfVectorizer(stop_words='english', max_features=2000, dtype=np.float32)
         
-        # State
-        self.products_df = None
-        self.tfidf_matrix = None
-        self.price_matrix = None
-        self.popularity_scores = None
+        # State (arrays are row-aligned with `skus`; no per-product Python objects)
+        self.tfidf_matrix = None        # CSR float32, L2-normalised rows
+        self.embedder: Optional[ProductEmbedder] = None
+        self.embeddings = None          # dense float32, L2-normalised rows (embedding mode)
+        self.collab = None              # ItemCF built from orders/ratings, attached by the service
+        self.trending = None            # TrendingEngine (decayed event counts), attached by the service
+        self.prices = None              # float32, min-max normalised
+        self.price_raw = None           # float32, INR
+        self.price_bounds = (0.0, 0.0)
+        self.popularity_scores = None   # float32, min-max normalised
+        self.popularity_bounds = (0.0, 0.0)
+        self.base_keys = None           # int64, see base_name_key
+        self.category_codes = None      # int32 -> category_names
+        self.category_names: List[str] = []
+        self.neighbors = NeighborIndex(k=50, content_weight=0.85, price_weight=0.15)
         
-        self.sku_to_idx = {}
-        self.idx_to_sku = {}
-        self.products_map = {} # SKU -> Product Object
+        self.sku_to_idx = SkuIndex()    # SKU <-> row via searchsorted
         
+        self.fingerprint = None
         self.is_fitted = False
         self.last_trained = None
+        self.edits = 0                  # upserts / removes since the fit (keys cached profile vectors)
+
+    @property
+    def skus(self) -> np.ndarray:
+        return self.sku_to_idx.skus
+
+    @property
+    def sku_order(self) -> np.ndarray:
+        return self.sku_to_idx.order
+
+    def sku_at(self, i) -> str:
+        return self.sku_to_idx.sku(int(i))
+
+    @property
+    def content_matrix(self):
+        """Row-normalised item vectors used for content similarity in the current mode."""
+        return self.embeddings if self.mode == "embedding" else self.tfidf_matrix
+
+    def normalize_price(self, price) -> np.ndarray:
+        lo, hi = self.price_bounds
+        if hi <= lo:
+            return np.zeros_like(np.asarray(price, dtype=np.float32))
+        return ((np.asarray(price, dtype=np.float32) - lo) / (hi - lo)).astype(np.float32)
+
+    def _popularity_raw(self, p: Product) -> float:
+        # Simulate popularity if we don't have real metrics yet
+        # ideally: p.views + p.sales
+        return float(p.manual_rating or 0) + (0.5 if p.qty == 0 else 0)
+
+    def _normalize_popularity(self, raw) -> np.ndarray:
+        lo, hi = self.popularity_bounds
+        raw = np.asarray(raw, dtype=np.float32)
+        if hi <= lo:
+            return np.zeros_like(raw)
+        return ((raw - lo) / (hi - lo)).astype(np.float32)
 
     def _prepare_metadata_soup(self, p: Product) -> str:
         """
@@ -78,175 +160,428 @@ class AdvancedRecommender:
             return
 
         logger.info(f"Training AdvancedRecommender on {len(products)} products...")
-        self.products_map = {p.sku: p for p in products}
-        self.sku_to_idx = {p.sku: i for i, p in enumerate(products)}
-        self.idx_to_sku = {i: p.sku for i, p in enumerate(products)}
-
-        # 1. Build DataFrame for easier manipulation
-        data = []
-        for p in products:
-            data.append({
-                'sku': p.sku,
-                'soup': self._prepare_metadata_soup(p),
-                'price': p.price if p.price is not None else 0.0,
-                'weight': p.weight_g if p.weight_g is not None else 0.0,
-                # Simulate popularity if we don't have real metrics yet
-                # ideally: p.views + p.sales
-                'popularity': float(p.manual_rating or 0) + (0.5 if p.qty == 0 else 0) 
-            })
-        
-        self.products_df = pd.DataFrame(data)
-        
+
+        # 1. Per-item numbers straight into float32 arrays; the soups only live for the fit
+        self.sku_to_idx = SkuIndex(np.array([p.sku for p in products], dtype=str))
+        soups = [self._prepare_metadata_soup(p) for p in products]
+
         # 2. Vectorize Text (Content)
-        self.tfidf_matrix = self.tfidf.fit_transform(self.products_df['soup'])
-        
+        self.tfidf_matrix = self.tfidf.fit_transform(soups).tocsr()
+        if self.mode == "embedding":
+            self.embedder = ProductEmbedder().fit(soups)
+            self.embeddings = self.embedder.transform(soups)
+        del soups
+        # Terms cut by max_features; transform never reads them
+        self.tfidf.stop_words_ = None
+
         # 3. Normalize Numerical Features
         # Price
-        prices = self.products_df[['price']].values
-        self.price_matrix = self.scaler.fit_transform(prices)
-        
+        self.price_raw = np.array([p.price if p.price is not None else 0.0 for p in products], dtype=np.float32)
+        self.price_bounds = (float(self.price_raw.min()), float(self.price_raw.max()))
+        self.prices = self.normalize_price(self.price_raw)
+
         # Popularity (Normalized)
-        pop_scaler = MinMaxScaler()
-        self.popularity_scores = pop_scaler.fit_transform(self.products_df[['popularity']].values).flatten()
+        pop_raw = np.array([self._popularity_raw(p) for p in products], dtype=np.float32)
+        self.popularity_bounds = (float(pop_raw.min()), float(pop_raw.max()))
+        self.popularity_scores = self._normalize_popularity(pop_raw)
+
+        # Lightweight per-item records used at ranking time
+        self.base_keys = np.array([base_name_key(p.name) for p in products], dtype=np.int64)
+        cats = [category_key(p.category) for p in products]
+        self.category_names = sorted(set(cats))
+        code_of = {c: i for i, c in enumerate(self.category_names)}
+        self.category_codes = np.array([code_of[c] for c in cats], dtype=np.int32)
+
+        # 4. Precompute top-K similar items (per category)
+        self.neighbors.build(self.content_matrix, self.prices, cats)
 
         self.is_fitted = True
         self.last_trained = datetime.utcnow()
         logger.info("Recommender training complete.")
 
-    def get_similar_products(self, sku: str, top_n: int = 5) -> List[Product]:
+    # --- incremental updates -------------------------------------------------
+    # Vectorize against the fitted vocabulary (IDF stays frozen until the next
+    # full fit) and patch the row-aligned arrays and neighbor lists in place.
+    # The price / popularity bounds are frozen too: widening them would shift
+    # every normalised price and stale the stored neighbor lists, so values
+    # outside the fitted range are clipped until the next fit.
+
+    def copy(self) -> "AdvancedRecommender":
+        """
+        A model sharing every array with this one, for copy-on-write edits.
+        The shared arrays are marked read-only, so `upsert` / `remove` on the
+        copy replace whatever they touch and this instance never changes.
+        """
+        fresh = copy.copy(self)
+        fresh.category_names = list(self.category_names)
+        fresh.sku_to_idx = copy.copy(self.sku_to_idx)
+        fresh.neighbors = copy.copy(self.neighbors)
+        arrays = [getattr(self, name) for name in ITEM_ARRAYS] + [
+            self.embeddings, self.skus, self.sku_order, self.neighbors.idx, self.neighbors.score,
+        ]
+        for arr in arrays:
+            if isinstance(arr, np.ndarray):
+                arr.flags.writeable = False
+        return fresh
+
+    def _writable(self):
+        # Loaded artifacts are read-only memory maps; copy on first write
+        for name in ITEM_ARRAYS:
+            arr = getattr(self, name)
+            if not arr.flags.writeable:
+                setattr(self, name, np.array(arr))
+
+    def _category_code(self, category: Optional[str]) -> int:
+        key = category_key(category)
+        if key not in self.category_names:
+            self.category_names.append(key)
+        return self.category_names.index(key)
+
+    def upsert(self, p: Product) -> None:
+        """Add or replace one product without refitting the vectorizer."""
+        if not self.is_fitted:
+            return
+        self._writable()
+
+        soup = self._prepare_metadata_soup(p)
+        vec = self.tfidf.transform([soup]).astype(np.float32).tocsr()
+        emb = self.embedder.transform([soup]) if self.mode == "embedding" else None
+        price = float(p.price if p.price is not None else 0.0)
+        pop = self._popularity_raw(p)
+
+        fields = {
+            "prices": np.clip(self.normalize_price(price), 0.0, 1.0),
+            "price_raw": price,
+            "popularity_scores": np.clip(self._normalize_popularity(pop), 0.0, 1.0),
+            "base_keys": base_name_key(p.name),
+            "category_codes": self._category_code(p.category),
+        }
+
+        m = self.tfidf_matrix
+        i = self.sku_to_idx.get(p.sku)
+        prev_code = None if i is None else int(self.category_codes[i])
+        if i is None:
+            i = len(self)
+            self.tfidf_matrix = sparse.vstack([m, vec], format="csr")
+            if emb is not None:
+                self.embeddings = np.vstack([self.embeddings, emb])
+            for name, value in fields.items():
+                arr = getattr(self, name)
+                setattr(self, name, np.append(arr, np.asarray(value, dtype=arr.dtype)))
+            self.sku_to_idx.append(p.sku)
+        else:
+            self.tfidf_matrix = sparse.vstack([m[:i], vec, m[i + 1:]], format="csr")
+            if emb is not None:
+                if not self.embeddings.flags.writeable:
+                    self.embeddings = np.array(self.embeddings)
+                self.embeddings[i] = emb[0]
+            for name, value in fields.items():
+                getattr(self, name)[i] = value
+
+        self.neighbors.upsert_item(self.content_matrix, self.prices, self.category_codes, i, prev_code)
+        self.edits += 1
+
+    def remove(self, sku: str) -> None:
+        """Drop one product (swap-remove: the last row moves into its slot)."""
+        i = self.sku_to_idx.get(sku)
+        if i is None:
+            return
+        self._writable()
+        last = len(self) - 1
+        code = int(self.category_codes[i])
+
+        lost = self.neighbors.drop_item(i)
+        lost = lost[lost != last] if i == last else np.where(lost == last, i, lost)
+        order = np.arange(last)
+        if i != last:
+            order[i] = last
+            for name in ITEM_ARRAYS:
+                getattr(self, name)[i] = getattr(self, name)[last]
+            self.neighbors.move_item(last, i)
+        else:
+            self.neighbors.idx = self.neighbors.idx[:-1]
+            self.neighbors.score = self.neighbors.score[:-1]
+
+        self.tfidf_matrix = self.tfidf_matrix[order]
+        if self.embeddings is not None:
+            self.embeddings = self.embeddings[order]
+        for name in ITEM_ARRAYS:
+            setattr(self, name, getattr(self, name)[:-1])
+        self.sku_to_idx.swap_remove(i)
+        if len(self):
+            rows = np.union1d(lost, self.neighbors.crossing_rows(self.category_codes, {code: -1}))
+            self.neighbors.rescore_rows(self.content_matrix, self.prices, self.category_codes, rows)
+        self.edits += 1
+
+    def __len__(self) -> int:
+        return len(self.sku_to_idx)
+
+    def similar_skus(self, sku: str, top_n: int = 5) -> List[str]:
         """
-        Get products similar to a specific SKU based on content and price.
+        SKUs similar to a specific SKU based on content and price.
         """
         if not self.is_fitted or sku not in self.sku_to_idx:
             return []
             
         idx = self.sku_to_idx[sku]
-        
-        # 1. Content Similarity (Cosine of TF-IDF)
-        # Calculate only for this item vector vs all
-        content_sim = linear_kernel(self.tfidf_matrix[idx:idx+1], self.tfidf_matrix).flatten()
-        
-        # 2. Price Similarity (1 - diff)
-        target_price = self.price_matrix[idx][0]
-        price_diff = np.abs(self.price_matrix[:, 0] - target_price)
-        price_sim = 1 - price_diff
-        
-        # 3. Combined Score
-        # Weight content higher for "Similarity", price secondary
-        final_scores = (content_sim * 0.85) + (price_sim * 0.15)
-        
-        # 4. Sort
-        related_indices = final_scores.argsort()[:-top_n-2:-1]
-        
-        recommendations = []
-        for i in related_indices:
-            other_sku = self.idx_to_sku[i]
-            if other_sku == sku:
-                continue
-            recommendations.append(self.products_map[other_sku])
-            if len(recommendations) >= top_n:
-                break
-                
-        return recommendations
 
-    async def recommend_for_user(self, user_id: str, top_n: int = 10) -> List[Product]:
+        # Precomputed neighbors cover the common case in O(K)
+        if top_n <= self.neighbors.k:
+            rows = self.neighbors.neighbors(idx, top_n)
+            content = self.sku_to_idx.many(rows)
+        else:
+            content = self._similar_by_scan(idx, top_n)
+        return self._blend_collab_similar(idx, sku, content, top_n)
+
+    def _blend_collab_similar(self, idx: int, sku: str, content: List[str], top_n: int) -> List[str]:
+        """Re-rank content neighbors together with items often bought with `sku`."""
+        w = self.weights['collab']
+        cf = [(s, v) for s, v in self.collab.similar(sku, top_n) if s in self.sku_to_idx] if self.collab else []
+        if not cf or w <= 0:
+            return content
+
+        cand = list(dict.fromkeys(content + [s for s, _ in cf]))
+        rows = self.sku_to_idx.rows(cand)
+        content_scores = self.neighbors.score_block(self.content_matrix, np.array([idx]), rows, self.prices)[0]
+        cf_scores = dict(cf)
+        top_cf = max(cf_scores.values())
+        blended = [
+            (1 - w) * float(c) + w * cf_scores.get(s, 0.0) / top_cf
+            for s, c in zip(cand, content_scores)
+        ]
+        order = np.argsort(blended)[::-1][:top_n]
+        return [cand[i] for i in order]
+
+    def similar_skus_batch(self, skus: List[str], top_n: int = 5) -> Dict[str, List[str]]:
+        """
+        `similar_skus` for many SKUs in one call (unknown SKUs are left out).
+        Neighbor rows are gathered from the index in one slice; requests larger
+        than the index are scored with one blocked matrix product.
+        """
+        if not self.is_fitted:
+            return {}
+        unique = list(dict.fromkeys(skus))
+        found = self.sku_to_idx.rows(unique)
+        known = [s for s, i in zip(unique, found) if i >= 0]
+        if not known:
+            return {}
+        rows = found[found >= 0]
+        if top_n <= self.neighbors.k:
+            top = self.neighbors.idx[rows, :top_n]
+        else:
+            top = self._scan_rows(rows, top_n)
+        return {
+            sku: self._blend_collab_similar(int(i), sku, self.sku_to_idx.many(row[row >= 0]), top_n)
+            for sku, i, row in zip(known, rows, top)
+        }
+
+    def _scan_rows(self, rows: np.ndarray, top_n: int) -> np.ndarray:
+        """Top-N content/price neighbors of `rows` against the whole catalog (-1 = empty)."""
+        everything = np.arange(len(self))
+        out = np.full((len(rows), top_n), -1, dtype=np.int64)
+        chunk = max(1, BLOCK_CELLS // max(1, len(self)))
+        for start in range(0, len(rows), chunk):
+            block = rows[start:start + chunk]
+            scores = self.neighbors.score_block(self.content_matrix, block, everything, self.prices)
+            top, top_scores = top_k_rows(scores, top_n)
+            width = top.shape[1]
+            out[start:start + len(block), :width] = np.where(np.isfinite(top_scores), top, -1)
+        return out
+
+    def _similar_by_scan(self, idx: int, top_n: int) -> List[str]:
+        """Full scan against the catalog, for requests larger than the neighbor index."""
+        row = self._scan_rows(np.array([idx]), top_n)[0]
+        return self.sku_to_idx.many(row[row >= 0])
+
+    async def recommend_skus_for_user(self, user_id: str, top_n: int = 10) -> List[str]:
         """
-        Generate personalized recommendations.
+        Generate personalized recommendations (SKUs, best first).
+        Loads the customer's profile from Mongo; the serving path uses the
+        cached profiles in `recommender_service` instead.
         """
+        from app.profiles import ProfileStore
+
         if not self.is_fitted:
             return []
-            
-        ratings = await Rating.find(Rating.customer_ref == user_id).to_list()
-        orders = await Order.find(Order.customer_id == user_id).to_list()
-        
-        liked_skus = set()
-        user_prices = []
-        
-        for r in ratings:
-            if r.stars >= 4:
-                liked_skus.add(r.sku)
-                if r.sku in self.products_map:
-                    user_prices.append(self.products_map[r.sku].price)
-                    
-        for o in orders:
-            for item in o.items:
-                liked_skus.add(item.sku)
-                user_prices.append(item.price)
-
-        if not liked_skus:
-            return self._get_trending_products(top_n)
-
-        # Content Profile
-        liked_indices = [self.sku_to_idx[s] for s in liked_skus if s in self.sku_to_idx]
-        if not liked_indices:
-             return self._get_trending_products(top_n)
-             
-        user_profile_vec = np.mean(self.tfidf_matrix[liked_indices], axis=0)
-        user_profile_vec = np.asarray(user_profile_vec)
-        
-        content_scores = cosine_similarity(user_profile_vec, self.tfidf_matrix).flatten()
-        
+        profile = await ProfileStore().load(user_id)
+        return self.recommend_skus_for_profile(profile, top_n)
+
+    def recommend_skus_for_profile(self, profile, top_n: int = 10) -> List[str]:
+        """Personalized SKUs for a CustomerProfile - no DB access."""
+        if not self.is_fitted:
+            return []
+        return self.recommend_skus_for_profiles([profile], top_n)[0]
+
+    def recommend_skus_for_profiles(self, profiles, top_n: int = 10) -> List[List[str]]:
+        """
+        Personalized SKUs for a block of CustomerProfiles, scored together:
+        one (customers x dim) @ (dim x items) product instead of one scan per
+        customer. The caller bounds the block size; scores are customers x items.
+        """
+        return self.score_profiles(self.prepare_profiles(profiles, top_n), top_n)
+
+    def prepare_profiles(self, profiles, top_n: int = 10) -> ProfileBlock:
+        """
+        The part of `recommend_skus_for_profiles` that reads state the event
+        loop keeps changing: profile preferences, the CF model, the trending
+        counters. Call it on the loop; `score_profiles` then only reads the
+        result and this model's arrays (never modified in place, see `copy`),
+        so it can run in a thread.
+        """
+        ranked: List[Optional[List[str]]] = [None] * len(profiles)
+        rows, vecs, medians = [], [], []
+        if not self.is_fitted:
+            return ProfileBlock([[] for _ in profiles], rows, vecs, np.asarray(medians), [], None)
+        for r, profile in enumerate(profiles):
+            vec, median_price = profile.preference(self) if profile.liked else (None, None)
+            if vec is None:
+                ranked[r] = self.trending_skus(top_n)
+                continue
+            rows.append(r)
+            vecs.append(vec)
+            medians.append(np.nan if median_price is None else median_price)
+        liked = [frozenset(profiles[r].liked) for r in rows]
+
+        # Collaborative signal: items co-bought / co-liked with the user's items
+        cf = None
+        if rows and self.collab is not None and len(self.collab) and self.weights['collab'] > 0:
+            coo = self.collab.score_block(liked).tocoo()
+            cols = np.unique(coo.col)
+            col_rows = self.sku_to_idx.rows([self.collab.item_skus[c] for c in cols])
+            mapped = col_rows[np.searchsorted(cols, coo.col)] if len(cols) else col_rows
+            keep = mapped >= 0
+            if keep.any():
+                cf = (coo.row[keep], mapped[keep], coo.data[keep])
+        return ProfileBlock(ranked, rows, vecs, np.asarray(medians), liked, cf)
+
+    def score_profiles(self, block: ProfileBlock, top_n: int = 10) -> List[List[str]]:
+        """Rank a block from `prepare_profiles` (pure array work, safe off the event loop)."""
+        out = list(block.ranked)
+        if not block.rows:
+            return out
+
+        # Content Profile: rows are L2-normalised, so cosine is one dot product
+        V = np.vstack(block.vecs)
+        norms = np.linalg.norm(V, axis=1, keepdims=True)
+        V /= np.where(norms > 0, norms, 1.0)
+        content_scores = np.asarray(self.content_matrix @ V.T, dtype=np.float32).T
+
         # Price Profile
-        user_prices = [p for p in user_prices if p is not None]
-        if user_prices:
-            avg_price = np.median(user_prices)
-            norm_avg_price = self.scaler.transform([[avg_price]])[0][0]
-            price_score = 1 - np.abs(self.price_matrix[:, 0] - norm_avg_price)
-        else:
-            price_score = 0.5 
-            
-        final_scores = (content_scores * 0.6) + (price_score * 0.3) + (self.popularity_scores * 0.1)
-        
-        # Optimized Ranking
-        candidates_indices = final_scores.argsort()[::-1][:top_n*3]
+        medians = block.medians
+        price_score = np.full((len(block.rows), 1), 0.5, dtype=np.float32)
+        priced = ~np.isnan(medians)
+        price_score = np.where(
+            priced[:, None], 1 - np.abs(self.prices[None, :] - self.normalize_price(np.nan_to_num(medians))[:, None]), price_score,
+        )
+
+        final_scores = (content_scores * 0.6) + (price_score * 0.3) + (self.popularity_scores[None, :] * 0.1)
+
+        if block.cf is not None:
+            cf_rows, cf_cols, cf_data = block.cf
+            cf_block = np.zeros(final_scores.shape, dtype=np.float32)
+            cf_block[cf_rows, cf_cols] = cf_data
+            cf_max = cf_block.max(axis=1, keepdims=True)
+            has_cf = cf_max[:, 0] > 0
+            w = self.weights['collab']
+            final_scores[has_cf] = (1 - w) * final_scores[has_cf] + w * cf_block[has_cf] / cf_max[has_cf]
+
+        for j, r in enumerate(block.rows):
+            out[r] = self._rank_diverse(final_scores[j], block.liked[j], top_n)
+        return out
+
+    def _rank_diverse(self, final_scores: np.ndarray, exclude: Set[str], top_n: int) -> List[str]:
+        """Top-N by score, skipping excluded SKUs and repeated base names (first two words)."""
+        # Top-k candidates via argpartition (O(N)) instead of a full sort
+        n_cand = min(len(final_scores), top_n * 3 + len(exclude))
+        part = np.argpartition(-final_scores, n_cand - 1)[:n_cand]
+        candidates_indices = part[np.argsort(-final_scores[part])]
         
         seen_base_names = set() 
         recommendations = []
         
         for i in candidates_indices:
-            sku = self.idx_to_sku[i]
-            if sku in liked_skus: continue
+            sku = self.sku_at(i)
+            if sku in exclude: continue
                 
-            p = self.products_map[sku]
-            base_name = " ".join(p.name.split()[:2]).lower()
+            base_name = int(self.base_keys[i])
             if base_name in seen_base_names: continue
             seen_base_names.add(base_name)
             
-            recommendations.append(p)
+            recommendations.append(sku)
             if len(recommendations) >= top_n: break
                 
         # Fallback
         if len(recommendations) < top_n:
             for i in final_scores.argsort()[::-1]:
                  if len(recommendations) >= top_n: break
-                 sku = self.idx_to_sku[i]
-                 if sku not in liked_skus and self.products_map[sku] not in recommendations:
-                      recommendations.append(self.products_map[sku])
+                 sku = self.sku_at(i)
+                 if sku not in exclude and sku not in recommendations:
+                      recommendations.append(sku)
         
         return recommendations
 
-    @lru_cache(maxsize=128)
-    def _get_trending_cached(self, n: int) -> List[str]:
-        # Returns SKUs to be pickleable/cacheable
-        if self.popularity_scores is None:
-             return list(self.products_map.keys())[:n]
-             
-        indices = self.popularity_scores.argsort()[::-1]
-        # Return top 100 SKUs cached
-        return [self.idx_to_sku[i] for i in indices[:100]]
+    def random_skus(self, n: int) -> List[str]:
+        if not len(self):
+            return []
+        picks = np.random.choice(len(self), size=min(n, len(self)), replace=False)
+        return self.sku_to_idx.many(picks)
+
+    # Product-returning wrappers: the model holds SKUs only; the final top-k is
+    # rehydrated from Mongo in one query
+    async def get_similar_products(self, sku: str, top_n: int = 5) -> List[Product]:
+        return await products_by_skus(self.similar_skus(sku, top_n))
 
-    def _get_trending_products(self, n: int) -> List[Product]:
+    async def recommend_for_user(self, user_id: str, top_n: int = 10) -> List[Product]:
+        return await products_by_skus(await self.recommend_skus_for_user(user_id, top_n))
+
+    def category_of(self, sku: str) -> Optional[str]:
+        """Normalised category key of `sku` (see category_key), None if unknown."""
+        i = self.sku_to_idx.get(sku)
+        if i is None or self.category_codes is None:
+            return None
+        return self.category_names[int(self.category_codes[i])]
+
+    def trending_skus(self, n: int, category: Optional[str] = None) -> List[str]:
         """
-        Return products sorted by popularity score.
+        The n hottest SKUs by decayed recent activity (optionally in one category),
+        topped up with the static popularity ranking when there is too little activity.
         """
-        cached_skus = self._get_trending_cached(100) # Get top 100
-        
-        if len(cached_skus) > n:
-            chosen_skus = random.sample(cached_skus, n)
-        else:
-            chosen_skus = cached_skus[:n]
-            
-        return [self.products_map[s] for s in chosen_skus if s in self.products_map]
+        if not len(self) or n <= 0:
+            return []
+        out: List[str] = []
+        if self.trending is not None:
+            out = self.trending.top(n, category=category, alive=self.sku_to_idx.__contains__)
+        if len(out) < n:
+            pop = self.popularity_scores
+            if category is not None:
+                if category not in self.category_names:
+                    return out
+                rows = np.flatnonzero(self.category_codes == self.category_names.index(category))
+            else:
+                rows = np.arange(len(self))
+            want = min(len(rows), n + len(out))
+            part = rows[np.argpartition(-pop[rows], want - 1)[:want]] if want else rows[:0]
+            seen = set(out)
+            for i in part[np.argsort(-pop[part], kind="stable")]:
+                sku = self.sku_at(i)
+                if sku not in seen:
+                    out.append(sku)
+                    if len(out) >= n:
+                        break
+        return out
+
+    async def _get_trending_products(self, n: int) -> List[Product]:
+        return await products_by_skus(self.trending_skus(n))
+
+
+async def products_by_skus(skus: List[str]) -> List[Product]:
+    """Rehydrate recommender output with one $in query, keeping the ranking order."""
+    if not skus:
+        return []
+    from beanie.operators import In
+    found = await Product.find(In(Product.sku, skus), Product.is_archived == False).to_list()
+    by_sku = {p.sku: p for p in found}
+    return [by_sku[s] for s in skus if s in by_sku]
 
 # Singleton
 recommender = AdvancedRecommender()
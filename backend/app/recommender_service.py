@@ -0,0 +1,452 @@
+"""
+Serving-side owner of the live recommender.
+
+Request handlers read `recommender_service.current` once and keep that
+reference for the whole request. Retraining builds a completely new
+AdvancedRecommender: the sklearn fit runs in a separate process (so the event
+loop never stalls), the child persists the artifacts, and this worker maps
+them into a fresh instance before swapping the reference. Requests that
+already hold the old model finish on it.
+
+Retrains are triggered by product writes (`mark_dirty`, debounced) and by a
+periodic fingerprint check, which also lets every gunicorn worker pick up a
+model trained by a sibling without fitting again. Single-product edits are
+applied right away (`upsert` / `remove`) on the worker that handled the write,
+copy-on-write: the edit goes into a copy of the live model that then replaces
+it, so a request holding the old reference never sees it change. The periodic
+check later replaces it with a full refit.
+
+The item-item collaborative model (app.collab) and the customer profiles
+(app.profiles) are owned here as well: updated in place as orders and 4+
+star ratings arrive, and rebuilt from orders and ratings by the periodic
+check when those collections changed since the last rebuild (document count
+and newest timestamp, one server-side `$group` each), which is how one
+worker picks up another's writes. The CF model is attached to whichever
+content model is live.
+
+So is the trending engine (app.trending): every recorded order, rating,
+reservation and sale bumps its decayed counters right away; the periodic
+check rebuilds it from the shared snapshot plus newer events when any of
+those collections changed, and refreshes the snapshot when it is older than
+`trending_snapshot_seconds`.
+
+An empty catalog is remembered by fingerprint like a fitted one, so it is
+not refitted on every check.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from app.collab import MIN_STARS, ItemCF, load_interactions
+from app.config import get_settings
+from app.models import Order, Product, Rating, Reservation, SaleArchive
+from app.neighbor_index import BLOCK_CELLS
+from app.profiles import ProfileStore
+from app.recommender import AdvancedRecommender
+from app.trending import TrendingEngine
+from app.recommender_store import (
+    ARTIFACT_DIR,
+    FitLock,
+    catalog_fingerprint,
+    fit_and_save,
+    load_artifacts,
+    product_rows,
+    try_load,
+)
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# (collection, timestamp field) the CF model and profiles are built from
+CF_SOURCES = ((Order, "created_at"), (Rating, "created_at"))
+# ... and every event source of the trending engine
+TRENDING_SOURCES = CF_SOURCES + ((Reservation, "created_at"), (SaleArchive, "sold_at"))
+
+
+async def interaction_marks() -> Tuple[Tuple[int, Any], ...]:
+    """(document count, newest timestamp) of each of TRENDING_SOURCES, without shipping documents."""
+    marks = []
+    for model, field in TRENDING_SOURCES:
+        rows = await model.aggregate([
+            {"$group": {"_id": None, "n": {"$sum": 1}, "last": {"$max": f"${field}"}}},
+        ]).to_list()
+        marks.append((rows[0]["n"], rows[0]["last"]) if rows else (0, None))
+    return tuple(marks)
+
+
+class RecommenderService:
+    def __init__(
+        self,
+        root: Path = ARTIFACT_DIR,
+        mode: str = "tfidf",
+        refresh_seconds: int = 900,
+        debounce_seconds: int = 30,
+        collab_top_k: int = 50,
+        collab_memory_mb: int = 128,
+        collab_weight: float = 0.3,
+        max_profiles: int = 100_000,
+        trending_half_life_hours: float = 72.0,
+        trending_snapshot_seconds: int = 3600,
+    ):
+        self.root = root
+        self.mode = mode
+        self.collab_top_k = collab_top_k
+        self.collab_memory_mb = collab_memory_mb
+        self.collab_weight = collab_weight
+        self.refresh_seconds = refresh_seconds
+        self.debounce_seconds = debounce_seconds
+
+        self.collab = ItemCF(top_k=collab_top_k, memory_mb=collab_memory_mb)
+        self.profiles = ProfileStore(max_profiles=max_profiles)
+        self.trending = TrendingEngine(half_life_hours=trending_half_life_hours)
+        self.trending_snapshot_seconds = trending_snapshot_seconds
+        self.trending_saved_at: Optional[datetime] = None
+        self.current = self._new_model()
+        self.collab_fitted_at: Optional[datetime] = None
+        # interaction_marks() as of the last successful rebuild (None = rebuild next time)
+        self._marks: Optional[Tuple[Tuple[int, Any], ...]] = None
+        # Interactions that arrive while the CF model is being rebuilt
+        self._collab_pending: Optional[List[Tuple[str, List[str]]]] = None
+        self.version: Optional[str] = None
+        self.train_seconds: Optional[float] = None
+        self.loaded_at: Optional[datetime] = None
+        self.last_error: Optional[str] = None
+        self.training = False
+
+        self._dirty = False
+        self._wake: Optional[asyncio.Event] = None
+        self._refresh_lock: Optional[asyncio.Lock] = None
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def wake(self) -> asyncio.Event:
+        # Created lazily so they bind to the running loop
+        if self._wake is None:
+            self._wake = asyncio.Event()
+        return self._wake
+
+    @property
+    def refresh_lock(self) -> asyncio.Lock:
+        if self._refresh_lock is None:
+            self._refresh_lock = asyncio.Lock()
+        return self._refresh_lock
+
+    @property
+    def pool(self) -> ProcessPoolExecutor:
+        # spawn: never fork a process that holds the event loop and Mongo sockets
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"))
+        return self._pool
+
+    def _new_model(self) -> AdvancedRecommender:
+        rec = AdvancedRecommender(mode=self.mode)
+        rec.weights['collab'] = self.collab_weight
+        rec.collab = self.collab
+        rec.trending = self.trending
+        return rec
+
+    def _install(self, fresh: AdvancedRecommender, path: Path, train_seconds: Optional[float] = None):
+        # On the event loop, so a swap never interleaves with a copy-on-write edit
+        fresh.collab = self.collab
+        self.current = fresh
+        self.trending.set_category_source(fresh.category_of)
+        self.version = path.name
+        self.loaded_at = datetime.utcnow()
+        if train_seconds is not None:
+            self.train_seconds = round(train_seconds, 3)
+        logger.info(f"Recommender swapped to {self.version} ({len(fresh)} products)")
+
+    def mark_dirty(self):
+        """Called after product writes; the scheduler retrains after the debounce window."""
+        self._dirty = True
+        if self._task is not None:
+            self.wake.set()
+
+    def upsert(self, product: Product):
+        try:
+            fresh = self.current.copy()
+            fresh.upsert(product)
+        except Exception as e:
+            logger.error(f"Incremental recommender update for {product.sku} failed: {e}")
+            self.mark_dirty()
+            return
+        self.current = fresh
+        if self.training:
+            # The model being trained was snapshotted before this write
+            self.mark_dirty()
+
+    def remove(self, sku: str):
+        try:
+            fresh = self.current.copy()
+            fresh.remove(sku)
+        except Exception as e:
+            logger.error(f"Incremental recommender removal of {sku} failed: {e}")
+            self.mark_dirty()
+            return
+        self.current = fresh
+        if self.training:
+            self.mark_dirty()
+
+    def _record_collab(self, user: str, skus: List[str]):
+        if self._collab_pending is not None:
+            self._collab_pending.append((user, skus))
+        try:
+            self.collab.add_interactions(user, skus)
+        except Exception as e:
+            logger.error(f"Collaborative update for {user} failed: {e}")
+
+    def record_order(self, user: Optional[str], items: Sequence[Tuple[str, float]]):
+        """A customer ordered `items` ((sku, price) pairs); update CF and their profile now."""
+        if not user:
+            return
+        items = list(items)
+        self._record_collab(user, [sku for sku, _ in items])
+        self.profiles.record_order(user, items)
+        for sku, _ in items:
+            self.trending.add(sku, "order")
+
+    def record_rating(self, user: Optional[str], sku: str, stars: int):
+        if not user:
+            return
+        if stars >= MIN_STARS:
+            self._record_collab(user, [sku])
+        self.profiles.record_rating(user, sku, stars)
+        self.trending.add(sku, "rating", weight=stars / 5.0)
+
+    def record_reservation(self, sku: str, qty: int = 1):
+        self.trending.add(sku, "reservation", weight=float(max(qty, 1)))
+
+    def record_sale(self, sku: str):
+        self.trending.add(sku, "sale")
+
+    async def recommend_for_customer(self, user: str, top_n: int = 10) -> List[str]:
+        """Personalized SKUs from the cached profile (Mongo only on a cache miss)."""
+        rec = self.current
+        if not rec.is_fitted:
+            return []
+        profile = await self.profiles.get(user)
+        return rec.recommend_skus_for_profile(profile, top_n)
+
+    async def recommend_for_customers(self, users: List[str], top_n: int = 10) -> Dict[str, List[str]]:
+        """Personalized SKUs for many customers, scored in customers x items blocks."""
+        rec = self.current
+        if not rec.is_fitted:
+            return {}
+        profiles = await self.profiles.get_many(users)
+        order = list(profiles)
+        out: Dict[str, List[str]] = {}
+        chunk = max(1, BLOCK_CELLS // max(1, len(rec)))
+        for start in range(0, len(order), chunk):
+            block = order[start:start + chunk]
+            # Profiles, CF and trending change on the loop: read them here, score in a thread
+            prepared = rec.prepare_profiles([profiles[u] for u in block], top_n)
+            lists = await asyncio.to_thread(rec.score_profiles, prepared, top_n)
+            out.update(zip(block, lists))
+        return out
+
+    async def refresh_collab(self) -> int:
+        """Rebuild the CF model from all orders and ratings, then swap it in."""
+        self._collab_pending = []
+        try:
+            pairs = await load_interactions()
+            fresh = ItemCF(top_k=self.collab_top_k, memory_mb=self.collab_memory_mb)
+            await asyncio.to_thread(fresh.fit, pairs)
+            for user, skus in self._collab_pending:
+                fresh.add_interactions(user, skus)
+        finally:
+            self._collab_pending = None
+        self.collab = fresh
+        self.current.collab = fresh
+        self.collab_fitted_at = datetime.utcnow()
+        return len(pairs)
+
+    async def _safe_refresh_collab(self):
+        """Rebuild CF + profiles / trending only if their source collections changed."""
+        seen, self._marks = self._marks, None
+        try:
+            marks = await interaction_marks()
+        except Exception as e:
+            logger.error(f"Reading interaction marks failed: {e}")
+            marks = None
+        ok = True
+        if marks is None or seen is None or marks[:len(CF_SOURCES)] != seen[:len(CF_SOURCES)]:
+            try:
+                await self.refresh_collab()
+            except Exception as e:
+                ok = False
+                logger.error(f"Collaborative model refresh failed: {e}")
+            try:
+                await self.profiles.warm()
+            except Exception as e:
+                ok = False
+                logger.error(f"Customer profile warm-up failed: {e}")
+        if marks is None or marks != seen:
+            ok = await self._safe_refresh_trending() and ok
+        if ok:
+            self._marks = marks
+
+    async def refresh_trending(self):
+        """Rebuild the counters from the snapshot plus newer events; snapshot them when due."""
+        await self.trending.rebuild()
+        now = datetime.utcnow()
+        if self.trending_saved_at is None or (now - self.trending_saved_at).total_seconds() >= self.trending_snapshot_seconds:
+            if await self.trending.save_snapshot():
+                self.trending_saved_at = now
+
+    async def _safe_refresh_trending(self) -> bool:
+        try:
+            await self.refresh_trending()
+            return True
+        except Exception as e:
+            logger.error(f"Trending refresh failed: {e}")
+            return False
+
+    async def refresh(self, force: bool = False) -> str:
+        """
+        Bring `current` in line with the catalog.
+        Returns "unchanged", "loaded" (artifacts from another worker), "trained"
+        or "empty" (no active products).
+        """
+        async with self.refresh_lock:
+            self._dirty = False
+            fingerprint = await catalog_fingerprint()
+            if not force and fingerprint == self.current.fingerprint:
+                return "unchanged"
+
+            if not force and await self._try_swap(fingerprint):
+                return "loaded"
+
+            lock = FitLock(self.root)
+            await asyncio.to_thread(lock.acquire)
+            try:
+                # A sibling worker may have trained this catalog while we waited
+                if not force and await self._try_swap(fingerprint):
+                    return "loaded"
+
+                self.training = True
+                products = await Product.find(Product.is_archived == False).to_list()
+                rows = product_rows(products)
+                del products
+                if not rows:
+                    # Nothing to fit; keep the fingerprint so the next check is a no-op
+                    empty = self._new_model()
+                    empty.fingerprint = fingerprint
+                    self.current = empty
+                    self.version = None
+                    self.loaded_at = datetime.utcnow()
+                    return "empty"
+                loop = asyncio.get_running_loop()
+                out = await loop.run_in_executor(self.pool, fit_and_save, rows, fingerprint, self.root, self.mode)
+                if out["path"]:
+                    path = Path(out["path"])
+                    fresh = await asyncio.to_thread(load_artifacts, self._new_model(), path)
+                    self._install(fresh, path, out["seconds"])
+                self.last_error = None
+                return "trained"
+            finally:
+                self.training = False
+                lock.release()
+
+    async def _try_swap(self, fingerprint: str) -> bool:
+        fresh = self._new_model()
+        path = await asyncio.to_thread(try_load, fresh, fingerprint, self.root)
+        if path is None:
+            return False
+        self._install(fresh, path)
+        return True
+
+    async def _safe_refresh(self, force: bool = False) -> Optional[str]:
+        try:
+            return await self.refresh(force=force)
+        except Exception as e:
+            self.last_error = str(e)
+            logger.error(f"Recommender refresh failed: {e}")
+            return None
+
+    async def _loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self.wake.wait(), timeout=self.refresh_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self.wake.clear()
+            if self._dirty:
+                # Coalesce bursts of writes (e.g. a CSV import) into one retrain
+                await asyncio.sleep(self.debounce_seconds)
+            await self._safe_refresh()
+            await self._safe_refresh_collab()
+
+    async def start(self):
+        """Startup: map existing artifacts or train once, then schedule refreshes."""
+        t0 = time.perf_counter()
+        how = await self._safe_refresh()
+        await self._safe_refresh_collab()
+        print(f"Recommender {how or 'unavailable'} in {time.perf_counter() - t0:.1f}s ({len(self.current)} products).")
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def status(self) -> Dict[str, Any]:
+        rec = self.current
+        return {
+            "version": self.version,
+            "mode": rec.mode,
+            "fingerprint": rec.fingerprint,
+            "is_fitted": rec.is_fitted,
+            "catalog_size": len(rec),
+            "trained_at": rec.last_trained.isoformat() if rec.last_trained else None,
+            "train_seconds": self.train_seconds,
+            "loaded_at": self.loaded_at.isoformat() if self.loaded_at else None,
+            "training": self.training,
+            "dirty": self._dirty,
+            "last_error": self.last_error,
+            "collab": {
+                "items": len(self.collab),
+                "users": len(self.collab.user_index),
+                "interactions": self.collab.n_interactions,
+                "fitted_at": self.collab_fitted_at.isoformat() if self.collab_fitted_at else None,
+                "weight": self.collab_weight,
+            },
+            "trending": {
+                "skus": len(self.trending),
+                "events": self.trending.events,
+                "half_life_hours": self.trending.half_life / 3600.0,
+                "as_of": self.trending.as_of.isoformat() if self.trending.as_of else None,
+                "snapshot_at": self.trending_saved_at.isoformat() if self.trending_saved_at else None,
+            },
+            "profiles": {
+                "cached": len(self.profiles),
+                "hits": self.profiles.hits,
+                "misses": self.profiles.misses,
+            },
+        }
+
+
+# Singleton
+recommender_service = RecommenderService(
+    mode=settings.RECOMMENDER_MODE,
+    collab_top_k=settings.COLLAB_TOP_K,
+    collab_memory_mb=settings.COLLAB_MEMORY_MB,
+    collab_weight=settings.COLLAB_WEIGHT,
+    max_profiles=settings.PROFILE_CACHE_SIZE,
+    trending_half_life_hours=settings.TRENDING_HALF_LIFE_HOURS,
+    trending_snapshot_seconds=settings.TRENDING_SNAPSHOT_SECONDS,
+    refresh_seconds=settings.RECOMMENDER_REFRESH_SECONDS,
+    debounce_seconds=settings.RECOMMENDER_DEBOUNCE_SECONDS,
+)
@@ -0,0 +1,238 @@
+"""
+On-disk, memory-mapped recommender artifacts.
+
+A fitted AdvancedRecommender is written as plain `.npy` arrays (CSR parts,
+price/popularity vectors, SKU array, neighbor index) plus a small JSON header
+into a versioned directory:
+
+    <RECOMMENDER_ARTIFACT_DIR>/
+        CURRENT                      -> name of the active version dir
+        v<format>-<mode>-<fingerprint[:16]>/   (format = ARTIFACT_FORMAT_VERSION, now 3)
+            meta.json  vectorizer.pkl  tfidf_data.npy  tfidf_indices.npy ...
+            embeddings.npy  word2vec.kv            (embedding mode only)
+
+Workers load the arrays with `np.load(mmap_mode="r")`, so every gunicorn
+worker maps the same page-cache copy and startup is a few file opens. A full
+fit only happens when the catalog fingerprint (SKU + updated_at of every
+active product) no longer matches the stored one.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import pickle
+import shutil
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from pydantic import BaseModel
+from scipy import sparse
+
+from app.config import get_settings
+from app.models import Product
+from app.embeddings import ProductEmbedder
+from app.sku_index import SkuIndex
+from app.recommender import FIT_FIELDS, ITEM_ARRAYS, ROW_ARRAYS, AdvancedRecommender
+
+try:  # POSIX only; on Windows concurrent fits are merely wasteful
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# Bump when the array layout changes
+ARTIFACT_FORMAT_VERSION = 3
+
+ARTIFACT_DIR = Path(settings.RECOMMENDER_ARTIFACT_DIR).resolve()
+
+class _FingerprintRow(BaseModel):
+    sku: str
+    updated_at: datetime
+
+
+async def catalog_fingerprint() -> str:
+    """Hash of (sku, updated_at) over the active catalog - cheap projected scan."""
+    rows = await Product.find(Product.is_archived == False).project(_FingerprintRow).to_list()
+    h = hashlib.sha256()
+    for r in sorted(rows, key=lambda r: r.sku):
+        h.update(f"{r.sku}|{r.updated_at.isoformat()}\n".encode("utf-8"))
+    return h.hexdigest()
+
+
+def _version_name(fingerprint: str, mode: str) -> str:
+    return f"v{ARTIFACT_FORMAT_VERSION}-{mode}-{fingerprint[:16]}"
+
+
+class FitLock:
+    """Cross-process lock so only one worker fits while the others wait and load."""
+
+    def __init__(self, root: Path = ARTIFACT_DIR):
+        self.root = root
+        self._f = None
+
+    def acquire(self):
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._f = open(self.root / ".lock", "w")
+        if fcntl:
+            fcntl.flock(self._f, fcntl.LOCK_EX)
+
+    def release(self):
+        if self._f is None:
+            return
+        if fcntl:
+            fcntl.flock(self._f, fcntl.LOCK_UN)
+        self._f.close()
+        self._f = None
+
+
+def save_artifacts(rec: AdvancedRecommender, fingerprint: str, root: Path = ARTIFACT_DIR) -> Path:
+    """Write `rec` atomically (tmp dir + rename) and point CURRENT at it."""
+    root.mkdir(parents=True, exist_ok=True)
+    final = root / _version_name(fingerprint, rec.mode)
+    tmp = root / f".tmp-{uuid.uuid4().hex}"
+    tmp.mkdir()
+
+    m = rec.tfidf_matrix.tocsr()
+    np.save(tmp / "tfidf_data.npy", m.data.astype(np.float32, copy=False))
+    np.save(tmp / "tfidf_indices.npy", m.indices)
+    np.save(tmp / "tfidf_indptr.npy", m.indptr)
+    for name in ROW_ARRAYS:
+        np.save(tmp / f"{name}.npy", getattr(rec, name))
+    np.save(tmp / "neighbor_idx.npy", rec.neighbors.idx)
+    np.save(tmp / "neighbor_score.npy", rec.neighbors.score)
+
+    with open(tmp / "vectorizer.pkl", "wb") as f:
+        pickle.dump(rec.tfidf, f)
+    if rec.mode == "embedding":
+        np.save(tmp / "embeddings.npy", rec.embeddings)
+        rec.embedder.save(tmp / "word2vec.kv")
+
+    meta = {
+        "format": ARTIFACT_FORMAT_VERSION,
+        "mode": rec.mode,
+        "fingerprint": fingerprint,
+        "n_items": len(rec),
+        "tfidf_shape": list(m.shape),
+        "price_bounds": list(rec.price_bounds),
+        "popularity_bounds": list(rec.popularity_bounds),
+        "category_names": rec.category_names,
+        "neighbor_k": rec.neighbors.k,
+        "trained_at": (rec.last_trained or datetime.utcnow()).isoformat(),
+    }
+    (tmp / "meta.json").write_text(json.dumps(meta))
+
+    if final.exists():
+        shutil.rmtree(final, ignore_errors=True)
+    os.replace(tmp, final)
+
+    current_tmp = root / f"CURRENT.{uuid.uuid4().hex}"
+    current_tmp.write_text(final.name)
+    os.replace(current_tmp, root / "CURRENT")
+
+    _prune_old_versions(root, keep=final.name)
+    rec.fingerprint = fingerprint
+    return final
+
+
+def _prune_old_versions(root: Path, keep: str, max_versions: int = 3):
+    # Mapped files stay valid for workers that still use them (unlink semantics)
+    versions = sorted(
+        (d for d in root.iterdir() if d.is_dir() and d.name.startswith("v") and d.name != keep),
+        key=lambda d: d.stat().st_mtime,
+        reverse=True,
+    )
+    for d in versions[max_versions - 1:]:
+        shutil.rmtree(d, ignore_errors=True)
+
+
+def current_version(root: Path = ARTIFACT_DIR) -> Optional[Path]:
+    try:
+        name = (root / "CURRENT").read_text().strip()
+    except FileNotFoundError:
+        return None
+    path = root / name
+    return path if path.is_dir() else None
+
+
+def load_artifacts(rec: AdvancedRecommender, path: Path) -> AdvancedRecommender:
+    """Populate `rec` from a version directory, memory-mapping the arrays."""
+    meta = json.loads((path / "meta.json").read_text())
+    if meta.get("format") != ARTIFACT_FORMAT_VERSION:
+        raise ValueError(f"Artifact format {meta.get('format')} != {ARTIFACT_FORMAT_VERSION}")
+
+    def _load(name):
+        return np.load(path / f"{name}.npy", mmap_mode="r")
+
+    rec.tfidf_matrix = sparse.csr_matrix(
+        (_load("tfidf_data"), _load("tfidf_indices"), _load("tfidf_indptr")),
+        shape=tuple(meta["tfidf_shape"]),
+        copy=False,
+    )
+    for name in ITEM_ARRAYS:
+        setattr(rec, name, _load(name))
+    rec.sku_to_idx = SkuIndex(_load("skus"), _load("sku_order"))
+    rec.neighbors.k = int(meta["neighbor_k"])
+    rec.neighbors.idx = _load("neighbor_idx")
+    rec.neighbors.score = _load("neighbor_score")
+
+    with open(path / "vectorizer.pkl", "rb") as f:
+        rec.tfidf = pickle.load(f)
+
+    rec.mode = meta["mode"]
+    if rec.mode == "embedding":
+        rec.embeddings = _load("embeddings")
+        rec.embedder = ProductEmbedder.load(path / "word2vec.kv")
+    else:
+        rec.embeddings = rec.embedder = None
+
+    rec.price_bounds = tuple(meta["price_bounds"])
+    rec.popularity_bounds = tuple(meta["popularity_bounds"])
+    rec.category_names = list(meta["category_names"])
+    rec.fingerprint = meta["fingerprint"]
+    rec.last_trained = datetime.fromisoformat(meta["trained_at"])
+    rec.is_fitted = True
+    return rec
+
+
+def product_rows(products: List[Product]) -> List[Dict[str, Any]]:
+    """Plain dicts with just the fields `fit` reads, cheap to send to a child process."""
+    return [p.model_dump(include=set(FIT_FIELDS)) for p in products]
+
+
+def fit_and_save(
+    rows: List[Dict[str, Any]], fingerprint: str, root: Path = ARTIFACT_DIR, mode: str = "tfidf",
+) -> Dict[str, Any]:
+    """
+    Fit a fresh recommender from `product_rows` output and persist it.
+    Runs in a worker process; the caller maps the result with `load_artifacts`.
+    """
+    t0 = time.perf_counter()
+    rec = AdvancedRecommender(mode=mode)
+    rec.fit([SimpleNamespace(**r) for r in rows])
+    if not rec.is_fitted:
+        return {"path": None, "seconds": time.perf_counter() - t0}
+    path = save_artifacts(rec, fingerprint, root)
+    return {"path": str(path), "seconds": time.perf_counter() - t0}
+
+
+def try_load(rec: AdvancedRecommender, fingerprint: str, root: Path = ARTIFACT_DIR) -> Optional[Path]:
+    """Load the artifacts for `fingerprint` into `rec`; returns their path, or None."""
+    path = root / _version_name(fingerprint, rec.mode)
+    if not path.is_dir():
+        return None
+    try:
+        load_artifacts(rec, path)
+        return path
+    except Exception as e:
+        logger.warning(f"Could not load recommender artifacts from {path}: {e}")
+        return None
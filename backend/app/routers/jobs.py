@@ -0,0 +1,53 @@
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import FileResponse
+from pathlib import Path
+
+from app.auth import get_current_admin
+from app.jobs import JOB_OUTPUT_DIR, job_out, job_runner
+from app.models import Job
+
+router = APIRouter()
+
+
+@router.get("")
+async def list_jobs(kind: str = "", limit: int = 50, user=Depends(get_current_admin)):
+    query = Job.find()
+    if kind.strip():
+        query = query.find(Job.kind == kind.strip())
+    lim = max(1, min(int(limit), 200))
+    rows = await query.sort(-Job.created_at).limit(lim).to_list()
+    return {"ok": True, "items": [job_out(j) for j in rows]}
+
+
+@router.get("/{job_id}")
+async def get_job(job_id: str, user=Depends(get_current_admin)):
+    job = await Job.find_one(Job.id == job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_out(job)
+
+
+@router.post("/{job_id}/cancel")
+async def cancel_job(job_id: str, user=Depends(get_current_admin)):
+    job = await job_runner.cancel(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_out(job)
+
+
+@router.get("/{job_id}/download")
+async def download_job_output(job_id: str, user=Depends(get_current_admin)):
+    job = await Job.find_one(Job.id == job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job.status != "succeeded" or not job.result or not job.result.get("file"):
+        raise HTTPException(status_code=409, detail="Job has no downloadable output")
+
+    path = (JOB_OUTPUT_DIR / Path(job.result["file"]).name).resolve()
+    if not path.exists():
+        raise HTTPException(status_code=410, detail="Job output expired")
+    return FileResponse(
+        str(path),
+        media_type=job.result.get("media_type") or "application/octet-stream",
+        filename=job.result.get("filename") or path.name,
+    )
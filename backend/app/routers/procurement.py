@@ -1,10 +1,14 @@
-from fastapi import APIRouter, Depends
-from typing import List, Optional
-from datetime import datetime, timedelta
+from fastapi import APIRouter, Depends, HTTPException
+from typing import Dict, List, Optional
+from datetime import datetime
 from pydantic import BaseModel
+from beanie.operators import In
 
+from app import procurement_scoring as scoring
 from app.auth import get_current_admin
-from app.models import Product, Order, ProductImage, SaleArchive
+from app.cache import Snapshot, analytics_cache
+from app.models import ProductImage
+from app.sales_facts import JOB_KIND as SALES_FACTS_JOB_KIND, rebuild_job as sales_facts_rebuild_job, sales_facts
 
 router = APIRouter()
 
@@ -25,257 +29,164 @@ class ProcurementRecommendation(BaseModel):
     avg_rating: Optional[float] = 0.0
     rating_count: int = 0
 
-@router.get("/recommendations", response_model=List[ProcurementRecommendation])
+async def _primary_images(skus: List[str]) -> Dict[str, Optional[str]]:
+    if not skus:
+        return {}
+    images = await ProductImage.find(ProductImage.is_primary == True, In(ProductImage.sku, skus)).to_list()
+    return {img.sku: img.url for img in images}
+
+
+class ProcurementSummary(BaseModel):
+    total: int
+    urgent: int  # score >= 80
+    retail_value: float
+    by_recommendation: Dict[str, int]
+    categories: Dict[str, int]
+
+
+class ProcurementPage(BaseModel):
+    items: List[ProcurementRecommendation]
+    matched: int  # rows matching the filters, across all pages
+    next_cursor: Optional[str] = None
+    summary: ProcurementSummary  # whole catalog, ignoring the filters
+    snapshot_age_seconds: float
+    refreshing: bool = False
+
+
+# Orders feed the velocity rollups, sales the archive ones
+SNAPSHOT_TOPICS = ("products", "orders", "sales", "ratings")
+
+
+async def _compute_scores() -> scoring.Scores:
+    return scoring.score(await scoring.load_columns())
+
+
+async def _scores() -> Snapshot:
+    """The scored catalog, served from the last snapshot and refreshed in the background (app/cache.py)."""
+    return await analytics_cache.get_snapshot(
+        "procurement_scores", SNAPSHOT_TOPICS, _compute_scores, epoch=datetime.utcnow().date(),
+    )
+
+
+@router.get("/recommendations", response_model=ProcurementPage)
 async def get_procurement_recommendations(
+    recommendation: Optional[str] = None,  # comma-separated, e.g. "Buy,Urgent Restock"
+    category: Optional[str] = None,
+    min_score: Optional[int] = None,
+    q: Optional[str] = None,
+    sort: str = "score",
+    order: str = "desc",
+    cursor: Optional[str] = None,
+    limit: int = 50,
     user=Depends(get_current_admin)
 ):
-    recommendations = []
-    
-    # 1. Fetch active products
-    products = await Product.find(Product.is_archived == False).to_list()
-    
-    # Pre-fetch primary images
-    # Optimization: Fetch all primary images in one go if possible, or simple loop for now (N queries, but fast in Mongo)
-    # Better: Fetch all ProductImages where is_primary=True/ sku in [...]
-    primary_images = await ProductImage.find(ProductImage.is_primary == True).to_list()
-    image_map = {img.sku: img for img in primary_images}
-
-    # 2. Sales Velocity (Next Level Intelligence)
-    # Period A: Last 30 Days (T0 to T-30)
-    # Period B: Previous 30 Days (T-30 to T-60)
-    
-    now = datetime.utcnow()
-    t_30 = now - timedelta(days=30)
-    t_60 = now - timedelta(days=60)
-    
-    # Fetch Period A Orders
-    orders_a = await Order.find(Order.created_at >= t_30).to_list()
-    sales_a = {}
-    for o in orders_a:
-        for i in o.items:
-            sales_a[i.sku] = sales_a.get(i.sku, 0) + i.qty
-            
-    # Fetch Period B Orders (for trend)
-    orders_b = await Order.find(Order.created_at >= t_60, Order.created_at < t_30).to_list()
-    sales_b = {}
-    for o in orders_b:
-        for i in o.items:
-            sales_b[i.sku] = sales_b.get(i.sku, 0) + i.qty
-
-    # Fetch Archive Sales (Immediate Sales)
-    archives_a = await SaleArchive.find(SaleArchive.sold_at >= t_30).to_list()
-    for a in archives_a:
-        sales_a[a.sku] = sales_a.get(a.sku, 0) + 1
-        
-    archives_b = await SaleArchive.find(SaleArchive.sold_at >= t_60, SaleArchive.sold_at < t_30).to_list()
-    for a in archives_b:
-        sales_b[a.sku] = sales_b.get(a.sku, 0) + 1
-        
-    # Fetch Ratings
-    # This might be heavy if there are millions of ratings. 
-    # For now, fetch all ratings is okay given the scale, or aggregate via pipeline in future.
-    # Beanie doesn't support complex aggregation easily in `.find()`, let's just fetch all for now or optimize later.
-    from app.models import Rating
-    all_ratings = await Rating.find_all().to_list()
-    rating_map = {} # SKU -> {total: 0, count: 0}
-    for r in all_ratings:
-        if r.sku not in rating_map: rating_map[r.sku] = {"total": 0, "count": 0}
-        rating_map[r.sku]["total"] += r.stars
-        rating_map[r.sku]["count"] += 1
-
-    for p in products:
-        sku = p.sku
-        current_stock = p.qty
-        vol_a = sales_a.get(sku, 0)
-        vol_b = sales_b.get(sku, 0)
-        
-        # Rating Stats
-        r_stats = rating_map.get(sku, {"total": 0, "count": 0})
-        avg_rating = 0.0
-        rating_count = r_stats["count"]
-        if rating_count > 0:
-            avg_rating = r_stats["total"] / rating_count
-            
-        # Interest Multiplier based on Rating
-        # 4.5+ -> High Interest (Boost Forecast)
-        # < 3.0 -> Low Interest (Dampen Forecast)
-        interest_multiplier = 1.0
-        
-        if rating_count >= 3: # Only if significant data
-            if avg_rating >= 4.5:
-                interest_multiplier = 1.2 # Boost by 20%
-            elif avg_rating < 3.0:
-                interest_multiplier = 0.8 # Reduce by 20%
-        
-        # Trend Analysis
-        # If Vol A > Vol B -> Positive Trend
-        # If Vol A < Vol B -> Negative Trend
-        trend_factor = 1.0
-        if vol_b > 0:
-            growth = (vol_a - vol_b) / vol_b
-            trend_factor = 1.0 + (growth * 0.5) 
-        elif vol_a > 0:
-             trend_factor = 1.5
-        
-        trend_factor = max(0.5, min(2.0, trend_factor))
-
-        # Stockout Adjustment
-        stockout_multiplier = 1.0
-        if current_stock == 0 and vol_a > 5:
-             stockout_multiplier = 1.2
-             
-        # Forecast Calculation
-        # Modifiers: Trend, Stockout, INTEREST
-        raw_forecast = vol_a * trend_factor * stockout_multiplier * interest_multiplier
-        
-        if raw_forecast < 1 and vol_a > 0:
-            raw_forecast = 1
-            
-        forecasted = int(round(raw_forecast))
-            
-        # Days In Stock
-        base_date = p.purchase_date or p.created_at.date()
-        if isinstance(base_date, datetime): base_date = base_date.date()
-        days_in_stock = (now.date() - base_date).days
-        
-        # Default State
-        rec_type = "Monitor"
-        rec_color = "gray"
-        reason = "Healthy stock level."
-        score = 50 
-        
-        # Explain the forecast in reason
-        trend_text = ""
-        if trend_factor > 1.1: trend_text += " (Trending Up)"
-        elif trend_factor < 0.9: trend_text += " (Cooling Down)"
-        
-        if interest_multiplier > 1.0: trend_text += f" [High Rated {avg_rating:.1f}★]"
-        elif interest_multiplier < 1.0: trend_text += f" [Low Rated {avg_rating:.1f}★]"
-        
-        # Logic Tree
-        if current_stock == 0 and forecasted > 0:
-            rec_type = "Urgent Restock"
-            rec_color = "red"
-            reason = f"Stockout! Forecast {forecasted} units.{trend_text}"
-            score = 100
-            
-        elif current_stock < forecasted:
-            rec_type = "Buy"
-            rec_color = "green"
-            reason = f"Demand ({forecasted}) > Stock ({current_stock}).{trend_text}"
-            score = 80 + min(20, int((forecasted - current_stock) * 2))
-
-        elif current_stock > (forecasted * 3) and current_stock > 5:
-            rec_type = "Overstocked"
-            rec_color = "orange"
-            reason = f"Inventory too high ({current_stock} vs {forecasted}).{trend_text}"
-            score = 40
-            
-        elif vol_a == 0 and days_in_stock > 90:
-            # Special Case: High Interest but No Sales?
-            if avg_rating >= 4.0:
-                 rec_type = "Promote"
-                 rec_color = "blue"
-                 reason = f"High interest ({avg_rating:.1f}★) but no sales. Pricing issue?{trend_text}"
-                 score = 70
-            else:
-                rec_type = "Dead Stock"
-                rec_color = "black"
-                reason = f"No sales. Aged {days_in_stock} days.{trend_text}"
-                score = 10 
-            
-        elif days_in_stock > 180 and vol_a < 2:
-             rec_type = "Discount"
-             rec_color = "yellow"
-             reason = f"Aging stock. Consider clearance.{trend_text}"
-             score = 60
-        
-        else:
-             # Default Monitor
-             if interest_multiplier > 1.0:
-                 reason = f"Healthy stock. {trend_text}"
-             elif interest_multiplier < 1.0:
-                 reason = f"Healthy stock. {trend_text}"
-             
-        # Normalize Score
-        score = max(0, min(100, score))
-
-        # Image Logic
-        img_url = None
-        if sku in image_map:
-            img = image_map[sku]
-            if img.url: img_url = img.url
-            elif img.s3_key: 
-                 img_url = img.url 
-        
-        # Value
-        val = 0.0
-        if p.price:
-            val = p.price * current_stock
-        
-        recommendations.append(ProcurementRecommendation(
-            sku=sku,
-            name=p.name,
-            category=p.category or "Uncategorized",
-            current_stock=current_stock,
-            forecasted_demand=forecasted,
-            recommendation=rec_type,
-            recommendation_color=rec_color,
-            reason=reason,
-            days_in_stock=days_in_stock,
-            sales_velocity_30d=float(vol_a),
-            image_url=img_url,
-            procurement_score=score,
-            retail_value=val,
-            avg_rating=round(avg_rating, 1),
-            rating_count=rating_count
-        ))
-        
-    recommendations.sort(key=lambda x: x.procurement_score, reverse=True)
-    return recommendations
-
-from fastapi.responses import StreamingResponse
-import io
-import csv
+    if sort not in scoring.SORT_KEYS:
+        raise HTTPException(status_code=400, detail=f"sort must be one of: {', '.join(scoring.SORT_KEYS)}")
+    if order not in ("asc", "desc"):
+        raise HTTPException(status_code=400, detail="order must be asc or desc")
+    descending = order == "desc"
+    lim = max(1, min(int(limit), 500))
+    wanted = [r.strip() for r in recommendation.split(",") if r.strip()] if recommendation else None
 
-@router.get("/export")
-async def export_procurement_plan(user=Depends(get_current_admin)):
-    # 1. Get Data
-    recs = await get_procurement_recommendations(user)
-    
-    # 2. Create CSV
-    output = io.StringIO()
-    writer = csv.writer(output)
-    
-    # Header
-    writer.writerow([
-        "SKU", "Name", "Category", "Stock", "Forecast (30d)", 
-        "Velocity (30d)", "Days In Stock", "Rating", "Score", 
-        "Recommendation", "Reason", "Value (INR)"
-    ])
-    
-    # Rows
-    for r in recs:
-        writer.writerow([
-            r.sku,
-            r.name,
-            r.category,
-            r.current_stock,
-            r.forecasted_demand,
-            r.sales_velocity_30d,
-            r.days_in_stock,
-            f"{r.avg_rating} ({r.rating_count})",
-            r.procurement_score,
-            r.recommendation,
-            r.reason,
-            r.retail_value
-        ])
-        
-    output.seek(0)
-    
-    response = StreamingResponse(
-        iter([output.getvalue()]),
-        media_type="text/csv"
+    # Score, filter and sort on arrays; only the page becomes response objects
+    snap = await _scores()
+    scores = snap.value
+    try:
+        after = scoring.decode_cursor(cursor, sort, descending) if cursor else None
+        mask = scoring.filter_mask(scores, wanted, category, min_score, (q or "").strip() or None)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    positions, keyset = scoring.page(scores, mask, sort, descending, after, lim)
+
+    image_map = await _primary_images([scores.cols.sku[int(i)] for i in positions])
+    return ProcurementPage(
+        items=[ProcurementRecommendation(**row) for row in scoring.rows(scores, positions, image_map)],
+        matched=int(mask.sum()),
+        next_cursor=scoring.encode_cursor(sort, descending, keyset) if keyset else None,
+        summary=ProcurementSummary(**scoring.summary(scores)),
+        snapshot_age_seconds=round(snap.age_seconds, 1),
+        refreshing=snap.refreshing,
     )
-    response.headers["Content-Disposition"] = "attachment; filename=procurement_plan.csv"
+
+import asyncio
+
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from app import procurement_export as export
+from app.jobs import JobContext, job_runner
+
+
+def _export_format(format: str) -> str:
+    if format not in export.FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(export.FORMATS)}")
+    if format != "csv" and not export.columnar_available():
+        raise HTTPException(status_code=501, detail=f"{format} export needs pyarrow installed on the server")
+    return format
+
+
+@router.get("/export")
+async def export_procurement_plan(format: str = "csv", user=Depends(get_current_admin)):
+    """The ranked plan as CSV, Parquet or an Arrow IPC stream, encoded and sent chunk by chunk."""
+    fmt = _export_format(format)
+    snap = await _scores()
+    suffix, media_type = export.FORMATS[fmt]
+
+    # A sync generator: Starlette iterates it in the threadpool, off the event loop
+    response = StreamingResponse(export.export_chunks(snap.value, fmt), media_type=media_type)
+    response.headers["Content-Disposition"] = f"attachment; filename=procurement_plan{suffix}"
+    response.headers["X-Snapshot-Age"] = f"{snap.age_seconds:.1f}"
     return response
+
+
+def _write_next(chunks, f) -> bool:
+    """Encode the next export chunk and append it to `f` (blocking); False once exhausted."""
+    data = next(chunks, None)
+    if data is None:
+        return False
+    f.write(data)
+    return True
+
+
+async def _export_job(ctx: JobContext, user, fmt: str = "csv"):
+    await ctx.progress(0, 0, "Scoring catalog", force=True)
+    snap = await _scores()
+    total = len(snap.value.cols)
+    suffix, media_type = export.FORMATS[fmt]
+
+    path = ctx.output_path(suffix)
+    chunks = export.export_chunks(snap.value, fmt)
+    # Encoding and file I/O run in a thread; only the progress updates touch the loop
+    f = await asyncio.to_thread(path.open, "wb")
+    try:
+        i = 0
+        while await asyncio.to_thread(_write_next, chunks, f):
+            i += 1
+            await ctx.progress(min(i * export.CHUNK, total), total, f"Writing {fmt}")
+    finally:
+        await asyncio.to_thread(chunks.close)
+        await asyncio.to_thread(f.close)
+    await ctx.progress(total, total, "Done", force=True)
+
+    filename = f"procurement_plan_{datetime.utcnow().date().isoformat()}{suffix}"
+    return {"file": path.name, "filename": filename, "media_type": media_type, "rows": total,
+            "snapshot_age_seconds": round(snap.age_seconds, 1)}
+
+
+@router.post("/export/jobs")
+async def start_export_job(format: str = "csv", user=Depends(get_current_admin)):
+    """Generate the procurement export (csv / parquet / arrow) in the background; download via /jobs/{id}/download."""
+    fmt = _export_format(format)
+    job = await job_runner.submit("procurement_export", _export_job, user, fmt, created_by=user.email)
+    return JSONResponse({"ok": True, "job_id": job.id, "status": job.status}, status_code=202)
+
+
+@router.post("/sales/rebuild")
+async def rebuild_sales_facts(user=Depends(get_current_admin)):
+    """Backfill daily sales facts from orders / the sale archive and recompute the rollups."""
+    job = await job_runner.submit(SALES_FACTS_JOB_KIND, sales_facts_rebuild_job, created_by=user.email)
+    return JSONResponse({"ok": True, "job_id": job.id, "status": job.status}, status_code=202)
+
+
+@router.get("/sales/status")
+async def sales_facts_status(user=Depends(get_current_admin)):
+    return {"ok": True, **sales_facts.status()}
@@ -4,6 +4,8 @@ from typing import List, Optional
 from datetime import datetime
 
 from app.models import Product, Rating
+from app.cache import analytics_cache
+from app.recommender_service import recommender_service
 
 router = APIRouter()
 
@@ -33,6 +35,8 @@ async def rate_product(sku: str, rating: RatingRequest):
         customer_ref=rating.customer_ref
     )
     await new_rating.create()
+    recommender_service.record_rating(rating.customer_ref, sku, rating.stars)
+    analytics_cache.invalidate("ratings")
     
     return {"message": "Rating submitted successfully"}
 
@@ -0,0 +1,327 @@
+"""
+Daily sales facts and trailing-window rollups for procurement velocity.
+
+Every order line and every archive sale appends one `SalesFact` (sku, UTC
+day, units), keyed by (source, ref, sku) so replays are no-ops. The same
+write `$inc`s the SKU's `SalesRollup`, which holds units over the trailing
+7 / 30 / 60 / 90 days, so a velocity or trend lookup is one read of
+`sales_rollups` instead of a scan of the order history.
+
+Windows are day-granular: window w holds facts with day > as_of - w. When
+the day advances, `roll` subtracts only the facts of the days that just left
+a window (one indexed query on `day`), so the daily cost does not grow with
+history. The as-of day lives in `settings` and each step is claimed with a
+compare-and-set, so with several workers every day is rolled exactly once.
+
+`rebuild` recomputes everything from orders and the sale archive (first
+deploy, or to repair drift after a crash between a claim and its update).
+While it runs, a marker in `settings` tells every worker to store facts
+without bumping the rollups; once the rollups are `$set`, a second pass adds
+the facts created since the rebuild started, whichever worker wrote them.
+If the first-deploy backfill never finishes (the job failed or its worker
+died), the background loop schedules it again, at most once per
+BACKFILL_RETRY_AFTER across workers.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from datetime import date, datetime, time, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from pydantic import BaseModel, Field
+from beanie.operators import In
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from app.config import get_settings
+from app.jobs import ACTIVE_STATES, JobContext, job_runner
+from app.models import Job, Order, SaleArchive, SalesFact, SalesRollup, Setting
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+WINDOWS = (7, 30, 60, 90)
+FIELDS = tuple(f"units_{w}" for w in WINDOWS)
+# `settings` key holding the day the rollups are current for ("" = never rebuilt)
+AS_OF_KEY = "sales_rollups_as_of"
+# `settings` key holding the start of the running rebuild ("" = none)
+REBUILD_KEY = "sales_rollups_rebuilding"
+JOB_KIND = "sales_facts_rebuild"
+# `settings` key holding when a worker last rescheduled an unfinished backfill ("" = never)
+BACKFILL_RETRY_KEY = "sales_rollups_backfill_retry_at"
+BACKFILL_RETRY_AFTER = timedelta(hours=1)
+# Facts per insert_many during a rebuild
+CHUNK = 2000
+
+
+class _FactItem(BaseModel):
+    sku: str
+    qty: int = 1
+
+
+class _OrderFacts(BaseModel):
+    id: Any = Field(alias="_id")
+    created_at: datetime
+    items: List[_FactItem] = []
+
+
+class _SaleFacts(BaseModel):
+    id: Any = Field(alias="_id")
+    sku: str
+    sold_at: datetime
+
+
+def _midnight(d: date) -> datetime:
+    return datetime.combine(d, time())
+
+
+def _today() -> date:
+    return datetime.utcnow().date()
+
+
+async def _insert_new(facts: List[SalesFact]) -> List[SalesFact]:
+    """Insert facts, skipping ones already stored; returns those actually inserted."""
+    if not facts:
+        return []
+    try:
+        await SalesFact.insert_many(facts, ordered=False)
+        return facts
+    except BulkWriteError as e:
+        dup = {err["index"] for err in e.details.get("writeErrors", []) if err.get("code") == 11000}
+        failed = [err for err in e.details.get("writeErrors", []) if err.get("code") != 11000]
+        if failed:
+            raise
+        return [f for i, f in enumerate(facts) if i not in dup]
+
+
+class SalesFacts:
+    def __init__(self, check_seconds: int = 3600):
+        self.check_seconds = check_seconds
+        self.as_of: Optional[date] = None
+        self.last_roll: Optional[Dict[str, Any]] = None
+        self._task: Optional[asyncio.Task] = None
+
+    # --- writes --------------------------------------------------------------
+
+    async def record(self, source: str, ref: str, items: Iterable[Tuple[str, int]], at: Optional[datetime] = None) -> int:
+        """Append the facts of one order / sale and bump the rollups. Never raises."""
+        at = at or datetime.utcnow()
+        units: Dict[str, int] = {}
+        for sku, qty in items:
+            units[sku] = units.get(sku, 0) + int(qty)
+        try:
+            # Checked before the facts get their created_at, so a rebuild's second pass sees them
+            rebuilding = await self._rebuilding()
+            facts = [
+                SalesFact(sku=sku, day=at.date(), units=n, source=source, ref=ref)
+                for sku, n in units.items()
+            ]
+            new = await _insert_new(facts)
+            if not rebuilding:
+                await self._bump({f.sku: f.units for f in new}, at.date())
+            return len(new)
+        except Exception as e:
+            logger.error(f"Recording sales facts for {source} {ref} failed (rebuild to repair): {e}")
+            return 0
+
+    async def _bump(self, units: Dict[str, int], day: date):
+        # A fact counts in window w while day > as_of - w; older ones have already left it
+        fields = [f for w, f in zip(WINDOWS, FIELDS) if self.as_of is None or day > self.as_of - timedelta(days=w)]
+        if not units or not fields:
+            return
+        ops = [UpdateOne({"sku": sku}, {"$inc": {f: n for f in fields}}, upsert=True) for sku, n in units.items()]
+        await SalesRollup.get_motor_collection().bulk_write(ops, ordered=False)
+
+    async def _rebuilding(self) -> bool:
+        row = await Setting.find_one(Setting.key == REBUILD_KEY)
+        return bool(row and row.value)
+
+    async def _set_marker(self, key: str, value: str):
+        await Setting.get_motor_collection().update_one(
+            {"key": key}, {"$set": {"value": value}}, upsert=True,
+        )
+
+    # --- daily roll ----------------------------------------------------------
+
+    async def _stored_as_of(self) -> Optional[date]:
+        row = await Setting.find_one(Setting.key == AS_OF_KEY)
+        return date.fromisoformat(row.value) if row and row.value else None
+
+    async def roll(self, today: Optional[date] = None) -> int:
+        """Advance the rollups day by day up to `today`; returns how many (sku, day) groups left a window."""
+        today = today or _today()
+        coll = Setting.get_motor_collection()
+        moved = 0
+        while True:
+            as_of = await self._stored_as_of()
+            self.as_of = as_of
+            if as_of is None or as_of >= today:
+                break
+            nxt = as_of + timedelta(days=1)
+            claim = await coll.update_one(
+                {"key": AS_OF_KEY, "value": as_of.isoformat()}, {"$set": {"value": nxt.isoformat()}},
+            )
+            if not claim.modified_count:
+                continue        # another worker rolled this day
+            self.as_of = nxt
+
+            leaving = {nxt - timedelta(days=w): f for w, f in zip(WINDOWS, FIELDS)}
+            rows = await SalesFact.aggregate([
+                {"$match": {"day": {"$in": [_midnight(d) for d in leaving]}}},
+                {"$group": {"_id": {"sku": "$sku", "day": "$day"}, "units": {"$sum": "$units"}}},
+            ]).to_list()
+            dec: Dict[str, Dict[str, int]] = {}
+            for r in rows:
+                field = leaving[r["_id"]["day"].date()]
+                dec.setdefault(r["_id"]["sku"], {})[field] = -r["units"]
+            if dec:
+                ops = [UpdateOne({"sku": sku}, {"$inc": inc}) for sku, inc in dec.items()]
+                await SalesRollup.get_motor_collection().bulk_write(ops, ordered=False)
+            moved += len(rows)
+
+        await SalesRollup.find(SalesRollup.units_90 <= 0).delete()
+        self.last_roll = {"as_of": self.as_of.isoformat() if self.as_of else None, "groups": moved,
+                          "at": datetime.utcnow().isoformat()}
+        return moved
+
+    # --- full rebuild --------------------------------------------------------
+
+    async def rebuild(self, ctx: Optional[JobContext] = None) -> Dict[str, Any]:
+        """Backfill facts from orders and the sale archive, then recompute every rollup."""
+        started = datetime.utcnow()
+        await self._set_marker(REBUILD_KEY, started.isoformat())
+        try:
+            facts: List[SalesFact] = []
+            for o in await Order.find().project(_OrderFacts).to_list():
+                units: Dict[str, int] = {}
+                for it in o.items:
+                    units[it.sku] = units.get(it.sku, 0) + it.qty
+                facts.extend(
+                    SalesFact(sku=sku, day=o.created_at.date(), units=n, source="order", ref=str(o.id), created_at=started)
+                    for sku, n in units.items()
+                )
+            for s in await SaleArchive.find().project(_SaleFacts).to_list():
+                facts.append(SalesFact(
+                    sku=s.sku, day=s.sold_at.date(), units=1, source="sale", ref=str(s.id), created_at=started,
+                ))
+
+            inserted = 0
+            for start in range(0, len(facts), CHUNK):
+                inserted += len(await _insert_new(facts[start:start + CHUNK]))
+                if ctx is not None:
+                    await ctx.progress(min(start + CHUNK, len(facts)), len(facts), "Backfilling sales facts")
+            del facts
+
+            today = _today()
+            windows = {
+                f: {"$sum": {"$cond": [{"$gt": ["$day", _midnight(today - timedelta(days=w))]}, "$units", 0]}}
+                for w, f in zip(WINDOWS, FIELDS)
+            }
+            rows = await SalesFact.aggregate([
+                # Facts recorded after `started` are added by the second pass below
+                {"$match": {"day": {"$gt": _midnight(today - timedelta(days=max(WINDOWS)))},
+                            "created_at": {"$lte": started}}},
+                {"$group": {"_id": "$sku", **windows}},
+            ]).to_list()
+
+            coll = SalesRollup.get_motor_collection()
+            ops = [UpdateOne({"sku": r["_id"]}, {"$set": {f: r[f] for f in FIELDS}}, upsert=True) for r in rows]
+            if ops:
+                await coll.bulk_write(ops, ordered=False)
+            await coll.delete_many({"sku": {"$nin": [r["_id"] for r in rows]}})
+
+            await self._set_marker(AS_OF_KEY, today.isoformat())
+            self.as_of = today
+        finally:
+            cleared = datetime.utcnow()
+            await self._set_marker(REBUILD_KEY, "")
+
+        # Second pass: facts any worker stored while the marker was up were not bumped
+        late = await SalesFact.aggregate([
+            {"$match": {"created_at": {"$gt": started, "$lte": cleared}}},
+            {"$group": {"_id": {"sku": "$sku", "day": "$day"}, "units": {"$sum": "$units"}}},
+        ]).to_list()
+        by_day: Dict[date, Dict[str, int]] = {}
+        for r in late:
+            by_day.setdefault(r["_id"]["day"].date(), {})[r["_id"]["sku"]] = r["units"]
+        for day, units in by_day.items():
+            await self._bump(units, day)
+
+        result = {"facts_inserted": inserted, "rollups": len(rows), "late_facts": len(late),
+                  "as_of": today.isoformat()}
+        logger.info(f"Sales facts rebuilt: {result}")
+        return result
+
+    async def _retry_backfill(self) -> bool:
+        """Reschedule a first-deploy backfill that never finished; True if this worker did."""
+        active = await Job.find(Job.kind == JOB_KIND, In(Job.status, list(ACTIVE_STATES))).count()
+        if active:
+            return False
+        try:
+            await Setting(key=BACKFILL_RETRY_KEY, value="").insert()
+        except DuplicateKeyError:
+            pass
+        now = datetime.utcnow()
+        claim = await Setting.get_motor_collection().update_one(
+            {"key": BACKFILL_RETRY_KEY, "value": {"$lt": (now - BACKFILL_RETRY_AFTER).isoformat()}},
+            {"$set": {"value": now.isoformat()}},
+        )
+        if not claim.modified_count:
+            return False
+        logger.warning("Sales rollups were never built (backfill failed or its worker died); rescheduling it")
+        await job_runner.submit(JOB_KIND, rebuild_job)
+        return True
+
+    # --- lookups -------------------------------------------------------------
+
+    async def rollups(self) -> Dict[str, SalesRollup]:
+        """Every SKU with sales in the last 90 days (one read of `sales_rollups`)."""
+        return {r.sku: r for r in await SalesRollup.find_all().to_list()}
+
+    # --- background loop -----------------------------------------------------
+
+    async def _loop(self):
+        while True:
+            try:
+                if self.as_of is None or self.as_of < _today():
+                    await self.roll()
+                if self.as_of is None:
+                    await self._retry_backfill()
+            except Exception as e:
+                logger.error(f"Sales rollup roll failed: {e}")
+            await asyncio.sleep(self.check_seconds)
+
+    async def start(self):
+        try:
+            # First deploy: the worker that creates the marker schedules the backfill
+            await Setting(key=AS_OF_KEY, value="").insert()
+            await job_runner.submit(JOB_KIND, rebuild_job)
+        except DuplicateKeyError:
+            self.as_of = await self._stored_as_of()
+        except Exception as e:
+            logger.error(f"Sales facts startup failed: {e}")
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "as_of": self.as_of.isoformat() if self.as_of else None,
+            "windows": list(WINDOWS),
+            "last_roll": self.last_roll,
+        }
+
+
+async def rebuild_job(ctx: JobContext) -> Dict[str, Any]:
+    return await sales_facts.rebuild(ctx)
+
+
+# Singleton
+sales_facts = SalesFacts(check_seconds=settings.SALES_ROLLUP_CHECK_SECONDS)
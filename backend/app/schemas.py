@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from datetime import date, datetime
-from typing import List, Optional
+from typing import List, Literal, Optional
 
 from pydantic import BaseModel, Field
 
@@ -146,6 +146,7 @@ class MetricOut(BaseModel):
     zone_watch: int
     zone_dead: int
     zone_reserved: int
+    zone_sold: int = 0
 
 
 class GoldRateOut(BaseModel):
@@ -252,3 +253,25 @@ class OrderOut(BaseModel):
     created_at: datetime
     customer: Optional[CustomerOut] = None
     items: List[OrderItemOut] = []
+
+
+class BatchSimilarIn(BaseModel):
+    skus: List[str] = Field(..., max_length=200)
+    limit: int = Field(5, ge=1, le=50)
+
+
+class BatchCustomerRecsIn(BaseModel):
+    customer_ids: List[str] = Field(..., max_length=1000)
+    limit: int = Field(10, ge=1, le=50)
+
+
+class EventIn(BaseModel):
+    type: Literal["view", "try_on", "cart_add", "search"]
+    sku: Optional[str] = Field(None, max_length=120)
+    query: Optional[str] = Field(None, max_length=200)
+    session_id: Optional[str] = Field(None, max_length=64)
+    client_ts: Optional[datetime] = None
+
+
+class EventsIn(BaseModel):
+    events: List[EventIn] = Field(..., max_length=100)
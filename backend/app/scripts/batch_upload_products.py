@@ -1,20 +1,41 @@
+"""
+Bulk catalog importer: CSV sheets + product photos -> S3 + MongoDB.
+
+Pipeline:
+    scan CSVs -> chunk rows -> upload stage (bounded concurrency, one upload
+    per unique file) -> bulk Mongo writes per chunk -> checkpoint
+
+The upload stage of chunk N+1 overlaps with the Mongo writes of chunk N.
+A checkpoint file records finished SKUs and already-uploaded files so a
+crashed run resumes where it stopped without re-uploading.
+
+Identical photos share one S3 object across image rows and SKUs; the API's
+delete paths (app/main.py `_unshared_keys`) only remove an object once no
+other ProductImage points at it.
+
+Usage:
+    python app/scripts/batch_upload_products.py --source <dir> [--dry-run]
+"""
+import argparse
 import asyncio
 import csv
+import hashlib
+import json
 import os
 import sys
 import logging
 import mimetypes
 import random
+import shutil
+import time
 from datetime import datetime
 
 # Add the backend directory to sys.path
 backend_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../"))
 sys.path.append(backend_dir)
 
-from app.db import init_db
 from app.models import Product, ProductImage
-from app.s3_service import upload_file_to_s3
-from app.config import get_settings
+from app.zones import stamp_zone
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -23,9 +44,14 @@ logger = logging.getLogger(__name__)
 # Constants
 SOURCE_DIR = r"d:/project/sachin/For ML model only-20251205T190040Z-1-001/For ML model only/files for ML training"
 MAX_PER_CATEGORY = 50
-SIMULATE_Multiple_IMAGES = 3  # Number of images to create per product (1 main + 2 dupes)
+SIMULATE_Multiple_IMAGES = 3  # Image records per product (1 main + 2 gallery), all pointing at one upload
 GOLD_RATE_PER_GRAM = 7200.0   # Approx rate
-MAKING_CHARGES_PERCENT = 0.15 
+MAKING_CHARGES_PERCENT = 0.15
+
+CHUNK_SIZE = 200           # rows per bulk write
+UPLOAD_CONCURRENCY = 8     # parallel S3 uploads
+CHECKPOINT_FILE = os.path.join(backend_dir, ".batch_upload_checkpoint.json")
+DRY_RUN_DIR = os.path.join(backend_dir, "dry_run_uploads")
 
 def clean_sku(filename):
     """Generate a clean SKU from filename."""
@@ -47,87 +73,106 @@ def parse_weight(weight_str):
     except Exception:
         return None
 
-async def process_csv_smart(csv_path, root_dir, global_counts):
-    logger.info(f"Analyzing CSV: {csv_path}")
-    
-    with open(csv_path, 'r', encoding='utf-8-sig') as f:
-        reader = csv.DictReader(f)
-        rows = list(reader)
-        
-    if not rows:
-        return
-
-    # Heuristic to find image directory
-    sample_filename = rows[0].get('Filename')
-    found_image_dir = root_dir
-    
-    if sample_filename:
-        if os.path.exists(os.path.join(root_dir, sample_filename)):
-            found_image_dir = root_dir
-        else:
-            # Check subdirectories
-            try:
-                for d in os.listdir(root_dir):
-                    d_path = os.path.join(root_dir, d)
-                    if os.path.isdir(d_path):
-                        if os.path.exists(os.path.join(d_path, sample_filename)):
-                            found_image_dir = d_path
-                            break
-            except Exception as e:
-                logger.warning(f"Error searching for images in {root_dir}: {e}")
-    
-    logger.info(f"Using image directory: {found_image_dir}")
-    
-    # Process rows
-    for row in rows:
-        filename = row.get('Filename')
-        if not filename:
-            continue
-            
-        sku = clean_sku(filename)
-        
-        # Check existing
-        existing = await Product.find_one(Product.sku == sku)
-        if existing:
-            # Skip if already exists
-            continue
-            
-        # Category limit check
-        category = row.get('Class') or "Uncategorized"
-        category = category.strip()
-        
-        current_count = global_counts.get(category, 0)
-        if current_count >= MAX_PER_CATEGORY:
-            continue
-            
-        # Parse Details
-        weight_str = row.get('Est Weight')
-        weight_g = parse_weight(weight_str)
-        if not weight_g:
-            weight_g = random.uniform(5.0, 15.0) # Fallback random weight if missing
-
-        # Price Calculation
-        price = weight_g * GOLD_RATE_PER_GRAM * (1 + MAKING_CHARGES_PERCENT)
-        price = round(price, 2)
-        
-        metal = row.get('Metal', 'Gold').strip()
-        color = row.get('Color', 'Yellow').strip()
-        main_stone = row.get('Main Stone', '').strip()
-        pattern = row.get('Pattern', '').strip()
-        item_desc = row.get('Visual Description', '').strip()
-        style_era = row.get('Style Era', '').strip()
-        occasion = row.get('Occasion', '').strip()
-        
-        full_name = f"{color} {metal} {category} - {pattern}"
-        if main_stone and main_stone.lower() != "none" and main_stone != "N/A":
-            full_name += f" with {main_stone}"
-            
-        # Clean tags
-        raw_tags = [metal, color, main_stone, pattern, style_era, occasion, category]
-        tags = list(set([t for t in raw_tags if t and t.lower() not in ["none", "n/a"]]))
-        
-        # Create Product
-        product = Product(
+
+# -----------------------
+# Checkpoint
+# -----------------------
+class Checkpoint:
+    def __init__(self, path):
+        self.path = path
+        self.done_skus = set()
+        self.uploaded = {}  # sha256 -> s3 key
+        if path and os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.done_skus = set(data.get("done_skus", []))
+            self.uploaded = data.get("uploaded", {})
+            logger.info(f"Resuming from checkpoint: {len(self.done_skus)} SKUs done, {len(self.uploaded)} files uploaded")
+
+    def save(self):
+        if not self.path:
+            return
+        tmp = self.path + ".tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({"done_skus": sorted(self.done_skus), "uploaded": self.uploaded}, f)
+        os.replace(tmp, self.path)
+
+
+# -----------------------
+# Stand-ins
+# -----------------------
+class S3Uploader:
+    def upload(self, content, mime_type, sku):
+        from app.s3_service import upload_file_to_s3
+        return upload_file_to_s3(content, mime_type, sku)
+
+
+class LocalUploader:
+    """Dry-run stand-in: copies files under DRY_RUN_DIR instead of S3."""
+
+    def __init__(self, root):
+        self.root = root
+
+    def upload(self, content, mime_type, sku):
+        ext = mimetypes.guess_extension(mime_type or "") or ".bin"
+        key = f"products/{sku}/{hashlib.sha256(content).hexdigest()[:16]}{ext}"
+        dest = os.path.join(self.root, key)
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        with open(dest, 'wb') as f:
+            f.write(content)
+        return key
+
+
+# -----------------------
+# Stage 1: scan
+# -----------------------
+def find_image_dir(root_dir, sample_filename):
+    """Heuristic: images live next to the CSV or in one of its subdirectories."""
+    if not sample_filename or os.path.exists(os.path.join(root_dir, sample_filename)):
+        return root_dir
+    try:
+        for d in os.listdir(root_dir):
+            d_path = os.path.join(root_dir, d)
+            if os.path.isdir(d_path) and os.path.exists(os.path.join(d_path, sample_filename)):
+                return d_path
+    except Exception as e:
+        logger.warning(f"Error searching for images in {root_dir}: {e}")
+    return root_dir
+
+
+def build_record(row, image_dir):
+    filename = row.get('Filename')
+    sku = clean_sku(filename)
+    category = (row.get('Class') or "Uncategorized").strip()
+
+    weight_g = parse_weight(row.get('Est Weight'))
+    if not weight_g:
+        weight_g = random.uniform(5.0, 15.0) # Fallback random weight if missing
+
+    # Price Calculation
+    price = round(weight_g * GOLD_RATE_PER_GRAM * (1 + MAKING_CHARGES_PERCENT), 2)
+
+    metal = (row.get('Metal') or 'Gold').strip()
+    color = (row.get('Color') or 'Yellow').strip()
+    main_stone = (row.get('Main Stone') or '').strip()
+    pattern = (row.get('Pattern') or '').strip()
+    item_desc = (row.get('Visual Description') or '').strip()
+    style_era = (row.get('Style Era') or '').strip()
+    occasion = (row.get('Occasion') or '').strip()
+
+    full_name = f"{color} {metal} {category} - {pattern}"
+    if main_stone and main_stone.lower() != "none" and main_stone != "N/A":
+        full_name += f" with {main_stone}"
+
+    # Clean tags
+    raw_tags = [metal, color, main_stone, pattern, style_era, occasion, category]
+    tags = list(set([t for t in raw_tags if t and t.lower() not in ["none", "n/a"]]))
+
+    return {
+        "sku": sku,
+        "category": category,
+        "image_path": os.path.join(image_dir, filename),
+        "fields": dict(
             sku=sku,
             name=full_name,
             description=item_desc,
@@ -138,67 +183,277 @@ async def process_csv_smart(csv_path, root_dir, global_counts):
             qty=1,
             price=price,
             tags=tags,
-            created_at=datetime.utcnow(),
-            updated_at=datetime.utcnow(),
             is_archived=False,
-            options={"metal": metal, "color": color}
+            options={"metal": metal, "color": color},
+        ),
+    }
+
+
+def scan_source(source_dir, checkpoint, max_per_category):
+    """Yield product records from every CSV under source_dir, honouring category caps."""
+    counts = {}
+    seen = set()
+    for root, dirs, files in os.walk(source_dir):
+        for file in sorted(files):
+            if not file.lower().endswith('.csv'):
+                continue
+            csv_path = os.path.join(root, file)
+            logger.info(f"Analyzing CSV: {csv_path}")
+            with open(csv_path, 'r', encoding='utf-8-sig') as f:
+                rows = list(csv.DictReader(f))
+            if not rows:
+                continue
+
+            image_dir = find_image_dir(root, rows[0].get('Filename'))
+            logger.info(f"Using image directory: {image_dir}")
+
+            for row in rows:
+                if not row.get('Filename'):
+                    continue
+                rec = build_record(row, image_dir)
+                if rec["sku"] in seen:
+                    continue
+                seen.add(rec["sku"])
+
+                cat = rec["category"]
+                if counts.get(cat, 0) >= max_per_category:
+                    continue
+                counts[cat] = counts.get(cat, 0) + 1
+
+                if rec["sku"] in checkpoint.done_skus:
+                    continue
+                yield rec
+
+
+def chunked(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# -----------------------
+# Stage 2: uploads
+# -----------------------
+class Stats:
+    def __init__(self):
+        self.started = time.monotonic()
+        self.rows = 0
+        self.skipped = 0
+        self.failed = 0
+        self.uploads = 0
+        self.reused = 0
+        self.bytes = 0
+
+    def line(self):
+        elapsed = max(time.monotonic() - self.started, 1e-6)
+        return (
+            f"rows={self.rows} skipped={self.skipped} failed={self.failed} "
+            f"uploads={self.uploads} reused={self.reused} "
+            f"| {self.rows / elapsed:.1f} rows/s, {self.bytes / elapsed / 1e6:.2f} MB/s"
         )
-        
-        # Image Processing
-        image_path = os.path.join(found_image_dir, filename)
-        
-        if os.path.exists(image_path):
+
+
+def _read_file(path):
+    with open(path, 'rb') as f:
+        content = f.read()
+    return content, hashlib.sha256(content).hexdigest()
+
+
+async def upload_chunk(chunk, uploader, checkpoint, sem, stats, in_flight):
+    """Upload the images of one chunk. Returns [(record, upload_info)] for rows ready to write."""
+
+    async def _one(rec):
+        path = rec["image_path"]
+        if not os.path.exists(path):
+            logger.warning(f"Image missing for {rec['sku']} at {path}")
+            stats.failed += 1
+            return None
+
+        async with sem:
             try:
-                mime_type, _ = mimetypes.guess_type(image_path)
-                if not mime_type: mime_type = "application/octet-stream"
-                
-                with open(image_path, 'rb') as img_f:
-                    content = img_f.read()
-                
-                # Upload multiple times to simulate gallery
-                for i in range(SIMULATE_Multiple_IMAGES):
-                    s3_key = upload_file_to_s3(content, mime_type, sku)
-                    
-                    is_p = (i == 0) # First one is primary
-                    status = "active" # Lowercase matching my previous script, but Model default is "ACTIVE"
-                    
-                    img_doc = ProductImage(
-                        sku=sku,
-                        s3_key=s3_key,
-                        upload_status="ACTIVE",
-                        is_primary=is_p,
-                        content_type=mime_type,
-                        file_size=len(content)
-                    )
-                    await img_doc.insert()
-                    
-                # Increment count only after successful product & image insertion
-                global_counts[category] = global_counts.get(category, 0) + 1
-                await product.insert()
-                # logger.info(f"Imported {sku} ({category})")
-                
+                content, digest = await asyncio.to_thread(_read_file, path)
+                mime_type, _ = mimetypes.guess_type(path)
+                mime_type = mime_type or "application/octet-stream"
+
+                key = checkpoint.uploaded.get(digest)
+                if key:
+                    stats.reused += 1
+                elif digest in in_flight:
+                    # Same bytes being uploaded by another row right now
+                    key = await in_flight[digest]
+                    stats.reused += 1
+                else:
+                    fut = asyncio.get_running_loop().create_future()
+                    in_flight[digest] = fut
+                    try:
+                        key = await asyncio.to_thread(uploader.upload, content, mime_type, rec["sku"])
+                        fut.set_result(key)
+                    except Exception as e:
+                        fut.set_exception(e)
+                        raise
+                    finally:
+                        in_flight.pop(digest, None)
+                    checkpoint.uploaded[digest] = key
+                    stats.uploads += 1
+                    stats.bytes += len(content)
+
+                return rec, {"s3_key": key, "content_type": mime_type, "file_size": len(content), "checksum": digest}
             except Exception as e:
-                logger.error(f"Failed to process image/upload for {sku}: {e}")
-        else:
-             logger.warning(f"Image missing for {sku} at {image_path}")
-
-    logger.info(f"Processed CSV: {csv_path}. Category counts: {global_counts}")
-
-async def main():
-    logger.info("Starting Batch Import (Max 50 per category)...")
-    await init_db()
-    
-    global_counts = {}
-    
-    # Walk through source directory
-    for root, dirs, files in os.walk(SOURCE_DIR):
-        for file in files:
-            if file.lower().endswith('.csv'):
-                csv_path = os.path.join(root, file)
-                await process_csv_smart(csv_path, root, global_counts)
-                
+                logger.error(f"Failed to upload image for {rec['sku']}: {e}")
+                stats.failed += 1
+                return None
+
+    results = await asyncio.gather(*[_one(r) for r in chunk])
+    return [r for r in results if r]
+
+
+# -----------------------
+# Stage 3: bulk writes
+# -----------------------
+async def existing_skus(skus, dry_run):
+    if dry_run or not skus:
+        return set()
+    from beanie.operators import In
+    from pydantic import BaseModel
+
+    class SkuOnly(BaseModel):
+        sku: str
+
+    rows = await Product.find(In(Product.sku, skus)).project(SkuOnly).to_list()
+    return {r.sku for r in rows}
+
+
+async def write_chunk(ready, dry_run, images_per_product):
+    """Bulk insert products + image records. Returns SKUs that were written."""
+    if dry_run:
+        return {rec["sku"] for rec, _ in ready}
+
+    now = datetime.utcnow()
+    products = []
+    images = []
+    for rec, info in ready:
+        p = Product(**rec["fields"], created_at=now, updated_at=now)
+        # New SKUs have no reservations or sale records; the server's zone counts pick them up on resync
+        stamp_zone(p, reserved=False, sold=False)
+        products.append(p)
+        for i in range(images_per_product):
+            images.append(ProductImage(
+                sku=rec["sku"],
+                upload_status="ACTIVE",
+                is_primary=(i == 0),  # First one is primary
+                created_at=now,
+                updated_at=now,
+                **info,
+            ))
+
+    if not products:
+        return set()
+
+    from pymongo.errors import BulkWriteError
+
+    written = {p.sku for p in products}
+    try:
+        await Product.insert_many(products, ordered=False)
+    except BulkWriteError as e:
+        for we in e.details.get("writeErrors", []):
+            written.discard(products[int(we["index"])].sku)
+    images = [img for img in images if img.sku in written]
+    if images:
+        await ProductImage.insert_many(images, ordered=False)
+    return written
+
+
+# -----------------------
+# Driver
+# -----------------------
+async def run_import(source_dir, dry_run=False, checkpoint_path=CHECKPOINT_FILE,
+                     chunk_size=CHUNK_SIZE, concurrency=UPLOAD_CONCURRENCY,
+                     max_per_category=MAX_PER_CATEGORY, images_per_product=SIMULATE_Multiple_IMAGES):
+    mode = "DRY RUN" if dry_run else "LIVE"
+    logger.info(f"Starting Batch Import [{mode}] from {source_dir} (max {max_per_category} per category)...")
+
+    if dry_run:
+        uploader = LocalUploader(DRY_RUN_DIR)
+    else:
+        from app.db import init_db
+        await init_db()
+        uploader = S3Uploader()
+
+    checkpoint = Checkpoint(checkpoint_path)
+    stats = Stats()
+    sem = asyncio.Semaphore(concurrency)
+    in_flight = {}
+
+    # Uploads of chunk N+1 run while chunk N is written
+    ready_q = asyncio.Queue(maxsize=2)
+
+    async def producer():
+        try:
+            for chunk in chunked(scan_source(source_dir, checkpoint, max_per_category), chunk_size):
+                exists = await existing_skus([r["sku"] for r in chunk], dry_run)
+                if exists:
+                    stats.skipped += len(exists)
+                    checkpoint.done_skus.update(exists)
+                    chunk = [r for r in chunk if r["sku"] not in exists]
+                ready = await upload_chunk(chunk, uploader, checkpoint, sem, stats, in_flight)
+                await ready_q.put(ready)
+        finally:
+            await ready_q.put(None)
+
+    async def writer():
+        while True:
+            ready = await ready_q.get()
+            if ready is None:
+                break
+            written = await write_chunk(ready, dry_run, images_per_product)
+            stats.rows += len(written)
+            stats.failed += len(ready) - len(written)
+            checkpoint.done_skus.update(written)
+            checkpoint.save()
+            logger.info(stats.line())
+
+    await asyncio.gather(producer(), writer())
+
     logger.info("Batch Import Complete.")
-    logger.info(f"Final Counts: {global_counts}")
+    logger.info(stats.line())
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pipelined, resumable catalog importer")
+    parser.add_argument("--source", default=SOURCE_DIR, help="Directory tree with CSVs and images")
+    parser.add_argument("--dry-run", action="store_true", help=f"No S3/Mongo: copy files under {DRY_RUN_DIR}")
+    parser.add_argument("--checkpoint", default=CHECKPOINT_FILE, help="Checkpoint file for resuming")
+    parser.add_argument("--fresh", action="store_true", help="Ignore and overwrite an existing checkpoint")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--concurrency", type=int, default=UPLOAD_CONCURRENCY)
+    parser.add_argument("--max-per-category", type=int, default=MAX_PER_CATEGORY)
+    parser.add_argument("--images-per-product", type=int, default=SIMULATE_Multiple_IMAGES)
+    args = parser.parse_args()
+
+    if args.dry_run and args.checkpoint == CHECKPOINT_FILE:
+        # Keep dry runs from marking SKUs done for the live import
+        args.checkpoint = CHECKPOINT_FILE.replace(".json", ".dry_run.json")
+
+    if args.fresh and os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+    if args.dry_run and args.fresh:
+        shutil.rmtree(DRY_RUN_DIR, ignore_errors=True)
+
+    asyncio.run(run_import(
+        args.source,
+        dry_run=args.dry_run,
+        checkpoint_path=args.checkpoint,
+        chunk_size=args.chunk_size,
+        concurrency=args.concurrency,
+        max_per_category=args.max_per_category,
+        images_per_product=args.images_per_product,
+    ))
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    main()
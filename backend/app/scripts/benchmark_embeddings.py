@@ -0,0 +1,208 @@
+"""
+TF-IDF vs Word2Vec-embedding content similarity: quality and latency.
+
+The default catalog is synthetic and seeded. Each product expresses one
+"intent" through one of several synonyms (jhumka / drop earring / chandbali,
+kada / bangle, ...); only half carry intent context words and most have no
+category. A neighbor is counted relevant when it shares the query's intent.
+`synonym_precision@k` repeats the measurement with every item that uses the
+query's own word masked out, i.e. it asks "if nobody else called it a jhumka,
+would we still find the chandbalis?".
+
+Reported per mode:
+    fit_s            full fit time (vectorizer/embedding + neighbor index)
+    precision@k      share of same-intent items in the top-k content neighbors
+    recall@k         same-intent items found / min(k, intent size - 1)
+    synonym_precision@k  precision@k with same-word items masked out
+    index_ms         p50/p99 latency of `similar_skus` (precomputed index)
+    scan_ms          p50/p99 latency of a full content scan for one item
+    knn_ms_per_item  blocked exact k-NN over the whole catalog (embeddings only)
+
+Usage:
+    python app/scripts/benchmark_embeddings.py [--n 5000] [--k 10] [--from-db]
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from types import SimpleNamespace
+
+from typing import Optional, Tuple
+
+import numpy as np
+
+# Add the backend directory to sys.path
+backend_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../"))
+sys.path.append(backend_dir)
+
+from app.neighbor_index import BLOCK_CELLS, top_k_rows
+from app.recommender import MODES, AdvancedRecommender
+
+INTENTS = {
+    "earring": (["jhumka", "drop earring", "chandbali", "dangler earring"], ["ear", "pair", "hook", "hanging", "bells"]),
+    "necklace": (["haar", "necklace", "rani haar", "long chain necklace"], ["neck", "layered", "bridal", "pendant"]),
+    "bangle": (["kada", "bangle", "churi", "broad kada"], ["wrist", "pair", "round", "openable"]),
+    "nose": (["nath", "nose ring", "nose pin", "nathni"], ["nose", "small", "bridal", "hoop"]),
+    "anklet": (["payal", "anklet", "pajeb", "ankle chain"], ["ankle", "pair", "ghungroo", "bells"]),
+    "ring": (["anguthi", "finger ring", "cocktail ring", "band ring"], ["finger", "solitaire", "adjustable", "stone"]),
+}
+STYLES = ["gold", "silver", "antique", "temple", "kundan", "polki", "diamond", "ruby", "emerald",
+          "pearl", "matte", "oxidised", "floral", "peacock", "minimal", "daily", "festive", "filigree"]
+
+
+def knn_search(
+    matrix: np.ndarray,
+    queries: np.ndarray,
+    k: int,
+    exclude: Optional[np.ndarray] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Exact top-k by dot product (cosine for normalised rows), blocked over the
+    queries so the dense score block stays under BLOCK_CELLS.
+    `exclude[i]` is a row of `matrix` to skip for query i (e.g. the item itself).
+    Returns (indices, scores), each shaped (len(queries), k), best first.
+    """
+    n = matrix.shape[0]
+    k = min(k, n)
+    idx = np.empty((len(queries), k), dtype=np.int64)
+    scores = np.empty((len(queries), k), dtype=np.float32)
+    chunk = max(1, BLOCK_CELLS // max(1, n))
+    for start in range(0, len(queries), chunk):
+        block = queries[start:start + chunk] @ matrix.T
+        if exclude is not None:
+            rows = np.arange(block.shape[0])
+            block[rows, exclude[start:start + chunk]] = -np.inf
+        top, top_scores = top_k_rows(block, k)
+        idx[start:start + len(block)] = top
+        scores[start:start + len(block)] = top_scores
+    return idx, scores
+
+
+def synthetic_catalog(n: int, seed: int):
+    r = random.Random(seed)
+    products, labels = [], []
+    names = list(INTENTS)
+    for i in range(n):
+        intent = r.choice(names)
+        synonyms, context = INTENTS[intent]
+        surface = r.choice(synonyms)
+        style = r.sample(STYLES, 2)
+        # Only some listings carry intent context words; the rest are just
+        # "<style> <style> <synonym>", where TF-IDF can only match the exact synonym
+        described = r.random() < 0.5
+        products.append(SimpleNamespace(
+            sku=f"SYN{i:06d}",
+            name=f"{style[0].title()} {style[1].title()} {surface.title()}",
+            category=intent.title() if r.random() < 0.3 else None,
+            subcategory=None,
+            tags=r.sample(STYLES, 2),
+            options=None,
+            description=" ".join(r.sample(context, 3) + r.sample(STYLES, 2)) if described else None,
+            price=r.uniform(5_000, 250_000),
+            weight_g=None,
+            manual_rating=r.uniform(3, 5),
+            qty=r.randint(0, 3),
+        ))
+        labels.append((intent, surface))
+    return products, np.array(labels)
+
+
+async def db_catalog():
+    from app.db import init_db
+    from app.models import Product
+
+    await init_db()
+    products = await Product.find(Product.is_archived == False).to_list()
+    return products, None
+
+
+def _pct(samples, q):
+    return round(float(np.percentile(samples, q)) * 1000, 3)
+
+
+def bench_mode(mode: str, products, labels, k: int, queries: int, seed: int):
+    rec = AdvancedRecommender(mode=mode)
+    t0 = time.perf_counter()
+    rec.fit(products)
+    fit_s = time.perf_counter() - t0
+
+    r = random.Random(seed)
+    q_rows = r.sample(range(len(rec)), min(queries, len(rec)))
+    content = rec.content_matrix
+
+    index_t, scan_t = [], []
+    for i in q_rows:
+        sku = rec.sku_at(i)
+        t = time.perf_counter()
+        rec.similar_skus(sku, k)
+        index_t.append(time.perf_counter() - t)
+        t = time.perf_counter()
+        rec._similar_by_scan(i, k)
+        scan_t.append(time.perf_counter() - t)
+
+    out = {
+        "mode": mode,
+        "fit_s": round(fit_s, 2),
+        "index_ms_p50": _pct(index_t, 50),
+        "index_ms_p99": _pct(index_t, 99),
+        "scan_ms_p50": _pct(scan_t, 50),
+        "scan_ms_p99": _pct(scan_t, 99),
+    }
+
+    # Pure content neighbors (no price/category blending) for the quality numbers
+    q = np.asarray(q_rows)
+    if mode == "embedding":
+        t = time.perf_counter()
+        knn_search(content, content[q], k, exclude=q)
+        out["knn_ms_per_item"] = round((time.perf_counter() - t) / len(q) * 1000, 4)
+    scores = content[q] @ content.T
+    scores = scores.toarray() if hasattr(scores, "toarray") else np.array(scores)
+    scores[np.arange(len(q)), q] = -np.inf
+    top = np.argsort(-scores, axis=1)[:, :k]
+
+    if labels is not None:
+        intents, surfaces = labels[:, 0], labels[:, 1]
+        same = intents[top] == intents[q][:, None]
+        sizes = {name: int((intents == name).sum()) for name in np.unique(intents)}
+        denom = np.array([min(k, sizes[intents[i]] - 1) for i in q])
+        out[f"precision@{k}"] = round(float(same.mean()), 4)
+        out[f"recall@{k}"] = round(float((same.sum(axis=1) / np.maximum(denom, 1)).mean()), 4)
+
+        scores[surfaces[None, :] == surfaces[q][:, None]] = -np.inf
+        syn_top = np.argsort(-scores, axis=1)[:, :k]
+        out[f"synonym_precision@{k}"] = round(float((intents[syn_top] == intents[q][:, None]).mean()), 4)
+    out["_top"] = top
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare TF-IDF and embedding content similarity")
+    parser.add_argument("--n", type=int, default=5000, help="Synthetic catalog size")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--from-db", action="store_true", help="Use the live catalog (no quality labels)")
+    args = parser.parse_args()
+
+    if args.from_db:
+        products, labels = asyncio.run(db_catalog())
+    else:
+        products, labels = synthetic_catalog(args.n, args.seed)
+    print(f"Catalog: {len(products)} products ({'db' if args.from_db else 'synthetic'})")
+
+    results = [bench_mode(m, products, labels, args.k, args.queries, args.seed) for m in MODES]
+    tops = [res.pop("_top") for res in results]
+    overlap = np.mean([len(set(a) & set(b)) / len(a) for a, b in zip(*tops)])
+
+    keys = [key for key in results[0] if key != "mode"]
+    keys += [key for key in results[1] if key not in keys and key != "mode"]
+    print(f"{'metric':<22}" + "".join(f"{res['mode']:>14}" for res in results))
+    for key in keys:
+        print(f"{key:<22}" + "".join(f"{str(res.get(key, '-')):>14}" for res in results))
+    print(f"top-{args.k} overlap between modes: {overlap:.2%}")
+
+
+if __name__ == "__main__":
+    main()
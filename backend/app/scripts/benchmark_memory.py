@@ -0,0 +1,154 @@
+"""
+Recommender memory footprint at several catalog sizes.
+
+For each size a seeded synthetic catalog is fitted and the retained state is
+measured component by component (numpy buffers, sparse matrices, vectorizer
+vocabulary), together with the process peak RSS. `--heap-peak` adds a second,
+traced fit for the Python heap peak (tracemalloc slows `fit` ~10x, so the
+timing comes from the untraced one). The `dict maps` line is what the
+previous layout's sku -> row and row -> sku dicts would cost for the same
+SKUs, for reference.
+
+Usage:
+    python app/scripts/benchmark_memory.py [--sizes 10000,100000,500000] [--mode tfidf] [--heap-peak]
+"""
+import argparse
+import gc
+import json
+import os
+import random
+import resource
+import sys
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+from scipy import sparse
+
+# Add the backend directory to sys.path
+backend_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../"))
+sys.path.append(backend_dir)
+
+from app.recommender import AdvancedRecommender
+
+CATEGORIES = ["Ring", "Chain", "Earring", "Bangle", "Necklace", "Pendant", "Bracelet", "Anklet",
+              "Nose Pin", "Mangalsutra", "Kada", "Choker"]
+WORDS = ["gold", "silver", "floral", "antique", "temple", "kundan", "polki", "diamond", "ruby",
+         "emerald", "pearl", "jhumka", "drop", "stud", "hoop", "twisted", "plain", "matte", "bridal",
+         "daily", "filigree", "peacock", "minimal", "oxidised", "festive", "layered", "openable"]
+
+
+def synthetic_catalog(n: int, seed: int):
+    r = random.Random(seed)
+    for i in range(n):
+        cat = r.choice(CATEGORIES)
+        w = r.sample(WORDS, 4)
+        yield SimpleNamespace(
+            sku=f"RIQ-{i:07d}",
+            name=f"{w[0].title()} {w[1].title()} {cat}",
+            category=cat,
+            subcategory=None,
+            tags=w[2:],
+            options={"metal": r.choice(["22k", "18k", "silver"])},
+            description=" ".join(r.sample(WORDS, 6)),
+            price=r.uniform(5_000, 250_000),
+            weight_g=r.uniform(2, 80),
+            manual_rating=r.uniform(3, 5),
+            qty=r.randint(0, 3),
+        )
+
+
+def _nbytes(obj) -> int:
+    if obj is None:
+        return 0
+    if sparse.issparse(obj):
+        return obj.data.nbytes + obj.indices.nbytes + obj.indptr.nbytes
+    return int(getattr(obj, "nbytes", 0))
+
+
+def _dict_maps_bytes(skus) -> int:
+    """sys.getsizeof of two dicts plus their str/int keys and values (shared strings counted once)."""
+    strs = [str(s) for s in skus]
+    fwd = {s: i for i, s in enumerate(strs)}
+    rev = dict(enumerate(strs))
+    ints = sum(sys.getsizeof(i) for i in range(len(strs)) if i > 256)  # small ints are cached
+    return sys.getsizeof(fwd) + sys.getsizeof(rev) + sum(sys.getsizeof(s) for s in strs) + ints
+
+
+def _rss_mb() -> float:
+    # ru_maxrss is KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _new(mode: str, with_index: bool) -> AdvancedRecommender:
+    rec = AdvancedRecommender(mode=mode)
+    if not with_index:
+        rec.neighbors.build = lambda *a, **k: rec.neighbors  # skip the O(N^2/categories) index
+    return rec
+
+
+def measure(n: int, mode: str, seed: int, with_index: bool, heap_peak: bool):
+    products = list(synthetic_catalog(n, seed))
+    rec = _new(mode, with_index)
+    gc.collect()
+    t0 = time.perf_counter()
+    rec.fit(products)
+    fit_s = time.perf_counter() - t0
+
+    peak = None
+    if heap_peak:
+        traced = _new(mode, with_index)
+        tracemalloc.start()
+        traced.fit(products)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del traced
+    del products
+    gc.collect()
+
+    parts = {
+        "tfidf_matrix": _nbytes(rec.tfidf_matrix),
+        "embeddings": _nbytes(rec.embeddings),
+        "item_arrays": sum(_nbytes(getattr(rec, a)) for a in
+                           ("prices", "price_raw", "popularity_scores", "base_keys", "category_codes")),
+        "sku_index": _nbytes(rec.skus) + _nbytes(rec.sku_order),
+        "neighbor_index": _nbytes(rec.neighbors.idx) + _nbytes(rec.neighbors.score),
+        "vocabulary": sum(sys.getsizeof(k) + 28 for k in rec.tfidf.vocabulary_) + sys.getsizeof(rec.tfidf.vocabulary_),
+    }
+    mb = lambda b: round(b / 2**20, 2)
+    return {
+        "products": n,
+        "mode": mode,
+        "fit_s": round(fit_s, 2),
+        "state_mb": mb(sum(parts.values())),
+        **{f"{k}_mb": mb(v) for k, v in parts.items()},
+        "bytes_per_product": round(sum(parts.values()) / n, 1),
+        "fit_peak_heap_mb": mb(peak) if peak is not None else None,
+        "dict_maps_mb (previous layout)": mb(_dict_maps_bytes(rec.skus)),
+        "max_rss_mb": round(_rss_mb(), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure recommender memory at several catalog sizes")
+    parser.add_argument("--sizes", default="10000,100000,500000")
+    parser.add_argument("--mode", default="tfidf", choices=["tfidf", "embedding"])
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--no-index", action="store_true", help="Skip the neighbor index build (faster at 500k)")
+    parser.add_argument("--heap-peak", action="store_true", help="Also trace the Python heap peak of fit (slow)")
+    parser.add_argument("--json", action="store_true", help="Print one JSON object per size")
+    args = parser.parse_args()
+
+    for n in (int(s) for s in args.sizes.split(",")):
+        res = measure(n, args.mode, args.seed, not args.no_index, args.heap_peak)
+        if args.json:
+            print(json.dumps(res))
+            continue
+        print(f"\n== {n:,} products ({args.mode})")
+        for k, v in res.items():
+            if k not in ("products", "mode"):
+                print(f"  {k:<32}{v}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+"""
+Procurement scoring benchmark: per-product loop vs vectorized columns.
+
+A seeded generator builds an active catalog with stock, prices, purchase
+dates, 30/60 day sales and ratings. The same inputs are scored two ways:
+
+    loop        the previous implementation: Python branching per product and
+                a ProcurementRecommendation for every SKU, then a full sort
+    vectorized  `app.procurement_scoring.score` over arrays, argsort, and
+                only one page (--page rows) materialized
+
+Both must agree on every row; the check compares the full vectorized
+materialization with the loop output, field by field, in ranking order.
+
+Reported per catalog size:
+    loop_s / vectorized_s    median of --repeat runs (inputs already in memory;
+                             the Mongo reads are the same for both and excluded)
+    vectorized_full_s        scoring plus materializing every row (the export)
+    speedup                  loop_s / vectorized_s
+
+Usage:
+    python app/scripts/benchmark_procurement.py [--sizes 10000,100000] [--page 50]
+        [--repeat 5] [--seed 7] [--out results.json]
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+# Add the backend directory to sys.path
+backend_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../"))
+sys.path.append(backend_dir)
+
+from app import procurement_scoring as scoring
+from app.routers.procurement import ProcurementRecommendation
+
+CATEGORIES = ["Ring", "Chain", "Earring", "Bangle", "Necklace", "Pendant", "Anklet", "Nose Pin", "Mangalsutra"]
+
+
+def synthetic_inputs(n: int, r: random.Random, today: date):
+    rows, sales_a, sales_b, ratings, images = [], {}, {}, {}, {}
+    for i in range(n):
+        sku = f"SKU{i:07d}"
+        bought = today - timedelta(days=r.randint(0, 400))
+        rows.append(scoring._ScoreRow(
+            sku=sku,
+            name=f"Item {i}",
+            category=r.choice(CATEGORIES) if r.random() > 0.05 else None,
+            qty=r.choice([0, 0, 1, 1, 1, 2, 3, 5, 8, 20]),
+            price=round(r.uniform(3_000, 250_000), 2) if r.random() > 0.1 else None,
+            purchase_date=bought if r.random() > 0.3 else None,
+            created_at=datetime.combine(bought, datetime.min.time()) + timedelta(hours=r.randint(0, 23)),
+        ))
+        if r.random() < 0.6:
+            sales_a[sku] = r.choice([0, 1, 1, 2, 3, 5, 6, 9, 14])
+            sales_b[sku] = r.choice([0, 0, 1, 2, 4, 7])
+        if r.random() < 0.4:
+            votes = r.randint(1, 8)
+            ratings[sku] = (sum(r.randint(1, 5) for _ in range(votes)), votes)
+        if r.random() < 0.8:
+            images[sku] = f"https://img.example/{sku}.jpg"
+    return rows, sales_a, sales_b, ratings, images
+
+
+def score_loop(products, sales_a, sales_b, ratings, image_map, today: date):
+    """The per-product implementation the vectorized engine replaced."""
+    recommendations = []
+    for p in products:
+        sku = p.sku
+        current_stock = p.qty
+        vol_a = sales_a.get(sku, 0)
+        vol_b = sales_b.get(sku, 0)
+
+        total, rating_count = ratings.get(sku, (0, 0))
+        avg_rating = total / rating_count if rating_count > 0 else 0.0
+
+        interest_multiplier = 1.0
+        if rating_count >= 3:
+            if avg_rating >= 4.5:
+                interest_multiplier = 1.2
+            elif avg_rating < 3.0:
+                interest_multiplier = 0.8
+
+        trend_factor = 1.0
+        if vol_b > 0:
+            growth = (vol_a - vol_b) / vol_b
+            trend_factor = 1.0 + (growth * 0.5)
+        elif vol_a > 0:
+            trend_factor = 1.5
+        trend_factor = max(0.5, min(2.0, trend_factor))
+
+        stockout_multiplier = 1.0
+        if current_stock == 0 and vol_a > 5:
+            stockout_multiplier = 1.2
+
+        raw_forecast = vol_a * trend_factor * stockout_multiplier * interest_multiplier
+        if raw_forecast < 1 and vol_a > 0:
+            raw_forecast = 1
+        forecasted = int(round(raw_forecast))
+
+        base_date = p.purchase_date or p.created_at.date()
+        days_in_stock = (today - base_date).days
+
+        rec_type, rec_color, reason, score = "Monitor", "gray", "Healthy stock level.", 50
+        trend_text = ""
+        if trend_factor > 1.1: trend_text += " (Trending Up)"
+        elif trend_factor < 0.9: trend_text += " (Cooling Down)"
+        if interest_multiplier > 1.0: trend_text += f" [High Rated {avg_rating:.1f}★]"
+        elif interest_multiplier < 1.0: trend_text += f" [Low Rated {avg_rating:.1f}★]"
+
+        if current_stock == 0 and forecasted > 0:
+            rec_type, rec_color, score = "Urgent Restock", "red", 100
+            reason = f"Stockout! Forecast {forecasted} units.{trend_text}"
+        elif current_stock < forecasted:
+            rec_type, rec_color = "Buy", "green"
+            reason = f"Demand ({forecasted}) > Stock ({current_stock}).{trend_text}"
+            score = 80 + min(20, int((forecasted - current_stock) * 2))
+        elif current_stock > (forecasted * 3) and current_stock > 5:
+            rec_type, rec_color, score = "Overstocked", "orange", 40
+            reason = f"Inventory too high ({current_stock} vs {forecasted}).{trend_text}"
+        elif vol_a == 0 and days_in_stock > 90:
+            if avg_rating >= 4.0:
+                rec_type, rec_color, score = "Promote", "blue", 70
+                reason = f"High interest ({avg_rating:.1f}★) but no sales. Pricing issue?{trend_text}"
+            else:
+                rec_type, rec_color, score = "Dead Stock", "black", 10
+                reason = f"No sales. Aged {days_in_stock} days.{trend_text}"
+        elif days_in_stock > 180 and vol_a < 2:
+            rec_type, rec_color, score = "Discount", "yellow", 60
+            reason = f"Aging stock. Consider clearance.{trend_text}"
+        elif interest_multiplier != 1.0:
+            reason = f"Healthy stock. {trend_text}"
+        score = max(0, min(100, score))
+
+        recommendations.append(ProcurementRecommendation(
+            sku=sku,
+            name=p.name,
+            category=p.category or "Uncategorized",
+            current_stock=current_stock,
+            forecasted_demand=forecasted,
+            recommendation=rec_type,
+            recommendation_color=rec_color,
+            reason=reason,
+            days_in_stock=days_in_stock,
+            sales_velocity_30d=float(vol_a),
+            image_url=image_map.get(sku),
+            procurement_score=score,
+            retail_value=p.price * current_stock if p.price else 0.0,
+            avg_rating=round(avg_rating, 1),
+            rating_count=rating_count,
+        ))
+    recommendations.sort(key=lambda x: x.procurement_score, reverse=True)
+    return recommendations
+
+
+def score_vectorized(cols, image_map, page):
+    scores = scoring.score(cols)
+    rank = scores.order if page is None else scores.order[:page]
+    return [ProcurementRecommendation(**row) for row in scoring.rows(scores, rank, image_map)]
+
+
+def _median_s(fn, repeat: int):
+    times = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t)
+    return statistics.median(times)
+
+
+def run(n: int, args) -> dict:
+    r = random.Random(args.seed)
+    today = date(2025, 6, 1)
+    rows, sales_a, sales_b, ratings, images = synthetic_inputs(n, r, today)
+    cols = scoring.Columns(rows, sales_a, sales_b, ratings, today)
+
+    expected = score_loop(rows, sales_a, sales_b, ratings, images, today)
+    got = score_vectorized(cols, images, None)
+    mismatches = sum(a != b for a, b in zip(expected, got)) + abs(len(expected) - len(got))
+
+    loop_s = _median_s(lambda: score_loop(rows, sales_a, sales_b, ratings, images, today), args.repeat)
+    vec_s = _median_s(lambda: score_vectorized(cols, images, args.page), args.repeat)
+    full_s = _median_s(lambda: score_vectorized(cols, images, None), args.repeat)
+    return {
+        "products": n,
+        "page": args.page,
+        "mismatches": mismatches,
+        "loop_s": round(loop_s, 4),
+        "vectorized_s": round(vec_s, 4),
+        "vectorized_full_s": round(full_s, 4),
+        "speedup": round(loop_s / vec_s, 1) if vec_s else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Procurement scoring: per-product loop vs vectorized")
+    parser.add_argument("--sizes", default="10000,100000")
+    parser.add_argument("--page", type=int, default=50, help="Rows materialized by the vectorized path")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--out", help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    results = []
+    for n in (int(s) for s in args.sizes.split(",")):
+        res = run(n, args)
+        results.append(res)
+        print(json.dumps(res))
+
+    if args.out:
+        report = {"created_at": datetime.utcnow().isoformat(), "args": vars(args), "results": results}
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,350 @@
+"""
+Offline recommender benchmark: speed and ranking quality on seeded synthetic data.
+
+A seeded generator builds a jewelry-like catalog plus customers with a hidden
+taste (one or two favourite categories, a few styles, a price band), their
+orders over time and ratings of what they bought. Each customer's last order
+is held out; the recommender, item-item CF and profiles are trained on the
+rest, exactly as the service builds them from Mongo.
+
+Reported per catalog size (each size runs in a fresh process so the peak RSS
+belongs to that size alone):
+    fit_s              content fit + neighbor index
+    collab_fit_s       ItemCF on the training interactions
+    similar_ms         p50/p99 of `similar_skus` (random catalog SKUs)
+    recommend_ms       p50/p99 of `recommend_skus_for_profile`, first call per
+                       customer (preference vector not cached yet)
+    hit_rate@k         held-out customers with a held-out SKU in their top-k
+    ndcg@k             binary-relevance NDCG of the same lists
+    similar_hit_rate@k held-out SKU among the neighbors of the customer's
+                       last training purchase
+    popularity_hit_rate@k  the static popularity list, as a floor
+    edit_ms            p50/p99 of single-product `upsert` / `remove` calls
+    edit_rows_differing  neighbor lists that differ from a fresh build after
+                       the edits, which include a new category grown past the
+                       index K and shrunk back (must be 0)
+    max_rss_mb         process peak RSS
+
+`recommend_for_user` / `get_similar_products` only add the profile load and
+the product rehydration (Mongo round trips) to the SKU-level calls timed here.
+
+Usage:
+    python app/scripts/benchmark_recommender.py [--sizes 1000,10000,100000] [--k 10]
+        [--mode tfidf] [--seed 7] [--no-collab] [--edits 50] [--out results.json]
+"""
+import argparse
+import json
+import math
+import os
+import random
+import resource
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from multiprocessing import get_context
+from types import SimpleNamespace
+
+import numpy as np
+
+# Add the backend directory to sys.path
+backend_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../"))
+sys.path.append(backend_dir)
+
+from app.collab import MIN_STARS, ItemCF
+from app.neighbor_index import NeighborIndex
+from app.profiles import CustomerProfile
+from app.recommender import MODES, AdvancedRecommender
+
+CATEGORIES = {
+    # category: (subcategories, price range INR)
+    "Ring": (["Cocktail Ring", "Band", "Solitaire"], (8_000, 120_000)),
+    "Chain": (["Rope Chain", "Box Chain"], (15_000, 180_000)),
+    "Earring": (["Jhumka", "Stud", "Chandbali", "Hoop"], (6_000, 90_000)),
+    "Bangle": (["Kada", "Churi"], (20_000, 250_000)),
+    "Necklace": (["Rani Haar", "Choker", "Layered"], (40_000, 400_000)),
+    "Pendant": (["Locket", "Solitaire Pendant"], (7_000, 80_000)),
+    "Anklet": (["Payal", "Pajeb"], (5_000, 40_000)),
+    "Nose Pin": (["Nath", "Nose Ring"], (3_000, 30_000)),
+    "Mangalsutra": (["Short", "Long"], (25_000, 200_000)),
+}
+STYLES = ["antique", "temple", "kundan", "polki", "diamond", "ruby", "emerald", "pearl", "matte",
+          "oxidised", "floral", "peacock", "minimal", "filigree", "bridal", "daily", "festive"]
+METALS = ["22k gold", "18k gold", "silver", "rose gold"]
+DESCRIPTIONS = ["handcrafted", "lightweight", "statement", "heirloom", "everyday", "gift", "hallmarked"]
+
+# Share of a customer's picks that follow their taste (the rest are random)
+TASTE_FOLLOW = 0.8
+START = datetime(2024, 1, 1)
+
+
+def synthetic_catalog(n: int, r: random.Random):
+    products = []
+    cats = list(CATEGORIES)
+    for i in range(n):
+        cat = r.choice(cats)
+        subs, (lo, hi) = CATEGORIES[cat]
+        sub = r.choice(subs)
+        styles = r.sample(STYLES, 2)
+        metal = r.choice(METALS)
+        products.append(SimpleNamespace(
+            sku=f"RIQ-{i:07d}",
+            name=f"{styles[0].title()} {sub} {r.randint(1, 999)}",
+            category=cat,
+            subcategory=sub,
+            tags=styles,
+            options={"metal": metal},
+            description=f"{r.choice(DESCRIPTIONS)} {styles[1]} {metal} {sub.lower()}",
+            price=round(math.exp(r.uniform(math.log(lo), math.log(hi))), -2),
+            weight_g=round(r.uniform(1.5, 90), 2),
+            manual_rating=round(r.uniform(2.5, 5), 1),
+            qty=r.randint(0, 4),
+        ))
+    return products
+
+
+def synthetic_history(products, n_customers: int, r: random.Random):
+    """Orders [(customer, at, [(sku, price)])] and ratings [(customer, sku, stars)] of tasteful customers."""
+    by_cat_style = {}
+    for p in products:
+        for s in p.tags:
+            by_cat_style.setdefault((p.category, s), []).append(p)
+    cats = list(CATEGORIES)
+
+    orders, ratings = [], []
+    for c in range(n_customers):
+        user = f"cust-{c:06d}"
+        fav_cats = r.sample(cats, r.choice([1, 2]))
+        fav_styles = r.sample(STYLES, 3)
+        pools = [by_cat_style[k] for k in ((fc, fs) for fc in fav_cats for fs in fav_styles) if k in by_cat_style]
+        budget = r.choice([0.5, 1.0, 2.0])   # price band relative to the pool median
+        at = START + timedelta(hours=r.uniform(0, 24 * 90))
+        for _ in range(r.randint(1, 6)):
+            items = []
+            for _ in range(r.choice([1, 1, 1, 2, 3])):
+                if pools and r.random() < TASTE_FOLLOW:
+                    pool = r.choice(pools)
+                    cand = r.sample(pool, min(5, len(pool)))
+                    # Prefer the candidate closest to the customer's price band
+                    ref = budget * sorted(p.price for p in cand)[len(cand) // 2]
+                    p = min(cand, key=lambda p: abs(math.log(p.price / ref)))
+                else:
+                    p = r.choice(products)
+                items.append((p.sku, p.price))
+            orders.append((user, at, items))
+            for sku, _ in items:
+                if r.random() < 0.3:
+                    ratings.append((user, sku, r.choice([3, 4, 4, 5, 5, 5]), at + timedelta(days=3)))
+            at += timedelta(days=r.uniform(3, 60))
+    return orders, ratings
+
+
+def split_last_order(orders, ratings):
+    """Training orders/ratings and {customer: held-out SKUs} (each customer's last order)."""
+    last = {}
+    for user, at, items in orders:
+        if user not in last or at > last[user][0]:
+            last[user] = (at, items)
+    train, heldout = [], {}
+    for user, at, items in orders:
+        if last[user][0] == at:
+            heldout[user] = {sku for sku, _ in items}
+        else:
+            train.append((user, at, items))
+    cutoff = {u: at for u, (at, _) in last.items()}
+    train_ratings = [(u, sku, stars) for u, sku, stars, at in ratings if at < cutoff[u]]
+    return train, train_ratings, heldout
+
+
+def _percentiles_ms(samples):
+    if not samples:
+        return {"p50": None, "p99": None}
+    a = np.asarray(samples) * 1000
+    return {"p50": round(float(np.percentile(a, 50)), 3), "p99": round(float(np.percentile(a, 99)), 3)}
+
+
+def _ndcg(ranked, relevant, k):
+    dcg = sum(1 / math.log2(i + 2) for i, sku in enumerate(ranked[:k]) if sku in relevant)
+    ideal = sum(1 / math.log2(i + 2) for i in range(min(k, len(relevant))))
+    return dcg / ideal if ideal else 0.0
+
+
+def incremental_check(rec: AdvancedRecommender, n_edits: int, r: random.Random):
+    """
+    Single-product edits as the service applies them, then every neighbor
+    list compared with a fresh build over the edited arrays. A new category
+    is grown one product at a time to K + 1 members (its rows switch from
+    whole-catalog to own-category candidates), shrunk back by a removal and
+    grown again by moving an existing product into it.
+    Returns (edit seconds, rows whose neighbor scores differ).
+    """
+    times = []
+
+    def timed(fn, arg):
+        t = time.perf_counter()
+        fn(arg)
+        times.append(time.perf_counter() - t)
+
+    k = rec.neighbors.k
+    fresh = synthetic_catalog(k + 1, r)
+    for i, p in enumerate(fresh):
+        p.sku, p.category = f"NEW-{i:07d}", "Brooch"
+        timed(rec.upsert, p)
+    timed(rec.remove, fresh[0].sku)
+
+    moved = SimpleNamespace(**vars(synthetic_catalog(1, r)[0]))
+    moved.sku, moved.category = rec.sku_at(r.randrange(len(rec))), "Brooch"
+    timed(rec.upsert, moved)
+
+    for _ in range(n_edits):
+        if r.random() < 0.3:
+            timed(rec.remove, rec.sku_at(r.randrange(len(rec))))
+        else:
+            p = synthetic_catalog(1, r)[0]
+            p.sku = rec.sku_at(r.randrange(len(rec)))
+            timed(rec.upsert, p)
+
+    full = NeighborIndex(k=k, content_weight=rec.neighbors.content_weight, price_weight=rec.neighbors.price_weight)
+    full.build(rec.content_matrix, rec.prices, [rec.category_names[c] for c in rec.category_codes])
+    # Compare scores, not ids: equal scores may be listed in either order
+    differing = int(np.count_nonzero(~np.isclose(rec.neighbors.score, full.score, atol=1e-5).all(axis=1)))
+    return times, differing
+
+
+def _rss_mb() -> float:
+    # ru_maxrss is KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run(n: int, args) -> dict:
+    r = random.Random(args.seed)
+    t = time.perf_counter()
+    products = synthetic_catalog(n, r)
+    orders, ratings = synthetic_history(products, max(200, n // 5), r)
+    train, train_ratings, heldout = split_last_order(orders, ratings)
+    gen_s = time.perf_counter() - t
+
+    rec = AdvancedRecommender(mode=args.mode)
+    t = time.perf_counter()
+    rec.fit(products)
+    fit_s = time.perf_counter() - t
+    del products
+
+    collab_fit_s = None
+    if not args.no_collab:
+        pairs = [(u, sku) for u, _, items in train for sku, _ in items]
+        pairs += [(u, sku) for u, sku, stars in train_ratings if stars >= MIN_STARS]
+        t = time.perf_counter()
+        rec.collab = ItemCF().fit(pairs)
+        collab_fit_s = time.perf_counter() - t
+
+    profiles, last_bought = {}, {}
+    for user, at, items in sorted(train, key=lambda o: o[1]):
+        profiles.setdefault(user, CustomerProfile()).add_order(items)
+        last_bought[user] = items[-1][0]
+    for user, sku, stars in train_ratings:
+        profiles.setdefault(user, CustomerProfile()).add_rating(sku, stars)
+
+    # Latency: similar_skus on random SKUs
+    q = random.Random(args.seed + 1)
+    similar_times = []
+    for i in q.sample(range(len(rec)), min(args.queries, len(rec))):
+        sku = rec.sku_at(i)
+        t = time.perf_counter()
+        rec.similar_skus(sku, args.k)
+        similar_times.append(time.perf_counter() - t)
+
+    # Quality (and recommend latency) on customers with training history
+    k = args.k
+    users = sorted(u for u in heldout if u in profiles)
+    users = q.sample(users, min(args.eval_users, len(users)))
+    popular = set(rec.trending_skus(k))
+    recommend_times = []
+    hits = ndcg = sim_hits = pop_hits = 0.0
+    for user in users:
+        relevant = heldout[user] - profiles[user].liked
+        t = time.perf_counter()
+        ranked = rec.recommend_skus_for_profile(profiles[user], k)
+        recommend_times.append(time.perf_counter() - t)
+        if not relevant:
+            continue
+        hits += bool(relevant & set(ranked[:k]))
+        ndcg += _ndcg(ranked, relevant, k)
+        sim_hits += bool(relevant & set(rec.similar_skus(last_bought[user], k)))
+        pop_hits += bool(relevant & popular)
+    evaluated = sum(1 for u in users if heldout[u] - profiles[u].liked)
+    rate = lambda x: round(x / evaluated, 4) if evaluated else None
+
+    # Last: the edits change the catalog the numbers above were measured on
+    edit_times, edit_differing = incremental_check(rec, args.edits, random.Random(args.seed + 2))
+
+    return {
+        "products": len(rec),
+        "customers": len(set(u for u, _, _ in orders)),
+        "orders": len(orders),
+        "ratings": len(ratings),
+        "mode": args.mode,
+        "collab": not args.no_collab,
+        "k": k,
+        "generate_s": round(gen_s, 3),
+        "fit_s": round(fit_s, 3),
+        "collab_fit_s": round(collab_fit_s, 3) if collab_fit_s is not None else None,
+        "similar_ms": _percentiles_ms(similar_times),
+        "recommend_ms": _percentiles_ms(recommend_times),
+        "evaluated_customers": evaluated,
+        f"hit_rate@{k}": rate(hits),
+        f"ndcg@{k}": rate(ndcg),
+        f"similar_hit_rate@{k}": rate(sim_hits),
+        f"popularity_hit_rate@{k}": rate(pop_hits),
+        "edit_ms": _percentiles_ms(edit_times),
+        "edit_rows_differing": edit_differing,
+        "max_rss_mb": round(_rss_mb(), 1),
+    }
+
+
+def _git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=backend_dir,
+                             capture_output=True, text=True, timeout=5)
+        return out.stdout.strip() or None
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline recommender speed and quality benchmark")
+    parser.add_argument("--sizes", default="1000,10000,100000")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--mode", default="tfidf", choices=list(MODES))
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--queries", type=int, default=500, help="similar_skus calls timed per size")
+    parser.add_argument("--eval-users", type=int, default=2000, help="Held-out customers scored per size")
+    parser.add_argument("--no-collab", action="store_true", help="Content and price only (no ItemCF)")
+    parser.add_argument("--edits", type=int, default=50, help="Random upserts / removes in the incremental check")
+    parser.add_argument("--out", help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    results = []
+    ctx = get_context("spawn")
+    for n in (int(s) for s in args.sizes.split(",")):
+        # A fresh process per size keeps max_rss_mb per size
+        with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+            res = pool.submit(run, n, args).result()
+        results.append(res)
+        print(json.dumps(res))
+
+    if args.out:
+        report = {
+            "created_at": datetime.utcnow().isoformat(),
+            "commit": _git_commit(),
+            "args": vars(args),
+            "results": results,
+        }
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -28,7 +28,7 @@ async def test_advanced_recommender():
     print(f"\n--- Testing Similar Products for {sku} ({products[0].name}) ---")
     print(f"Base Attributes: {products[0].category}, {products[0].tags}, Price: {products[0].price}")
     
-    sims = adv_rec.get_similar_products(sku, top_n=3)
+    sims = await adv_rec.get_similar_products(sku, top_n=3)
     for s in sims:
         print(f" -> {s.sku}: {s.name} (Price: {s.price})")
         
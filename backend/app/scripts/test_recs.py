@@ -25,7 +25,7 @@ async def test_recommender():
     sku = products[0].sku
     print(f"Testing recommendations for {sku} ({products[0].name})...")
     
-    sims = recommender.get_similar_products(sku, top_n=3)
+    sims = await recommender.get_similar_products(sku, top_n=3)
     print("Similar Items:")
     for s in sims:
         print(f" - {s.sku}: {s.name}")
@@ -0,0 +1,90 @@
+"""
+SKU <-> row lookups without a Python object per SKU.
+
+The row-aligned SKU array (fixed-width unicode) plus an int32 argsort is all
+the state: a lookup is one `np.searchsorted(..., sorter=order)`, and both
+arrays can be memory-mapped straight from the recommender artifacts. The two
+dicts it replaces held ~75 MB of Python objects at 500k SKUs; this is the
+array itself plus 4 bytes per SKU (~23 MB for 11-character SKUs).
+"""
+
+from __future__ import annotations
+
+from typing import Iterable, List, Optional
+
+import numpy as np
+
+
+class SkuIndex:
+    def __init__(self, skus: Optional[np.ndarray] = None, order: Optional[np.ndarray] = None):
+        self.skus = np.asarray(skus if skus is not None else np.empty(0, dtype="<U1"))
+        if self.skus.dtype.kind != "U":
+            self.skus = self.skus.astype(str)
+        if order is None:
+            order = np.argsort(self.skus, kind="stable").astype(np.int32)
+        self.order = order
+
+    def __len__(self) -> int:
+        return len(self.skus)
+
+    def _position(self, sku: str) -> int:
+        return int(np.searchsorted(self.skus, sku, sorter=self.order))
+
+    def get(self, sku: str, default: Optional[int] = None) -> Optional[int]:
+        pos = self._position(sku)
+        if pos < len(self.order):
+            row = int(self.order[pos])
+            if self.skus[row] == sku:
+                return row
+        return default
+
+    def __contains__(self, sku) -> bool:
+        return isinstance(sku, str) and self.get(sku) is not None
+
+    def __getitem__(self, sku: str) -> int:
+        row = self.get(sku)
+        if row is None:
+            raise KeyError(sku)
+        return row
+
+    def rows(self, skus: Iterable[str]) -> np.ndarray:
+        """Vectorised lookup: the row of each SKU, -1 where unknown."""
+        wanted = np.asarray(list(skus), dtype=str)
+        if not len(wanted) or not len(self):
+            return np.full(len(wanted), -1, dtype=np.int64)
+        pos = np.minimum(np.searchsorted(self.skus, wanted, sorter=self.order), len(self.order) - 1)
+        rows = self.order[pos].astype(np.int64)
+        return np.where(self.skus[rows] == wanted, rows, -1)
+
+    def sku(self, row: int) -> str:
+        return str(self.skus[row])
+
+    def many(self, rows) -> List[str]:
+        return self.skus[np.asarray(rows, dtype=np.int64)].tolist()
+
+    # --- mutation (single-product edits) -------------------------------------
+
+    def _writable(self):
+        # Loaded artifacts are read-only memory maps; copy on first write
+        if not self.skus.flags.writeable:
+            self.skus = np.array(self.skus)
+        if not self.order.flags.writeable:
+            self.order = np.array(self.order)
+
+    def append(self, sku: str) -> int:
+        row = len(self.skus)
+        pos = self._position(sku)
+        self.skus = np.append(self.skus, sku)
+        self.order = np.insert(self.order, pos, row).astype(np.int32)
+        return row
+
+    def swap_remove(self, row: int):
+        """Drop `row`; the last row moves into its slot (matching the other row arrays)."""
+        self._writable()
+        last = len(self.skus) - 1
+        pos_removed = self._position(self.skus[row])
+        if row != last:
+            self.order[self._position(self.skus[last])] = row
+            self.skus[row] = self.skus[last]
+        self.order = np.delete(self.order, pos_removed)
+        self.skus = self.skus[:-1]
@@ -0,0 +1,239 @@
+"""
+Time-decayed trending counters.
+
+Every order, sale, reservation and rating adds a weighted event to its SKU.
+Scores use forward decay: an event at time t adds w * 2^((t - L) / half_life)
+for a fixed landmark L. Dividing by 2^((now - L) / half_life) gives the usual
+exponentially decayed count, but the ranking never changes with `now`, so old
+counters need no touching and only the event's own SKU is updated. The
+landmark moves forward (rescaling every counter once) before the exponent
+grows large enough to lose float precision.
+
+Top-k reads use a max-heap with lazy deletion: every update pushes a new
+(score, sku) entry and an entry is stale once its score no longer matches the
+counter. A read pops until it has k current entries and pushes them back, so
+it costs O((k + stale) log N). The heap is compacted when stale entries
+outnumber live ones. One extra heap per category serves per-category lists.
+
+State is rebuilt from the last snapshot plus the events recorded after it
+(orders, ratings, reservations, sales), and snapshots are written back
+periodically, so a restart replays hours of events instead of months.
+"""
+
+from __future__ import annotations
+
+import heapq
+import logging
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+from pydantic import BaseModel
+
+from app.models import Order, Rating, Reservation, SaleArchive, TrendingSnapshot
+
+logger = logging.getLogger(__name__)
+
+# Event weights by kind; ratings are scaled by stars / 5
+EVENT_WEIGHTS = {
+    "order": 3.0,
+    "sale": 3.0,
+    "reservation": 2.0,
+    "rating": 1.0,
+}
+# Move the landmark once counters have grown by 2^REBASE_AT
+REBASE_AT = 64.0
+# Without a snapshot, replay this many half-lives of history (older events weigh < 0.1%)
+REPLAY_HALF_LIVES = 10
+# Counters decayed below this are dropped on rebuild
+MIN_SCORE = 1e-3
+SNAPSHOT_ID = "global"
+
+
+class _SkuItem(BaseModel):
+    sku: str
+
+
+class _OrderEvent(BaseModel):
+    created_at: datetime
+    items: List[_SkuItem] = []
+
+
+class _RatingEvent(BaseModel):
+    sku: str
+    stars: int
+    created_at: datetime
+
+
+class _ReservationEvent(BaseModel):
+    sku: str
+    qty: int = 1
+    created_at: datetime
+
+
+class _SaleEvent(BaseModel):
+    sku: str
+    sold_at: datetime
+
+
+class TrendingEngine:
+    def __init__(self, half_life_hours: float = 72.0):
+        self.half_life = half_life_hours * 3600.0
+        self.landmark = datetime.utcnow()
+        self.scores: Dict[str, float] = {}
+        self.category_of: Callable[[str], Optional[str]] = lambda sku: None
+        self._category: Dict[str, str] = {}     # category each SKU was last pushed under
+        self._heap: List[Tuple[float, str]] = []
+        self._cat_heaps: Dict[str, List[Tuple[float, str]]] = {}
+        self.as_of: Optional[datetime] = None   # events up to here are in `scores`
+        self.events = 0
+        # Live events that arrive while `rebuild` is reading Mongo
+        self._pending: Optional[List[Tuple[str, str, datetime, float]]] = None
+        # (landmark, scores, as_of) from Mongo alone, i.e. what a snapshot may hold
+        self._persisted: Optional[Tuple[datetime, Dict[str, float], datetime]] = None
+
+    def __len__(self) -> int:
+        return len(self.scores)
+
+    # --- updates -------------------------------------------------------------
+
+    def _exponent(self, at: datetime) -> float:
+        return (at - self.landmark).total_seconds() / self.half_life
+
+    def add(self, sku: str, kind: str, at: Optional[datetime] = None, weight: float = 1.0):
+        at = at or datetime.utcnow()
+        if self._pending is not None:
+            self._pending.append((sku, kind, at, weight))
+        if self._exponent(at) > REBASE_AT:
+            self._rebase(at)
+        s = self.scores.get(sku, 0.0) + EVENT_WEIGHTS.get(kind, 1.0) * weight * 2.0 ** self._exponent(at)
+        self.scores[sku] = s
+        self.events += 1
+        heapq.heappush(self._heap, (-s, sku))
+        cat = self.category_of(sku)
+        if cat is not None:
+            self._category[sku] = cat
+            heapq.heappush(self._cat_heaps.setdefault(cat, []), (-s, sku))
+        if len(self._heap) > 2 * len(self.scores) + 1024:
+            self._rebuild_heaps()
+
+    def _rebase(self, at: datetime):
+        factor = 2.0 ** -self._exponent(at)
+        self.scores = {sku: s * factor for sku, s in self.scores.items()}
+        self.landmark = at
+        self._rebuild_heaps()
+
+    def _rebuild_heaps(self):
+        self._heap = [(-s, sku) for sku, s in self.scores.items()]
+        heapq.heapify(self._heap)
+        self._cat_heaps = {}
+        self._category = {}
+        for sku, s in self.scores.items():
+            cat = self.category_of(sku)
+            if cat is not None:
+                self._category[sku] = cat
+                self._cat_heaps.setdefault(cat, []).append((-s, sku))
+        for heap in self._cat_heaps.values():
+            heapq.heapify(heap)
+
+    def set_category_source(self, category_of: Callable[[str], Optional[str]]):
+        """Map SKUs to categories (the live model); re-buckets the per-category heaps."""
+        self.category_of = category_of
+        self._rebuild_heaps()
+
+    # --- reads ---------------------------------------------------------------
+
+    def score(self, sku: str, now: Optional[datetime] = None) -> float:
+        """Decayed event count of `sku` as of `now`."""
+        return self.scores.get(sku, 0.0) * 2.0 ** -self._exponent(now or datetime.utcnow())
+
+    def top(self, k: int, category: Optional[str] = None, alive: Optional[Callable[[str], bool]] = None) -> List[str]:
+        """The k hottest SKUs (optionally within one category), skipping SKUs `alive` rejects."""
+        heap = self._heap if category is None else self._cat_heaps.get(category)
+        if not heap or k <= 0:
+            return []
+        out: List[str] = []
+        keep: List[Tuple[float, str]] = []
+        while heap and len(out) < k:
+            entry = heapq.heappop(heap)
+            neg, sku = entry
+            if self.scores.get(sku) != -neg:
+                continue                                   # superseded by a later update
+            if category is not None and self._category.get(sku) != category:
+                continue                                   # moved to another category
+            keep.append(entry)
+            if alive is None or alive(sku):
+                out.append(sku)
+        for entry in keep:
+            heapq.heappush(heap, entry)
+        return out
+
+    # --- persistence ---------------------------------------------------------
+
+    async def rebuild(self) -> int:
+        """Replace the state with the latest snapshot plus every event recorded after it."""
+        fresh = TrendingEngine(self.half_life / 3600.0)
+        fresh.category_of = self.category_of
+        self._pending = []
+        try:
+            snap = await TrendingSnapshot.find_one(TrendingSnapshot.id == SNAPSHOT_ID)
+            now = datetime.utcnow()
+            if snap and snap.half_life_hours == self.half_life / 3600.0:
+                fresh.landmark = snap.landmark
+                floor = MIN_SCORE * 2.0 ** fresh._exponent(now)
+                fresh.scores = {sku: s for sku, s in zip(snap.skus, snap.scores) if s >= floor}
+                since = snap.as_of
+            else:
+                since = now - timedelta(seconds=self.half_life * REPLAY_HALF_LIVES)
+
+            for sku, kind, at, weight in sorted(await _events_between(since, now), key=lambda e: e[2]):
+                fresh.add(sku, kind, at, weight)
+            # Live events below are already in Mongo with a later timestamp than `now`;
+            # a snapshot must not contain them or the next rebuild counts them twice
+            fresh._persisted = (fresh.landmark, dict(fresh.scores), now)
+            for sku, kind, at, weight in self._pending:
+                if at > now:
+                    fresh.add(sku, kind, at, weight)
+        finally:
+            self._pending = None
+        fresh.as_of = now
+        fresh._rebuild_heaps()
+
+        self.landmark, self.scores, self.as_of = fresh.landmark, fresh.scores, fresh.as_of
+        self._heap, self._cat_heaps, self._category = fresh._heap, fresh._cat_heaps, fresh._category
+        self.events = fresh.events
+        self._persisted = fresh._persisted
+        return fresh.events
+
+    async def save_snapshot(self) -> bool:
+        """Persist the state of the last `rebuild` (without later live events)."""
+        if self._persisted is None:
+            return False
+        landmark, scores, as_of = self._persisted
+        snap = TrendingSnapshot(
+            id=SNAPSHOT_ID,
+            landmark=landmark,
+            as_of=as_of,
+            half_life_hours=self.half_life / 3600.0,
+            skus=list(scores),
+            scores=list(scores.values()),
+        )
+        await snap.save()
+        return True
+
+
+async def _events_between(start: datetime, end: datetime) -> List[Tuple[str, str, datetime, float]]:
+    """(sku, kind, at, weight) for every trending event in (start, end], via projected scans."""
+    events: List[Tuple[str, str, datetime, float]] = []
+    orders = Order.find(Order.created_at > start, Order.created_at <= end)
+    for o in await orders.project(_OrderEvent).to_list():
+        events.extend((it.sku, "order", o.created_at, 1.0) for it in o.items)
+    ratings = Rating.find(Rating.created_at > start, Rating.created_at <= end)
+    for r in await ratings.project(_RatingEvent).to_list():
+        events.append((r.sku, "rating", r.created_at, r.stars / 5.0))
+    reservations = Reservation.find(Reservation.created_at > start, Reservation.created_at <= end)
+    for r in await reservations.project(_ReservationEvent).to_list():
+        events.append((r.sku, "reservation", r.created_at, float(max(r.qty, 1))))
+    sales = SaleArchive.find(SaleArchive.sold_at > start, SaleArchive.sold_at <= end)
+    for s in await sales.project(_SaleEvent).to_list():
+        events.append((s.sku, "sale", s.sold_at, 1.0))
+    return events
@@ -0,0 +1,360 @@
+"""
+Vault status zones (Fresh / Watch / Dead / Reserved / Sold) and their counts.
+
+A product is Sold when its qty is 0 and it is in the sale archive, Reserved
+when it has a reservation (or the legacy reserved_name / reserved_phone pair),
+and otherwise Fresh, Watch or Dead by days in stock (<= 90, <= 180, older),
+counted from purchase_date or else the creation date.
+
+The zone is persisted on the product (`status_zone`, `zone_changed_at`) so it
+can be filtered and sorted on server-side. Write paths go through
+`save_with_zone`; aging is a scheduled sweep of two indexed range queries on
+the base date that move only the products that crossed a threshold.
+
+`ZoneCounter` keeps the dashboard counts in memory so `/dashboard/metrics`
+does not touch the products at all:
+
+  * `rebuild` reads the active products in one projected scan plus the
+    distinct reserved and sold SKUs, and classifies them with vectorized
+    NumPy (no per-product queries). Stored zones that disagree (never set,
+    bulk imports, missed writes) are corrected in the same pass.
+  * Product writes in this worker call `upsert` / `remove`, which move one
+    SKU between zones.
+  * Aging needs no per-product work: unheld products are also counted per
+    base day, so when the date advances the sweep moves just the days that
+    crossed the 90 and 180 day thresholds.
+
+Other workers' writes and the offline import script (which stamps zones but
+cannot reach a server's counters) are picked up by the periodic resync.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from collections import Counter
+from datetime import date, datetime, time, timedelta
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+from pydantic import BaseModel
+
+from app.config import get_settings
+from app.models import Product, Reservation, SaleArchive
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+ZONES = ("Fresh", "Watch", "Dead", "Reserved", "Sold")
+FRESH, WATCH, DEAD, RESERVED, SOLD = range(len(ZONES))
+# Inclusive upper bounds (days in stock) of Fresh and Watch
+FRESH_DAYS = 90
+WATCH_DAYS = 180
+# SKUs per $in when correcting stored zones
+FIX_CHUNK = 5000
+
+
+def zone_for(qty: int, sold: bool, reserved: bool, days_in_stock: int) -> str:
+    if qty == 0 and sold:
+        return "Sold"
+    if reserved:
+        return "Reserved"
+    if days_in_stock <= FRESH_DAYS:
+        return "Fresh"
+    if days_in_stock <= WATCH_DAYS:
+        return "Watch"
+    return "Dead"
+
+
+def zone_codes(qty: np.ndarray, sold: np.ndarray, reserved: np.ndarray, days: np.ndarray) -> np.ndarray:
+    """`zone_for` over whole arrays, as indexes into ZONES."""
+    return np.select(
+        [(qty == 0) & sold, reserved, days <= FRESH_DAYS, days <= WATCH_DAYS],
+        [SOLD, RESERVED, FRESH, WATCH],
+        default=DEAD,
+    )
+
+
+def base_date(p) -> date:
+    return p.purchase_date or p.created_at.date()
+
+
+def _manual_hold(p) -> bool:
+    return bool(p.reserved_name and p.reserved_phone)
+
+
+def stamp_zone(p: Product, reserved: bool, sold: bool) -> str:
+    """Set `p.status_zone` from its current fields (and `zone_changed_at` if it moved); the caller saves."""
+    zone = zone_for(p.qty, sold, reserved or _manual_hold(p), (date.today() - base_date(p)).days)
+    if p.status_zone != zone:
+        p.status_zone = zone
+        p.zone_changed_at = datetime.utcnow()
+    return zone
+
+
+async def zone_flags(p: Product) -> Tuple[bool, bool]:
+    """(has reservations, is in the sale archive) - the sale check only matters at qty 0."""
+    reserved = await Reservation.find(Reservation.sku == p.sku).count() > 0
+    sold = p.qty == 0 and await SaleArchive.find_one(SaleArchive.sku == p.sku) is not None
+    return reserved, sold
+
+
+async def save_with_zone(p: Product, insert: bool = False) -> str:
+    """Persist `p` with its zone re-derived and re-file it in this worker's counters."""
+    reserved, sold = await zone_flags(p)
+    zone = stamp_zone(p, reserved, sold)
+    await (p.insert() if insert else p.save())
+    zone_counter.upsert(p, reserved=reserved, sold=sold)
+    return zone
+
+
+async def age_stored_zones(today: Optional[date] = None) -> int:
+    """
+    Move stored Fresh/Watch zones past the 90 and 180 day thresholds. Range
+    queries on the base date (purchase_date, else created_at) over the
+    zone index touch only the products that crossed; returns how many moved.
+    """
+    today = today or date.today()
+    now = datetime.utcnow()
+    moved = 0
+    for zones, days, target in (
+        (["Fresh", "Watch"], WATCH_DAYS, "Dead"),
+        (["Fresh"], FRESH_DAYS, "Watch"),
+    ):
+        # days in stock > `days`  <=>  base date < today - days
+        cutoff = datetime.combine(today - timedelta(days=days), time())
+        res = await Product.get_motor_collection().update_many(
+            {
+                "status_zone": {"$in": zones},
+                "$or": [
+                    {"purchase_date": {"$lt": cutoff}},
+                    {"purchase_date": None, "created_at": {"$lt": cutoff}},
+                ],
+            },
+            {"$set": {"status_zone": target, "zone_changed_at": now}},
+        )
+        moved += res.modified_count
+    return moved
+
+
+class _ZoneRow(BaseModel):
+    sku: str
+    qty: int = 1
+    purchase_date: Optional[date] = None
+    created_at: datetime
+    reserved_name: Optional[str] = None
+    reserved_phone: Optional[str] = None
+    status_zone: Optional[str] = None
+
+
+class ZoneCounter:
+    def __init__(self, sweep_seconds: int = 300, resync_seconds: int = 900):
+        self.sweep_seconds = sweep_seconds
+        self.resync_seconds = resync_seconds
+        # sku -> (base date ordinal, qty, legacy reserved_name/phone hold)
+        self._items: Dict[str, Tuple[int, int, bool]] = {}
+        self._reserved: Set[str] = set()   # SKUs with Reservation documents
+        self._sold: Set[str] = set()       # SKUs in the sale archive
+        # Products that age (not reserved or sold), per base date ordinal
+        self._by_day: Counter = Counter()
+        self.counts = np.zeros(len(ZONES), dtype=np.int64)
+        self.today = date.today().toordinal()
+        self.rebuilt_at: Optional[datetime] = None
+        self._lock = asyncio.Lock()
+        # Writes that land while `rebuild` is reading Mongo, replayed on top of it
+        self._pending: Optional[List[Callable[[], None]]] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.rebuilt_at is not None
+
+    def as_dict(self) -> Dict[str, int]:
+        return {z: int(c) for z, c in zip(ZONES, self.counts)}
+
+    # --- classification ------------------------------------------------------
+
+    def _age_zone(self, day: int) -> int:
+        days = self.today - day
+        return FRESH if days <= FRESH_DAYS else WATCH if days <= WATCH_DAYS else DEAD
+
+    def _code(self, sku: str) -> Optional[int]:
+        item = self._items.get(sku)
+        if item is None:
+            return None
+        day, qty, hold = item
+        if qty == 0 and sku in self._sold:
+            return SOLD
+        if hold or sku in self._reserved:
+            return RESERVED
+        return self._age_zone(day)
+
+    def _count(self, sku: str, sign: int):
+        code = self._code(sku)
+        if code is None:
+            return
+        self.counts[code] += sign
+        if code not in (RESERVED, SOLD):
+            day = self._items[sku][0]
+            self._by_day[day] += sign
+            if not self._by_day[day]:
+                del self._by_day[day]
+
+    # --- incremental updates -------------------------------------------------
+
+    def upsert(self, p: Product, reserved: Optional[bool] = None, sold: Optional[bool] = None):
+        """
+        Re-file one product after a write. `reserved` / `sold` report whether
+        it now has reservations / a sale record (None = unchanged).
+        """
+        if self._pending is not None:
+            self._pending.append(lambda: self._upsert(p, reserved, sold))
+        self._upsert(p, reserved, sold)
+
+    def _upsert(self, p: Product, reserved: Optional[bool], sold: Optional[bool]):
+        self._count(p.sku, -1)
+        if p.is_archived:
+            self._items.pop(p.sku, None)
+        else:
+            self._items[p.sku] = (base_date(p).toordinal(), int(p.qty), _manual_hold(p))
+        if reserved is not None:
+            (self._reserved.add if reserved else self._reserved.discard)(p.sku)
+        if sold is not None:
+            (self._sold.add if sold else self._sold.discard)(p.sku)
+        self._count(p.sku, +1)
+
+    def remove(self, sku: str):
+        if self._pending is not None:
+            self._pending.append(lambda: self._remove(sku))
+        self._remove(sku)
+
+    def _remove(self, sku: str):
+        self._count(sku, -1)
+        self._items.pop(sku, None)
+
+    def sweep(self, today: Optional[date] = None) -> int:
+        """Age the counts to `today`; returns how many products changed zone."""
+        new = (today or date.today()).toordinal()
+        moved = 0
+        for t in range(self.today + 1, new + 1):
+            to_watch = self._by_day.get(t - FRESH_DAYS - 1, 0)
+            to_dead = self._by_day.get(t - WATCH_DAYS - 1, 0)
+            self.counts[FRESH] -= to_watch
+            self.counts[WATCH] += to_watch - to_dead
+            self.counts[DEAD] += to_dead
+            moved += to_watch + to_dead
+        if new > self.today:
+            self.today = new
+        return moved
+
+    # --- full rebuild --------------------------------------------------------
+
+    async def rebuild(self) -> Dict[str, int]:
+        """Recount from Mongo: one projected scan of active products, vectorized classification."""
+        async with self._lock:
+            self._pending = []
+            try:
+                rows = await Product.find(Product.is_archived == False).project(_ZoneRow).to_list()
+                reserved = set(await Reservation.get_motor_collection().distinct("sku"))
+                sold = set(await SaleArchive.get_motor_collection().distinct("sku"))
+            except Exception:
+                self._pending = None
+                raise
+
+            today = date.today().toordinal()
+            skus = [r.sku for r in rows]
+            day = np.fromiter((base_date(r).toordinal() for r in rows), dtype=np.int64, count=len(rows))
+            qty = np.fromiter((r.qty for r in rows), dtype=np.int64, count=len(rows))
+            hold = np.fromiter((_manual_hold(r) for r in rows), dtype=bool, count=len(rows))
+            is_sold = np.isin(skus, list(sold)) if sold and skus else np.zeros(len(rows), dtype=bool)
+            is_res = np.isin(skus, list(reserved)) if reserved and skus else np.zeros(len(rows), dtype=bool)
+            codes = zone_codes(qty, is_sold, hold | is_res, today - day)
+
+            aging = codes <= DEAD
+            days, per_day = np.unique(day[aging], return_counts=True)
+
+            self._items = dict(zip(skus, zip(day.tolist(), qty.tolist(), hold.tolist())))
+            self._reserved, self._sold = reserved, sold
+            self._by_day = Counter(dict(zip(days.tolist(), per_day.tolist())))
+            self.counts = np.bincount(codes, minlength=len(ZONES)).astype(np.int64)
+            self.today = today
+            self.rebuilt_at = datetime.utcnow()
+            stored = np.array([r.status_zone or "" for r in rows], dtype=object)
+            wrong = np.flatnonzero(stored != np.asarray(ZONES, dtype=object)[codes]) if len(rows) else []
+
+            # Upserts are absolute, so replaying one the scan already saw is harmless
+            pending, self._pending = self._pending, None
+            for apply in pending:
+                apply()
+
+        if len(wrong):
+            fixed = await _store_zones({ZONES[c]: [skus[i] for i in wrong if codes[i] == c] for c in range(len(ZONES))})
+            logger.info(f"Corrected the stored zone of {fixed} products")
+        return self.as_dict()
+
+    async def get_counts(self) -> Dict[str, int]:
+        if not self.ready:
+            await self.rebuild()
+        self.sweep()
+        return self.as_dict()
+
+    # --- background loop -----------------------------------------------------
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self.sweep_seconds)
+            try:
+                stale = (datetime.utcnow() - self.rebuilt_at).total_seconds() >= self.resync_seconds \
+                    if self.rebuilt_at else True
+                stored = await age_stored_zones()
+                if stale:
+                    await self.rebuild()
+                else:
+                    moved = self.sweep()
+                    if moved or stored:
+                        logger.info(f"Zone aging sweep moved {moved} counted / {stored} stored products")
+            except Exception as e:
+                logger.error(f"Zone sweep failed: {e}")
+
+    async def start(self):
+        try:
+            await self.rebuild()
+        except Exception as e:
+            logger.error(f"Zone counts not built at startup: {e}")
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "counts": self.as_dict(),
+            "products": len(self._items),
+            "rebuilt_at": self.rebuilt_at.isoformat() if self.rebuilt_at else None,
+        }
+
+
+async def _store_zones(by_zone: Dict[str, List[str]]) -> int:
+    """Write status_zone for the given SKUs, one update_many per zone and chunk."""
+    coll = Product.get_motor_collection()
+    now = datetime.utcnow()
+    fixed = 0
+    for zone, skus in by_zone.items():
+        for start in range(0, len(skus), FIX_CHUNK):
+            res = await coll.update_many(
+                {"sku": {"$in": skus[start:start + FIX_CHUNK]}},
+                {"$set": {"status_zone": zone, "zone_changed_at": now}},
+            )
+            fixed += res.modified_count
+    return fixed
+
+
+# Singleton
+zone_counter = ZoneCounter(
+    sweep_seconds=settings.ZONE_SWEEP_SECONDS,
+    resync_seconds=settings.ZONE_RESYNC_SECONDS,
+)
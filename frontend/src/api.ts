@@ -77,6 +77,47 @@ export async function apiDelete<T>(path: string): Promise<T> {
     return res.json() as Promise<T>;
 }
 
+// -----------------------
+// Background Jobs
+// -----------------------
+export type Job = {
+    id: string;
+    kind: string;
+    status: "queued" | "running" | "succeeded" | "failed" | "cancelled";
+    progress_done: number;
+    progress_total: number;
+    progress_pct?: number | null;
+    message?: string | null;
+    result?: any;
+    error?: string | null;
+};
+
+export async function waitForJob(jobId: string, onProgress?: (job: Job) => void, intervalMs = 1000): Promise<Job> {
+    while (true) {
+        const job = await apiGet<Job>(`/jobs/${jobId}`);
+        onProgress?.(job);
+        if (job.status === "succeeded") return job;
+        if (job.status === "failed" || job.status === "cancelled") {
+            throw new Error(job.error || `Job ${job.status}`);
+        }
+        await new Promise(r => setTimeout(r, intervalMs));
+    }
+}
+
+export async function downloadJobOutput(jobId: string, filename: string) {
+    const res = await fetch(`${API_BASE}/jobs/${jobId}/download`, { credentials: "include" });
+    if (!res.ok) throw new Error(`Download failed: ${res.status}`);
+    const blob = await res.blob();
+    const url = window.URL.createObjectURL(blob);
+    const a = document.createElement("a");
+    a.href = url;
+    a.download = filename;
+    document.body.appendChild(a);
+    a.click();
+    a.remove();
+    window.URL.revokeObjectURL(url);
+}
+
 export async function authLogin(data: any) {
     return apiPost<{ ok: boolean; user: AdminUser }>("/auth/login", data);
 }
@@ -137,6 +178,60 @@ export async function publicCreateOrder(data: {
     return apiPost("/public/orders", data);
 }
 
+// -----------------------
+// Storefront events (batched, fire-and-forget)
+// -----------------------
+export type ShopEventType = "view" | "try_on" | "cart_add" | "search";
+
+const EVENT_FLUSH_MS = 2000;
+const EVENT_MAX_BATCH = 50;
+let eventQueue: { type: ShopEventType; sku?: string; query?: string; session_id: string; client_ts: string }[] = [];
+let eventTimer: ReturnType<typeof setTimeout> | null = null;
+
+function eventSessionId(): string {
+    let id = sessionStorage.getItem("royaliq_sid");
+    if (!id) {
+        id = Math.random().toString(36).slice(2) + Date.now().toString(36);
+        sessionStorage.setItem("royaliq_sid", id);
+    }
+    return id;
+}
+
+function flushEvents() {
+    if (eventTimer) {
+        clearTimeout(eventTimer);
+        eventTimer = null;
+    }
+    if (eventQueue.length === 0) return;
+    const events = eventQueue.splice(0, EVENT_MAX_BATCH);
+    // keepalive lets the request outlive page navigation; errors are ignored on purpose
+    fetch(`${API_BASE}/public/events`, {
+        method: "POST",
+        credentials: "include",
+        keepalive: true,
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({ events })
+    }).catch(() => undefined);
+    if (eventQueue.length > 0) flushEvents();
+}
+
+export function trackEvent(type: ShopEventType, data: { sku?: string; query?: string } = {}) {
+    try {
+        eventQueue.push({ type, ...data, session_id: eventSessionId(), client_ts: new Date().toISOString() });
+    } catch {
+        return;
+    }
+    if (eventQueue.length >= EVENT_MAX_BATCH) {
+        flushEvents();
+    } else if (!eventTimer) {
+        eventTimer = setTimeout(flushEvents, EVENT_FLUSH_MS);
+    }
+}
+
+if (typeof window !== "undefined") {
+    window.addEventListener("pagehide", flushEvents);
+}
+
 // -----------------------
 // Customer Auth
 // -----------------------
@@ -7,7 +7,8 @@ import {
     Clock,
     AlertTriangle,
     XOctagon,
-    Lock
+    Lock,
+    CheckCircle2
 } from "lucide-react";
 
 export type Metrics = {
@@ -19,6 +20,7 @@ export type Metrics = {
     zone_watch: number;
     zone_dead: number;
     zone_reserved: number;
+    zone_sold?: number;
 };
 
 interface CardProps {
@@ -95,6 +97,12 @@ export default function MetricCards({ m }: { m: Metrics }) {
                 icon={<Lock size={24} />}
                 theme="gold"
             />
+            <StatCard
+                label="Sold"
+                value={m.zone_sold ?? 0}
+                icon={<CheckCircle2 size={24} />}
+                theme="blue"
+            />
         </div>
     );
 }
@@ -1,5 +1,6 @@
 import React, { useState } from "react";
 import { UploadCloud, FileSpreadsheet, Layers, Archive, Calendar, CheckCircle2 } from "lucide-react";
+import { waitForJob } from "../api";
 
 export default function BatchSourcing() {
     const [images, setImages] = useState<FileList | null>(null);
@@ -22,7 +23,9 @@ export default function BatchSourcing() {
             });
             if (!res.ok) throw new Error("Image upload failed");
             const out = await res.json();
-            setMsg(`Success: Buffered ${out.buffer_count} images.`);
+            const dupes = out.duplicates?.length ? ` ${out.duplicates.length} already in buffer.` : "";
+            const rejected = out.rejected?.length ? ` Rejected ${out.rejected.length} (${out.rejected[0].file}: ${out.rejected[0].error}).` : "";
+            setMsg(`Success: Buffered ${out.buffer_count} images.${dupes}${rejected}`);
         } catch (e: any) {
             setMsg(`Error: ${e.message}`);
         } finally {
@@ -38,9 +41,14 @@ export default function BatchSourcing() {
             fd.append("csv_file", csvFile);
             const url = `/uploads/batch_csv?global_date=${encodeURIComponent(globalDate)}&stock_type=${encodeURIComponent(stockType)}`;
             const res = await fetch(url, { method: "POST", credentials: "include", body: fd });
-            const out = await res.json();
-            if (!res.ok) throw new Error(out?.detail || "CSV import failed");
-            setMsg(`Success: Created ${out.created} items. Matched ${out.matched_images} images.`);
+            const queued = await res.json();
+            if (!res.ok) throw new Error(queued?.detail || "CSV import failed");
+            const job = await waitForJob(queued.job_id, (j) => {
+                if (j.progress_total) setMsg(`Importing... ${j.progress_done}/${j.progress_total} rows`);
+            });
+            const out = job.result;
+            const skipped = out.skipped ? ` Skipped ${out.skipped} rows (first: line ${out.errors?.find((e: any) => !e.imported)?.line}).` : "";
+            setMsg(`Success: Created ${out.created} items. Matched ${out.matched_images} images.${skipped}`);
         } catch (e: any) {
             setMsg(`Error: ${e.message}`);
         } finally {
@@ -1,5 +1,5 @@
 import React, { useEffect, useState } from "react";
-import { apiGet } from "../api";
+import { apiGet, apiPost, waitForJob, downloadJobOutput } from "../api";
 import Loader from "../components/Loader";
 import {
     AlertTriangle, CheckCircle, TrendingDown, ShoppingBag,
@@ -26,26 +26,76 @@ type ProcurementRecommendation = {
     rating_count: number;
 };
 
+type ProcurementSummary = {
+    total: number;
+    urgent: number;
+    retail_value: number;
+    by_recommendation: Record<string, number>;
+    categories: Record<string, number>;
+};
+
+type ProcurementPage = {
+    items: ProcurementRecommendation[];
+    matched: number;
+    next_cursor?: string | null;
+    summary: ProcurementSummary;
+    snapshot_age_seconds: number;
+    refreshing: boolean;
+};
+
+// Tab -> server-side filter
+const TAB_PARAMS: Record<string, Record<string, string>> = {
+    All: {},
+    Buy: { recommendation: "Buy,Urgent Restock" },
+    Sell: { recommendation: "Discount,Dead Stock,Overstocked" },
+    Urgent: { min_score: "80" },
+};
+
+const SORTS: [string, string][] = [
+    ["score", "Score"], ["forecast", "Forecast"], ["velocity", "Velocity"],
+    ["stock", "Stock"], ["days", "Days in Stock"], ["value", "Value"], ["rating", "Rating"],
+];
+
+const PAGE_SIZE = 50;
+
 export default function Procurement() {
     const [data, setData] = useState<ProcurementRecommendation[]>([]);
-    const [filteredData, setFilteredData] = useState<ProcurementRecommendation[]>([]);
+    const [summary, setSummary] = useState<ProcurementSummary | null>(null);
+    const [matched, setMatched] = useState(0);
+    const [nextCursor, setNextCursor] = useState<string | null>(null);
+    const [snapshot, setSnapshot] = useState<{ age: number; refreshing: boolean } | null>(null);
     const [loading, setLoading] = useState(true);
+    const [loadingMore, setLoadingMore] = useState(false);
     const [error, setError] = useState("");
 
     // Filters & Enhancements
     const [tab, setTab] = useState("All");
     const [search, setSearch] = useState("");
     const [categoryFilter, setCategoryFilter] = useState("All");
+    const [sort, setSort] = useState("score");
     const [seasonality, setSeasonality] = useState(1.0);
     const [selectedItem, setSelectedItem] = useState<ProcurementRecommendation | null>(null);
 
+    function query(cursor?: string | null) {
+        const params = new URLSearchParams(TAB_PARAMS[tab] || {});
+        if (categoryFilter !== "All") params.append("category", categoryFilter);
+        if (search.trim()) params.append("q", search.trim());
+        params.append("sort", sort);
+        params.append("limit", String(PAGE_SIZE));
+        if (cursor) params.append("cursor", cursor);
+        return `/procurement/recommendations?${params.toString()}`;
+    }
+
     async function load() {
         setLoading(true);
         setError("");
         try {
-            const res = await apiGet<ProcurementRecommendation[]>("/procurement/recommendations");
-            setData(res);
-            setFilteredData(res);
+            const res = await apiGet<ProcurementPage>(query());
+            setData(res.items);
+            setSummary(res.summary);
+            setMatched(res.matched);
+            setNextCursor(res.next_cursor || null);
+            setSnapshot({ age: res.snapshot_age_seconds, refreshing: res.refreshing });
         } catch (e: any) {
             setError(e.message);
         } finally {
@@ -53,65 +103,38 @@ export default function Procurement() {
         }
     }
 
-    async function handleExport() {
+    async function loadMore() {
+        if (!nextCursor) return;
+        setLoadingMore(true);
         try {
-            // Using window.open for simplicity with streaming response
-            const token = localStorage.getItem("token"); // Assuming simple token auth query param or cookie
-            // Better: fetch blob
-            const response = await fetch(import.meta.env.VITE_API_BASE_URL + "/procurement/export", {
-                headers: { "Authorization": `Bearer ${token}` } // Or however auth is handled
-            });
-            if (!response.ok) throw new Error("Export failed");
-
-            const blob = await response.blob();
-            const url = window.URL.createObjectURL(blob);
-            const a = document.createElement('a');
-            a.href = url;
-            a.download = `procurement_plan_${new Date().toISOString().slice(0, 10)}.csv`;
-            document.body.appendChild(a);
-            a.click();
-            a.remove();
+            const res = await apiGet<ProcurementPage>(query(nextCursor));
+            setData(prev => [...prev, ...res.items]);
+            setMatched(res.matched);
+            setNextCursor(res.next_cursor || null);
         } catch (e: any) {
-            alert("Failed to export data: " + e.message);
+            setError(e.message);
+        } finally {
+            setLoadingMore(false);
         }
     }
 
-    useEffect(() => {
-        load();
-    }, []);
-
-    // Extract categories
-    const categories = ["All", ...Array.from(new Set(data.map(i => i.category || "Uncategorized")))];
-
-    useEffect(() => {
-        let res = data;
-
-        // 1. Tab Filter
-        if (tab === "Buy") {
-            res = res.filter(x => x.recommendation.includes("Buy") || x.recommendation.includes("Restock"));
-        } else if (tab === "Sell") {
-            res = res.filter(x => x.recommendation.includes("Discount") || x.recommendation.includes("Dead") || x.recommendation.includes("Overstock"));
-        } else if (tab === "Urgent") {
-            res = res.filter(x => x.procurement_score >= 80);
-        }
-
-        // 2. Category Filter
-        if (categoryFilter !== "All") {
-            res = res.filter(x => (x.category || "Uncategorized") === categoryFilter);
+    async function handleExport(format: "csv" | "parquet" = "csv") {
+        try {
+            const queued = await apiPost<{ job_id: string }>(`/procurement/export/jobs?format=${format}`, {});
+            const job = await waitForJob(queued.job_id);
+            await downloadJobOutput(job.id, job.result?.filename || `procurement_plan_${new Date().toISOString().slice(0, 10)}.${format}`);
+        } catch (e: any) {
+            alert("Failed to export data: " + e.message);
         }
+    }
 
-        // 3. Search
-        if (search) {
-            const q = search.toLowerCase();
-            res = res.filter(x =>
-                x.name.toLowerCase().includes(q) ||
-                x.sku.toLowerCase().includes(q) ||
-                x.reason.toLowerCase().includes(q)
-            );
-        }
+    // Filters, search and sort run on the server; search is debounced
+    useEffect(() => {
+        const t = setTimeout(load, search ? 300 : 0);
+        return () => clearTimeout(t);
+    }, [tab, categoryFilter, search, sort]);
 
-        setFilteredData(res);
-    }, [tab, categoryFilter, search, data, seasonality]); // Added seasonality to dependencies
+    const categories = ["All", ...Object.keys(summary?.categories || {})];
 
     if (loading && data.length === 0) return <Loader text="Analyzing Retail Intelligence..." />;
 
@@ -128,10 +151,10 @@ export default function Procurement() {
         );
     }
 
-    // Calculations for Summary
-    const totalCapitalHere = data.reduce((acc, item) => acc + item.retail_value, 0);
-    const urgentCount = data.filter(x => x.procurement_score >= 80).length;
-    const deadStockCount = data.filter(x => x.recommendation.includes("Dead")).length;
+    // Summary cards cover the whole catalog, not just the loaded page
+    const totalCapitalHere = summary?.retail_value || 0;
+    const urgentCount = summary?.urgent || 0;
+    const deadStockCount = summary?.by_recommendation["Dead Stock"] || 0;
 
     return (
         <div style={{ paddingBottom: 80 }}>
@@ -139,13 +162,25 @@ export default function Procurement() {
             <div className="header" style={{ marginBottom: 32 }}>
                 <div>
                     <h1 className="page-title">Procurement Intelligence</h1>
-                    <div className="subtitle">AI-driven inventory optimization and forecasting</div>
+                    <div className="subtitle">
+                        AI-driven inventory optimization and forecasting
+                        {snapshot && (
+                            <span style={{ marginLeft: 12, fontSize: 12, opacity: 0.7 }}>
+                                Updated {snapshot.age < 60 ? `${Math.round(snapshot.age)}s` : `${Math.round(snapshot.age / 60)}m`} ago
+                                {snapshot.refreshing && " · refreshing"}
+                            </span>
+                        )}
+                    </div>
                 </div>
                 <div style={{ display: 'flex', gap: 12 }}>
-                    <button className="btn-secondary" onClick={handleExport}>
+                    <button className="btn-secondary" onClick={() => handleExport("csv")}>
                         <Download size={16} style={{ marginRight: 8 }} />
                         Export CSV
                     </button>
+                    <button className="btn-secondary" onClick={() => handleExport("parquet")} title="Columnar file for analysts (pandas, DuckDB, Spark)">
+                        <Download size={16} style={{ marginRight: 8 }} />
+                        Parquet
+                    </button>
                     <button className="btn-primary" onClick={load}>
                         <RefreshCw size={16} style={{ marginRight: 8 }} />
                         Refresh
@@ -191,6 +226,13 @@ export default function Procurement() {
                     </select>
                 </div>
 
+                <div className="select-box">
+                    <BarChart2 size={14} color="var(--text-muted)" style={{ marginRight: 8 }} />
+                    <select value={sort} onChange={e => setSort(e.target.value)}>
+                        {SORTS.map(([key, label]) => <option key={key} value={key}>{label}</option>)}
+                    </select>
+                </div>
+
                 <div style={{ flex: 1 }}></div>
 
                 {/* Tabs */}
@@ -248,7 +290,7 @@ export default function Procurement() {
                         </tr>
                     </thead>
                     <tbody>
-                        {filteredData.map((item) => {
+                        {data.map((item) => {
                             // Apply Seasonality to Display
                             const adjustedForecast = Math.round(item.forecasted_demand * seasonality);
 
@@ -321,7 +363,18 @@ export default function Procurement() {
                     </tbody>
                 </table>
 
-                {filteredData.length === 0 && (
+                {data.length > 0 && (
+                    <div style={{ padding: 16, textAlign: "center", color: "var(--text-muted)", fontSize: 13 }}>
+                        Showing {data.length} of {matched}
+                        {nextCursor && (
+                            <button className="btn-secondary" style={{ marginLeft: 16 }} onClick={loadMore} disabled={loadingMore}>
+                                {loadingMore ? "Loading..." : "Load more"}
+                            </button>
+                        )}
+                    </div>
+                )}
+
+                {!loading && data.length === 0 && (
                     <div style={{ padding: 80, textAlign: "center", color: "var(--text-muted)" }}>
                         <div style={{ marginBottom: 16, opacity: 0.3 }}>
                             <ShoppingBag size={64} />
@@ -1,7 +1,7 @@
 import React, { useEffect, useState } from "react";
 import { Link } from "react-router-dom";
 import ShopLayout from "../layouts/ShopLayout";
-import { PublicProduct, publicListProducts } from "../api";
+import { PublicProduct, publicListProducts, trackEvent } from "../api";
 import Loader from "../components/Loader";
 import { Heart, Star, Sparkles, Search, X, ArrowRight } from "lucide-react";
 
@@ -16,6 +16,7 @@ export default function ShopHome() {
         try {
             const data = await publicListProducts(query, category === "All" ? "" : category);
             setProducts(data);
+            if (query.trim()) trackEvent("search", { query: query.trim().slice(0, 200) });
         } catch (error) {
             console.error(error);
         } finally {
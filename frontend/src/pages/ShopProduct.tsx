@@ -1,7 +1,7 @@
 import React, { useEffect, useState } from "react";
 import { useParams, Link } from "react-router-dom";
 import ShopLayout from "../layouts/ShopLayout";
-import { PublicProduct, publicGetProduct, publicListProducts } from "../api";
+import { PublicProduct, publicGetProduct, publicListProducts, trackEvent } from "../api";
 import {
     ShoppingBag, ArrowRight, Sparkles, Shield, Gem, Truck, Clock,
     CheckCircle2, MessageCircle, ChevronDown, ChevronUp, Award,
@@ -31,6 +31,7 @@ export default function ShopProduct() {
         publicGetProduct(sku)
             .then(async p => {
                 setProduct(p);
+                trackEvent("view", { sku: p.sku });
                 if (p.images && p.images.length > 0) {
                     const primary = p.images.find(i => i.is_primary);
                     setActiveImage(primary ? primary.url : p.images[0].url);
@@ -57,6 +58,7 @@ export default function ShopProduct() {
     function handleAddToCart() {
         if (!product) return;
         addToCart(product);
+        trackEvent("cart_add", { sku: product.sku });
         toast.custom((t) => (
             <div style={{
                 background: "#1a1a1a",
@@ -12,6 +12,7 @@ export default function Vault() {
     const [q, setQ] = useState("");
     const [category, setCategory] = useState("");
     const [stockType, setStockType] = useState("");
+    const [zone, setZone] = useState("");
     const [selected, setSelected] = useState<Product | null>(null);
     const [loading, setLoading] = useState(false);
     const [viewMode, setViewMode] = useState<"list" | "grid">("grid");
@@ -23,6 +24,7 @@ export default function Vault() {
             if (q.trim()) params.set("q", q.trim());
             if (category.trim()) params.set("category", category.trim());
             if (stockType.trim()) params.set("stock_type", stockType.trim());
+            if (zone) params.set("zone", zone);
             const out = await apiGet<Product[]>(`/products?${params.toString()}`);
             setItems(out);
         } finally {
@@ -118,6 +120,20 @@ export default function Vault() {
                         <option value="concept">Concept</option>
                     </select>
 
+                    <select
+                        className="form-select"
+                        style={{ width: 160 }}
+                        value={zone}
+                        onChange={(e) => setZone(e.target.value)}
+                    >
+                        <option value="">All Zones</option>
+                        <option value="Fresh">Fresh</option>
+                        <option value="Watch">Watch</option>
+                        <option value="Dead">Dead</option>
+                        <option value="Reserved">Reserved</option>
+                        <option value="Sold">Sold</option>
+                    </select>
+
                     <button className="btn-primary" onClick={load} disabled={loading}>
                         <div style={{ display: "flex", alignItems: "center", gap: 6 }}>
                             {loading ? "..." : <RefreshCw size={18} />}